@@ -8,6 +8,7 @@ from datetime import datetime, timedelta
 import sentry_sdk
 from sentry_sdk.integrations.flask import FlaskIntegration
 from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
 from werkzeug.exceptions import NotFound
 from werkzeug.middleware.proxy_fix import ProxyFix
 
@@ -21,6 +22,15 @@ from models.user import User
 from models.company import Company
 from models.subscription import Subscription
 from models.project import Project
+from models.analysis_job import AnalysisJob
+from models.floor_plan_image import FloorPlanImage
+
+# Import services
+from services.analysis_jobs import analysis_queue
+from services.analyzer_registry import analyzer_registry
+from services.analysis_backfill import reparse_analyses_command
+from services.quote_summaries import backfill_quote_summaries_command, add_missing_quote_columns
+from services.analysis_artifacts import render_derived_report
 
 # Import routes
 from routes.auth import auth_bp
@@ -151,6 +161,27 @@ def create_app(config_name=None):
     # Initialize database
     db.init_app(app)
     
+    # Initialize background analysis job queue
+    analysis_queue.init_app(app)
+    
+    # Shared floor plan analyzer with a pooled OpenAI client (one per worker process)
+    analyzer_registry.init_app(app)
+    
+    # CLI: flask reparse-analyses
+    app.cli.add_command(reparse_analyses_command)
+    
+    # CLI: flask backfill-quote-summaries
+    app.cli.add_command(backfill_quote_summaries_command)
+    
+    # Bring existing databases up to the current quotes schema (db.create_all never alters tables)
+    with app.app_context():
+        try:
+            add_missing_quote_columns()
+        except SQLAlchemyError as e:
+            app.logger.error(f"Could not add missing quote columns: {e}")
+        # Don't hand connections opened at startup to forked workers
+        db.engine.dispose()
+    
     # Create upload directories
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     os.makedirs(app.config['RESULTS_FOLDER'], exist_ok=True)
@@ -258,6 +289,11 @@ def create_app(config_name=None):
                     break
             
             if not file_path:
+                # Summary/measurement reports aren't stored; render them from the analysis
+                report = render_derived_report(project, filename)
+                if report is not None:
+                    return send_file(report, mimetype='application/json', download_name=filename)
+
                 app.logger.error(f"File {filename} not found for project {project_id}")
                 app.logger.debug(f"Checked paths: {possible_paths}")
                 return jsonify({'error': 'File not found'}), 404
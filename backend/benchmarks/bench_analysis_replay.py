@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+"""End-to-end analysis benchmark against the replay vision backend (no network needed).
+
+Runs N analyses through ``POST /api/projects/<id>/analyze`` on an in-process app with a
+throwaway SQLite database, waits for each background job to finish and reports
+throughput and p50/p95 latency. The vision call is served by ``ReplayVisionBackend``.
+
+Without ``--recordings`` the replay store is seeded from ``parser_corpus.jsonl`` and any
+request is answered round-robin. Pass a directory recorded with ``VISION_BACKEND=record``
+to replay real responses, and ``--strict`` to fail on requests that were not recorded.
+
+    python benchmarks/bench_analysis_replay.py [--analyses 40] [--concurrency 4]
+        [--latency-ms 800] [--jitter-ms 200] [--recordings DIR] [--strict]
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import tempfile
+import threading
+import statistics
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+CORPUS_PATH = os.path.join(BACKEND_DIR, 'benchmarks', 'parser_corpus.jsonl')
+
+
+def seed_recordings(recordings_dir, latency_ms):
+    """Write one replay recording per corpus response that has rooms"""
+    os.makedirs(recordings_dir, exist_ok=True)
+    with open(CORPUS_PATH, 'r', encoding='utf-8') as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+
+    count = 0
+    for case in corpus:
+        if not case['expected_rooms']:
+            continue
+        text = case['text']
+        fingerprint = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        chunks = [line + '\n' for line in text.split('\n')]
+        record = {
+            'fingerprint': fingerprint,
+            'model': 'gpt-4o',
+            'recorded_at': time.time(),
+            'text': text,
+            'chunks': chunks,
+            'usage': {'prompt_tokens': 1100, 'completion_tokens': len(text) // 4,
+                      'total_tokens': 1100 + len(text) // 4},
+            'latency_ms': latency_ms,
+            'first_token_ms': latency_ms * 0.3
+        }
+        with open(os.path.join(recordings_dir, f'{fingerprint}.json'), 'w', encoding='utf-8') as f:
+            json.dump(record, f)
+        count += 1
+    return count
+
+
+def make_floor_plan(path, variant):
+    from PIL import Image, ImageDraw
+
+    img = Image.new('L', (1600, 1100), 255)
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([100, 100, 1500, 1000], outline=0, width=12)
+    split = 500 + (variant % 5) * 80
+    draw.line([split, 100, split, 1000], fill=0, width=10)
+    draw.line([100, 550, split, 550], fill=0, width=10)
+    draw.text((split + 40, 140), f'Living room {variant}', fill=0)
+    img.save(path)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--analyses', type=int, default=40, help='total analyses to run')
+    parser.add_argument('--concurrency', type=int, default=4, help='analyses in flight (one project each)')
+    parser.add_argument('--latency-ms', type=float, default=None,
+                        help='replay latency per vision call (default: recorded, or 800 for seeded recordings)')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='uniform latency jitter')
+    parser.add_argument('--recordings', help='directory of recorded vision responses')
+    parser.add_argument('--strict', action='store_true', help='fail requests that have no recording')
+    parser.add_argument('--verbose', action='store_true', help='show application logs')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_analysis_')
+    recordings_dir = args.recordings
+    latency_ms = args.latency_ms
+    if not recordings_dir:
+        recordings_dir = os.path.join(workdir, 'recordings')
+        seeded = seed_recordings(recordings_dir, latency_ms if latency_ms is not None else 800.0)
+        latency_ms = latency_ms if latency_ms is not None else 800.0
+        print(f"Seeded {seeded} replay recordings from the parser corpus")
+
+    from config import config as configs, TestingConfig
+
+    class BenchConfig(TestingConfig):
+        DEBUG = False
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        UPLOAD_FOLDER = os.path.join(workdir, 'uploads')
+        RESULTS_FOLDER = os.path.join(workdir, 'results')
+        ANALYSIS_JOB_BACKEND = 'thread'
+        ANALYSIS_JOB_WORKERS = args.concurrency
+        ANALYSIS_MAX_CONCURRENT_VISION_CALLS = args.concurrency
+        ANALYSIS_CACHE_ENABLED = False
+        ANALYSIS_GEOMETRY_FALLBACK = False
+        VISION_BACKEND = 'replay'
+        VISION_RECORDINGS_DIR = recordings_dir
+        VISION_REPLAY_LATENCY_MS = latency_ms
+        VISION_REPLAY_JITTER_MS = args.jitter_ms
+        VISION_REPLAY_ON_MISS = 'error' if args.strict else 'any'
+
+    configs['bench'] = BenchConfig
+
+    from flask_jwt_extended import create_access_token
+    from werkzeug.security import generate_password_hash
+    from app import create_app
+    from models import db
+    from models.user import User
+    from models.company import Company
+    from models.project import Project
+    from models.subscription import Subscription
+
+    app = create_app('bench')
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    with app.app_context():
+        db.create_all()
+        company = Company(name='Benchmark Painters')
+        db.session.add(company)
+        db.session.flush()
+        db.session.add(Subscription(company_id=company.id))
+        user = User(email='bench@example.com', password_hash=generate_password_hash('bench'),
+                    first_name='Bench', last_name='Mark', company_id=company.id)
+        db.session.add(user)
+        db.session.flush()
+
+        project_ids = []
+        for lane in range(args.concurrency):
+            image_dir = os.path.join(BenchConfig.UPLOAD_FOLDER, str(company.id), f'lane_{lane}')
+            os.makedirs(image_dir, exist_ok=True)
+            image_path = os.path.join(image_dir, 'floor_plan.png')
+            make_floor_plan(image_path, lane)
+            project = Project(name=f'Benchmark {lane}', property_type='residential',
+                              property_address='1 Benchmark Road', company_id=company.id,
+                              created_by=user.id, uploaded_images=[image_path])
+            db.session.add(project)
+            db.session.flush()
+            project_ids.append(project.id)
+        db.session.commit()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+
+    remaining = list(range(args.analyses))
+    lock = threading.Lock()
+    latencies, failures, summaries = [], [], []
+
+    def lane(project_id):
+        client = app.test_client()
+        while True:
+            with lock:
+                if not remaining:
+                    return
+                remaining.pop()
+
+            started = time.perf_counter()
+            response = client.post(f'/api/projects/{project_id}/analyze', json={'force_refresh': True},
+                                   headers=headers)
+            if response.status_code != 202:
+                failures.append(f'enqueue {response.status_code}: {response.get_json()}')
+                continue
+
+            status_url = f"/api/projects/{project_id}/analysis-jobs/{response.get_json()['job_id']}"
+            while True:
+                job = client.get(status_url, headers=headers).get_json()['job']
+                if job['status'] in ('completed', 'failed'):
+                    break
+                time.sleep(0.05)
+
+            elapsed = time.perf_counter() - started
+            with lock:
+                if job['status'] == 'completed':
+                    latencies.append(elapsed)
+                    summaries.append(job['result_summary'])
+                else:
+                    failures.append((job.get('error') or '')[:200])
+
+    threads = [threading.Thread(target=lane, args=(project_id,)) for project_id in project_ids]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    print(f"Analyses:    {len(latencies)} completed, {len(failures)} failed, concurrency {args.concurrency}, "
+          f"replay latency {'recorded' if latency_ms is None else f'{latency_ms:.0f}ms'}"
+          f"{f' ±{args.jitter_ms:.0f}ms' if args.jitter_ms else ''}")
+    if latencies:
+        print(f"Throughput:  {len(latencies) / wall:.2f} analyses/s ({wall:.1f}s wall)")
+        print(f"Latency:     p50 {percentile(latencies, 50) * 1000:.0f}ms, "
+              f"p95 {percentile(latencies, 95) * 1000:.0f}ms, max {max(latencies) * 1000:.0f}ms")
+
+        job_wall = [s['timings']['wall_ms'] for s in summaries if (s or {}).get('timings', {}).get('wall_ms')]
+        if job_wall:
+            print(f"Job runtime: p50 {statistics.median(job_wall):.0f}ms inside the worker "
+                  f"(the rest of the latency is queueing, status polling and database commits)")
+
+        stages = {}
+        for summary in summaries:
+            for name, value in ((summary or {}).get('timings') or {}).get('stages_ms', {}).items():
+                stages.setdefault(name, []).append(value)
+        if stages:
+            print("Stages (p50): " + ', '.join(
+                f"{name} {statistics.median(values):.0f}ms" for name, values in stages.items()
+            ))
+    for failure in failures[:5]:
+        print(f"Failure:     {failure}")
+
+    return 0 if not failures else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
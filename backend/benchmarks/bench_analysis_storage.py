@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+"""Benchmark analysis result storage: bytes on disk and write time per analysis.
+
+``legacy`` writes what ``process_floor_plan`` used to: ``analysis_results.json``,
+``summary_report.json`` and ``structured_measurements.json``, all with ``indent=4``.
+``artifact`` writes the single minified, gzip-compressed ``analysis_results.json.gz``;
+the reports are rendered when downloaded, which is timed separately.
+
+Results are built from the parser corpus (one analysis per corpus response with rooms),
+shaped like ``process_floor_plan`` output, and written to a temporary directory.
+
+    python benchmarks/bench_analysis_storage.py [--repeats 20] [--floors 1]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+CORPUS_PATH = os.path.join(BACKEND_DIR, 'benchmarks', 'parser_corpus.jsonl')
+
+
+def build_results(text, floors, results_dir):
+    """A result dict shaped like FloorPlanAnalyzer.process_floor_plan output"""
+    from services.room_parser import parse_rooms
+    from services.analysis_artifacts import report_paths
+
+    sections = [f"=== Floor {index + 1} ===\n{text}" for index in range(floors)] if floors > 1 else [text]
+    room_details = []
+    for index in range(floors):
+        for room in parse_rooms(text):
+            room_details.append(dict(room, id=len(room_details) + 1, floor=f'Floor {index + 1}'))
+
+    treatments = {'sanding_filling': False, 'priming': False, 'one_coat': False, 'two_coats': False}
+    rooms = [
+        {'id': room['id'], 'name': room['name'], 'type': room['type'],
+         'walls_surface_m2': room['walls_surface_m2'], 'area_m2': room['area_m2'],
+         'wall_treatments': dict(treatments), 'ceiling_treatments': dict(treatments)}
+        for room in room_details
+    ]
+    now = datetime.utcnow().isoformat()
+    return {
+        "status": "success",
+        "analysis_id": "project_1_20250101_000000",
+        "timestamp": now,
+        "gpt_analysis": {"full_analysis": "\n\n".join(sections), "room_details": room_details,
+                         "timestamp": now, "model_used": "gpt-4o", "streamed": True,
+                         "usage": {"prompt_tokens": 1100, "completion_tokens": 400, "total_tokens": 1500}},
+        "structured_measurements": {"rooms": rooms,
+                                    "notes": "Generated from AI analysis with total wall area per room"},
+        "reports": report_paths(results_dir),
+        "original_image_link": "/static/uploads/1/1/floor_plan.png",
+        "image_preprocessing": {"original_bytes": 2400000, "processed_bytes": 310000, "reduction_percent": 87.1},
+        "cache": {"enabled": True, "hit": False},
+        "measurement_engine": "vision",
+        "timings": {"total_ms": 8400.0, "stages_ms": {"prepare_image": 210.0, "vision_analysis": 8100.0},
+                    "tokens": {"prompt_tokens": 1100, "completion_tokens": 400, "total_tokens": 1500}}
+    }
+
+
+def write_legacy(results, results_dir):
+    from services.analysis_artifacts import build_summary_report
+
+    summary = build_summary_report(results['structured_measurements'], datetime.utcnow().isoformat())
+    for filename, payload in (('summary_report.json', summary),
+                              ('structured_measurements.json', results['structured_measurements']),
+                              ('analysis_results.json', results)):
+        with open(os.path.join(results_dir, filename), 'w', encoding='utf-8') as f:
+            json.dump(payload, f, indent=4, ensure_ascii=False)
+
+
+def write_artifact(results, results_dir):
+    from services.analysis_artifacts import write_analysis_artifact
+
+    write_analysis_artifact(results, results_dir)
+
+
+def dir_bytes(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def measure(writer, cases, repeats, workdir):
+    """Median write time (ms) and mean on-disk bytes per analysis"""
+    times, sizes = [], []
+    for index, results in enumerate(cases):
+        for attempt in range(repeats):
+            results_dir = os.path.join(workdir, f'{writer.__name__}_{index}_{attempt}')
+            os.makedirs(results_dir)
+            started = time.perf_counter()
+            writer(results, results_dir)
+            times.append((time.perf_counter() - started) * 1000)
+            if attempt == 0:
+                sizes.append(dir_bytes(results_dir))
+            shutil.rmtree(results_dir)
+    return statistics.median(times), statistics.mean(sizes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=20, help='writes per corpus analysis')
+    parser.add_argument('--floors', type=int, default=1, help='floors per analysis (multi-storey merge)')
+    args = parser.parse_args()
+
+    from services.analysis_artifacts import render_derived_report, SUMMARY_REPORT, FULL_RESULTS_REPORT
+
+    with open(CORPUS_PATH, 'r', encoding='utf-8') as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+
+    workdir = tempfile.mkdtemp(prefix='bench_storage_')
+    try:
+        cases = [build_results(case['text'], args.floors, workdir) for case in corpus if case['expected_rooms']]
+
+        legacy_ms, legacy_bytes = measure(write_legacy, cases, args.repeats, workdir)
+        artifact_ms, artifact_bytes = measure(write_artifact, cases, args.repeats, workdir)
+
+        # On-demand report rendering from the artifact (what a download now costs)
+        write_artifact(cases[0], workdir)
+
+        class StoredProject:
+            floor_plan_analysis = cases[0]
+            generated_files = [os.path.join(workdir, 'analysis_results.json.gz')]
+
+        render_times = {}
+        for filename in (SUMMARY_REPORT, FULL_RESULTS_REPORT):
+            samples = []
+            for _ in range(args.repeats):
+                started = time.perf_counter()
+                render_derived_report(StoredProject, filename)
+                samples.append((time.perf_counter() - started) * 1000)
+            render_times[filename] = statistics.median(samples)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"Analyses:  {len(cases)} from the parser corpus, {args.floors} floor(s) each, {args.repeats} writes each")
+    print(f"Legacy:    {legacy_bytes / 1024:.1f} KiB on disk, {legacy_ms:.2f}ms write (3 indented JSON files)")
+    print(f"Artifact:  {artifact_bytes / 1024:.1f} KiB on disk, {artifact_ms:.2f}ms write (1 gzip JSON file)")
+    print(f"Savings:   {(1 - artifact_bytes / legacy_bytes) * 100:.0f}% disk, "
+          f"{(1 - artifact_ms / legacy_ms) * 100:.0f}% write time per analysis")
+    print("On demand: " + ', '.join(f"{name} {ms:.2f}ms" for name, ms in render_times.items()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
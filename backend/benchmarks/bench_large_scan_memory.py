@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""Benchmark peak memory of preparing very large floor plan scans: whole-image vs windowed reads.
+
+Writes synthetic uncompressed TIFF plans (a grid of rooms with a white margin) at each
+size, streaming the rows so the generator itself stays small, then measures each path
+in a fresh interpreter: peak RSS, and in brackets the growth over the interpreter's
+RSS once the imports are loaded:
+
+``preprocess-full``   ``ImagePreprocessor`` decoding the whole image (the previous path)
+``preprocess-tiled``  ``ImagePreprocessor`` via ``TiledImageReader`` (memory-mapped windows)
+``geometry-full``     ``GeometryEngine`` with ``cv2.imread`` of the whole image
+``geometry-tiled``    ``GeometryEngine`` via ``TiledImageReader``
+
+    python benchmarks/bench_large_scan_memory.py [--sizes 5000x3750 10000x7500 20000x15000]
+        [--rgb] [--window-mb 16] [--dir /tmp]
+"""
+import os
+import sys
+import json
+import struct
+import argparse
+import tempfile
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = ('preprocess-full', 'preprocess-tiled', 'geometry-full', 'geometry-tiled')
+
+CHILD = r"""
+import sys, json, time, resource
+sys.path.insert(0, BACKEND_DIR)
+from PIL import Image
+from services.image_preprocessor import ImagePreprocessor
+from services.geometry_engine import GeometryEngine
+
+Image.MAX_IMAGE_PIXELS = None  # the whole-image paths would otherwise refuse these sizes
+never = {'large_image_pixels': 10 ** 12}
+tiled = {'large_image_pixels': 0, 'window_bytes': WINDOW_MB * 1024 * 1024}
+
+def peak_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+baseline = peak_mb()
+started = time.perf_counter()
+if MODE.startswith('preprocess'):
+    data, _, stats = ImagePreprocessor(tiling=tiled if MODE.endswith('tiled') else never).process(PATH)
+    detail = {'sent_bytes': len(data), 'processed_size': stats['processed_size']}
+else:
+    result = GeometryEngine(pixels_per_metre=PPM, tiling=tiled if MODE.endswith('tiled') else never).measure(PATH)
+    detail = {'rooms': len(result['rooms']), 'area_m2': round(sum(r['area_m2'] for r in result['rooms']), 1)}
+print(json.dumps({'seconds': time.perf_counter() - started, 'peak_mb': peak_mb(), 'baseline_mb': baseline, **detail}))
+"""
+
+
+def write_plan_tiff(path, width, height, rgb=False, rows_per_band=256):
+    """Uncompressed single-strip TIFF of a room grid, written band by band"""
+    import numpy as np
+
+    samples = 3 if rgb else 1
+    margin = width // 20
+    cell = max(200, width // 12)
+    wall = max(4, width // 600)
+
+    with open(path, 'wb') as f:
+        f.write(b'II*\x00' + struct.pack('<I', 0))  # IFD offset patched below
+        data_offset = f.tell()
+        cols = np.arange(width)
+        inside_x = (cols >= margin) & (cols < width - margin)
+        wall_x = inside_x & (((cols - margin) % cell < wall) | (cols >= width - margin - wall))
+        for y0 in range(0, height, rows_per_band):
+            rows = np.arange(y0, min(height, y0 + rows_per_band))
+            inside_y = (rows >= margin) & (rows < height - margin)
+            wall_y = inside_y & (((rows - margin) % cell < wall) | (rows >= height - margin - wall))
+            ink = (wall_y[:, None] & inside_x[None, :]) | (inside_y[:, None] & wall_x[None, :])
+            band = np.where(ink, 20, 250).astype(np.uint8)
+            if rgb:
+                band = np.repeat(band[:, :, None], 3, axis=2)
+            f.write(band.tobytes())
+
+        ifd_offset = f.tell()
+        bits_offset = ifd_offset + 2 + 10 * 12 + 4
+        entries = [
+            (256, 4, 1, width), (257, 4, 1, height),
+            (258, 3, samples, bits_offset if rgb else 8),
+            (259, 3, 1, 1), (262, 3, 1, 2 if rgb else 1),
+            (273, 4, 1, data_offset), (277, 3, 1, samples),
+            (278, 4, 1, height), (279, 4, 1, width * height * samples), (284, 3, 1, 1)
+        ]
+        f.write(struct.pack('<H', len(entries)))
+        for tag, kind, count, value in entries:
+            packed = struct.pack('<H', value) + b'\x00\x00' if kind == 3 and count == 1 else struct.pack('<I', value)
+            f.write(struct.pack('<HHI', tag, kind, count) + packed)
+        f.write(struct.pack('<I', 0))
+        if rgb:
+            f.write(struct.pack('<HHH', 8, 8, 8))
+        f.seek(4)
+        f.write(struct.pack('<I', ifd_offset))
+    return cell
+
+
+def run_child(mode, path, window_mb, ppm):
+    code = f"BACKEND_DIR = {BACKEND_DIR!r}\nMODE = {mode!r}\nPATH = {path!r}\nWINDOW_MB = {window_mb}\nPPM = {ppm}\n" + CHILD
+    completed = subprocess.run([sys.executable, '-c', code], cwd=BACKEND_DIR, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {'error': completed.stderr.strip().splitlines()[-1] if completed.stderr else 'failed'}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', default=['5000x3750', '10000x7500', '20000x15000'])
+    parser.add_argument('--rgb', action='store_true', help='write 24-bit scans instead of 8-bit grayscale')
+    parser.add_argument('--window-mb', type=int, default=16)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--dir', default=tempfile.gettempdir(), help='where the synthetic scans are written')
+    parser.add_argument('--keep', action='store_true', help='keep the generated scans')
+    args = parser.parse_args()
+
+    print(f"{'size':>12} {'file MB':>8}  " + '  '.join(f"{mode:>24}" for mode in args.modes))
+    for size in args.sizes:
+        width, height = (int(value) for value in size.lower().split('x'))
+        path = os.path.join(args.dir, f"bench_scan_{width}x{height}{'_rgb' if args.rgb else ''}.tif")
+        cell = write_plan_tiff(path, width, height, rgb=args.rgb)
+        ppm = cell / 4.0  # each grid room is 4 m wide
+        try:
+            cells = []
+            results = {}
+            for mode in args.modes:
+                result = results[mode] = run_child(mode, path, args.window_mb, ppm)
+                if 'error' in result:
+                    cells.append(f"{result['error'][:24]:>24}")
+                else:
+                    growth = f"(+{result['peak_mb'] - result['baseline_mb']:.0f})"
+                    cells.append(f"{result['peak_mb']:>6.0f} MB {growth:>7} {result['seconds']:>6.2f}s")
+            print(f"{size:>12} {os.path.getsize(path) / 1e6:>8.0f}  " + '  '.join(cells))
+
+            for kind in ('preprocess', 'geometry'):
+                full, tiled = results.get(f'{kind}-full'), results.get(f'{kind}-tiled')
+                if full and tiled and 'error' not in full and 'error' not in tiled:
+                    same = {key: value for key, value in tiled.items() if key not in ('seconds', 'peak_mb', 'baseline_mb')}
+                    print(f"{'':>22}{kind}: peak {full['peak_mb']:.0f} -> {tiled['peak_mb']:.0f} MB; "
+                          f"full {dict((k, full[k]) for k in same)} tiled {same}")
+        finally:
+            if not args.keep:
+                os.remove(path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
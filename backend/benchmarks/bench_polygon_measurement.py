@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""Benchmark batch polygon measurement: vectorised ``measure_polygons`` vs a per-room loop.
+
+Generates N random room outlines (rectangles, L-shapes and irregular polygons) in pixel
+coordinates, measures them with ``services.polygon_measurement.measure_polygons`` and
+with a straightforward per-room Python shoelace, and checks both agree.
+
+    python benchmarks/bench_polygon_measurement.py [--rooms 50 500 5000] [--repeats 20]
+"""
+import os
+import sys
+import math
+import random
+import argparse
+import statistics
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def random_room(rng):
+    x, y = rng.uniform(0, 8000), rng.uniform(0, 6000)
+    w, h = rng.uniform(150, 900), rng.uniform(150, 900)
+    kind = rng.random()
+    if kind < 0.5:
+        return [[x, y], [x + w, y], [x + w, y + h], [x, y + h]]
+    if kind < 0.8:
+        cut_w, cut_h = w * rng.uniform(0.3, 0.6), h * rng.uniform(0.3, 0.6)
+        return [[x, y], [x + w, y], [x + w, y + h - cut_h], [x + w - cut_w, y + h - cut_h],
+                [x + w - cut_w, y + h], [x, y + h]]
+    sides = rng.randint(5, 12)
+    return [[x + w * math.cos(2 * math.pi * i / sides), y + h * math.sin(2 * math.pi * i / sides)]
+            for i in range(sides)]
+
+
+def loop_measure(polygons, ppm, wall_height, openings):
+    results = []
+    for polygon, opening in zip(polygons, openings):
+        area = perimeter = 0.0
+        for (x1, y1), (x2, y2) in zip(polygon, polygon[1:] + polygon[:1]):
+            area += x1 * y2 - x2 * y1
+            perimeter += math.hypot(x2 - x1, y2 - y1)
+        perimeter_m = perimeter / ppm
+        results.append((abs(area) / 2 / ppm ** 2, perimeter_m, max(perimeter_m * wall_height - opening, 0.0)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, nargs='+', default=[50, 500, 5000])
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    from services.polygon_measurement import measure_polygons
+
+    ppm, wall_height = 100.0, 2.4
+    rng = random.Random(3)
+    for count in args.rooms:
+        polygons = [random_room(rng) for _ in range(count)]
+        openings = [rng.choice([0.0, 1.89, 3.78, 5.1]) for _ in range(count)]
+
+        vector_times, loop_times = [], []
+        for _ in range(args.repeats):
+            started = time.perf_counter()
+            areas, perimeters, walls, _ = measure_polygons(polygons, ppm, wall_height, opening_areas=openings)
+            vector_times.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            expected = loop_measure(polygons, ppm, wall_height, openings)
+            loop_times.append((time.perf_counter() - started) * 1000)
+
+        worst = max(max(abs(areas[i] - e[0]), abs(walls[i] - e[2])) for i, e in enumerate(expected))
+        vector_ms, loop_ms = statistics.median(vector_times), statistics.median(loop_times)
+        print(f"{count:>6} rooms: vectorised {vector_ms:.2f}ms, per-room loop {loop_ms:.2f}ms "
+              f"({loop_ms / vector_ms:.1f}x), max difference {worst:.2e} m²")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""Benchmark quote pricing: vectorised ``pricing_engine`` vs the per-treatment branch loop.
+
+Generates N rooms with random wall/ceiling areas and treatment selections and prices
+them three ways:
+
+``route``     the previous route logic with its INFO log line per room and per line item
+              (to a handler writing to /dev/null)
+``loop``      the same branches without the logging
+``engine``    ``price_quote`` (compile rooms, price in one pass, build the line item dicts)
+``arrays``    ``price_rooms`` alone on already-compiled arrays (the numeric core)
+
+and checks the loop and the engine produce the same line items and subtotal.
+
+    python benchmarks/bench_pricing_engine.py [--rooms 10 1000 100000] [--repeats 5]
+"""
+import os
+import sys
+import math
+import random
+import argparse
+import logging
+import statistics
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def random_room(rng, index):
+    def treatments():
+        return {t: rng.random() < 0.4 for t in ('sanding_filling', 'priming', 'one_coat', 'two_coats')}
+
+    return {
+        'name': f'Room {index}',
+        'walls_surface_m2': round(rng.uniform(0, 90), 2) if rng.random() > 0.05 else 0,
+        'area_m2': round(rng.uniform(0, 40), 2) if rng.random() > 0.05 else 0,
+        'wall_treatments': treatments(),
+        'ceiling_treatments': treatments()
+    }
+
+
+def loop_price(rooms, pricing, log=None):
+    """The per-room, per-treatment branches the quote route used to run"""
+    keys = {
+        'walls': ('wall_sanding_price', 'wall_priming_price', 'wall_one_coat_price', 'wall_two_coats_price'),
+        'ceiling': ('ceiling_prep_price', 'ceiling_priming_price', 'ceiling_one_coat_price', 'ceiling_two_coats_price')
+    }
+    labels = ('Sanding & Filling', 'Priming', 'Painting (1 Coat)', 'Painting (2 Coats)')
+    treatments = ('sanding_filling', 'priming', 'one_coat', 'two_coats')
+    line_items = []
+    for room in rooms:
+        name = room.get('name', 'Unknown Room')
+        walls = float(room.get('walls_surface_m2', 0) or room.get('total_wall_area', 0))
+        ceiling = float(room.get('area_m2', 0) or room.get('total_ceiling_area', 0))
+        if log:
+            log.info(f"🔄 Processing room: {name} - Walls: {walls}m², Ceiling: {ceiling}m²")
+        if walls <= 0 and ceiling <= 0:
+            continue
+        for surface, area, selections in (('walls', walls, room.get('wall_treatments', {})),
+                                          ('ceiling', ceiling, room.get('ceiling_treatments', {}))):
+            if area <= 0:
+                continue
+            for treatment, label, key in zip(treatments, labels, keys[surface]):
+                if selections.get(treatment) is True:
+                    price = pricing[key]
+                    line_items.append({
+                        'description': f"{name} - {'Walls' if surface == 'walls' else 'Ceiling'} - {label}",
+                        'quantity': area, 'unit': 'm²', 'unit_price': price, 'total': area * price,
+                        'category': 'room_work', 'room': name, 'surface': surface, 'treatment': treatment
+                    })
+                    if log:
+                        log.info(f"✅ Added {surface} {treatment}: {area}m² × €{price}")
+    return line_items, sum(float(item['total']) for item in line_items)
+
+
+def timed(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, nargs='+', default=[10, 1000, 100000])
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    from services.pricing_engine import DEFAULT_PRICES, price_quote, compile_rooms, price_rooms, price_vector
+
+    log = logging.getLogger('bench.route')
+    log.setLevel(logging.INFO)
+    log.propagate = False
+    log.addHandler(logging.StreamHandler(open(os.devnull, 'w')))
+
+    pricing = dict(DEFAULT_PRICES)
+    prices = price_vector(pricing)
+    rng = random.Random(7)
+    print(f"{'rooms':>8} {'route':>12} {'loop':>12} {'engine':>12} {'arrays':>12} {'engine rooms/s':>16} {'arrays rooms/s':>16}  check")
+    for count in args.rooms:
+        rooms = [random_room(rng, index) for index in range(count)]
+        repeats = args.repeats if count <= 10000 else max(1, args.repeats // 2)
+
+        route_ms, _ = timed(lambda: loop_price(rooms, pricing, log), repeats)
+        loop_ms, (loop_items, loop_subtotal) = timed(lambda: loop_price(rooms, pricing), repeats)
+        engine_ms, priced = timed(lambda: price_quote({'rooms': rooms}, pricing, 0.2), repeats)
+        _, areas, mask = compile_rooms(rooms)
+        arrays_ms, _ = timed(lambda: price_rooms(areas, mask, prices), repeats * 4)
+
+        same = priced['line_items'] == loop_items and math.isclose(priced['subtotal'], loop_subtotal, rel_tol=1e-12)
+        print(f"{count:>8} {route_ms:>10.2f}ms {loop_ms:>10.2f}ms {engine_ms:>10.2f}ms {arrays_ms:>10.3f}ms "
+              f"{count / engine_ms * 1000:>16,.0f} {count / arrays_ms * 1000:>16,.0f}  "
+              f"{'identical' if same else 'MISMATCH'} ({len(loop_items)} line items)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""Benchmark the GPT room output parser against the recorded response corpus.
+
+Reports parse throughput and per-room accuracy (name, type, wall and ceiling area)
+for every response in ``parser_corpus.jsonl``.
+
+    python benchmarks/bench_room_parser.py [--iterations 200] [--verbose]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.room_parser import parse_rooms  # noqa: E402
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parser_corpus.jsonl')
+TOLERANCE = 0.01
+
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def room_matches(expected, actual):
+    return (
+        expected['name'] == actual['name']
+        and expected['type'] == actual['type']
+        and abs(expected['walls_surface_m2'] - actual['walls_surface_m2']) <= TOLERANCE
+        and abs(expected['area_m2'] - actual['area_m2']) <= TOLERANCE
+    )
+
+
+def score_case(case):
+    """Return (expected, parsed, correct) room counts for one response"""
+    expected = case['expected_rooms']
+    parsed = parse_rooms(case['text'])
+    correct = sum(
+        1 for exp, act in zip(expected, parsed) if room_matches(exp, act)
+    )
+    return len(expected), len(parsed), correct
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200, help='passes over the corpus for timing')
+    parser.add_argument('--verbose', action='store_true', help='print per-response results')
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    texts = [case['text'] for case in corpus]
+    total_bytes = sum(len(text.encode('utf-8')) for text in texts)
+
+    # Accuracy
+    expected_total = parsed_total = correct_total = 0
+    failing = []
+    for case in corpus:
+        expected, parsed, correct = score_case(case)
+        expected_total += expected
+        parsed_total += parsed
+        correct_total += correct
+        if correct != expected or parsed != expected:
+            failing.append(case['id'])
+        if args.verbose:
+            print(f"{case['id']:<45} expected={expected:<3} parsed={parsed:<3} correct={correct}")
+
+    # Throughput
+    for text in texts:  # warm-up
+        parse_rooms(text)
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        for text in texts:
+            parse_rooms(text)
+    elapsed = time.perf_counter() - start
+
+    responses = len(texts) * args.iterations
+    precision = correct_total / parsed_total if parsed_total else 1.0
+    recall = correct_total / expected_total if expected_total else 1.0
+
+    print(f"Corpus:      {len(corpus)} responses, {expected_total} rooms, {total_bytes / 1024:.1f} KiB")
+    print(f"Throughput:  {responses / elapsed:,.0f} responses/s, "
+          f"{total_bytes * args.iterations / elapsed / 1024 / 1024:.2f} MiB/s "
+          f"({elapsed / responses * 1e6:.1f} µs/response)")
+    print(f"Accuracy:    {correct_total}/{expected_total} rooms correct "
+          f"(precision {precision:.1%}, recall {recall:.1%})")
+    if failing:
+        print(f"Mismatches:  {', '.join(failing)}")
+
+    return 0 if not failing else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
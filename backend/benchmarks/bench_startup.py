@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""Benchmark web worker start-up: ``create_app()`` import time and resident memory.
+
+Every run happens in a fresh interpreter. ``lazy`` is what a gunicorn worker does today;
+``eager`` additionally imports the analysis stack the way ``floor_plan_analyzer`` used to
+at module import (OpenAI, OpenCV, NumPy, Pillow, matplotlib, gradio_client, WeasyPrint),
+which is the cost every worker paid before these imports were deferred.
+
+    python benchmarks/bench_startup.py [--runs 5]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Top-level imports floor_plan_analyzer / quote_generator had before they became lazy
+LEGACY_EAGER_MODULES = (
+    'openai', 'cv2', 'numpy', 'PIL.Image', 'matplotlib.pyplot', 'gradio_client', 'weasyprint',
+    'services.floor_plan_analyzer', 'services.image_preprocessor', 'services.geometry_engine'
+)
+WATCHED_MODULES = ('openai', 'cv2', 'numpy', 'PIL', 'matplotlib', 'gradio_client', 'weasyprint')
+
+CHILD = r"""
+import os, sys, json, time, importlib
+
+def rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+rss_before = rss_mb()
+started = time.perf_counter()
+from app import create_app
+app = create_app()
+create_app_s = time.perf_counter() - started
+
+skipped = []
+if EAGER:
+    for name in MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            skipped.append(f"{name} ({type(e).__name__})")
+total_s = time.perf_counter() - started
+
+print(json.dumps({
+    'create_app_s': create_app_s,
+    'total_s': total_s,
+    'rss_before_mb': rss_before,
+    'rss_after_mb': rss_mb(),
+    'loaded': [name for name in WATCHED if name in sys.modules],
+    'skipped': skipped
+}))
+"""
+
+
+def run_once(eager):
+    code = (f"EAGER = {eager!r}\nMODULES = {LEGACY_EAGER_MODULES!r}\n"
+            f"WATCHED = {WATCHED_MODULES!r}\n" + CHILD)
+    env = dict(os.environ)
+    env.setdefault('SECRET_KEY', 'bench-startup')
+    env.setdefault('JWT_SECRET_KEY', 'bench-startup')
+    output = subprocess.run(
+        [sys.executable, '-c', code], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per mode')
+    args = parser.parse_args()
+
+    run_once(eager=True)  # warm-up: compile bytecode so the first mode isn't penalised
+
+    results = {}
+    for mode, eager in (('lazy', False), ('eager', True)):
+        runs = [run_once(eager) for _ in range(args.runs)]
+        results[mode] = runs
+        last = runs[-1]
+        print(f"{mode:<6} create_app {statistics.median(r['create_app_s'] for r in runs) * 1000:7.0f} ms  "
+              f"total {statistics.median(r['total_s'] for r in runs) * 1000:7.0f} ms  "
+              f"RSS {statistics.median(r['rss_before_mb'] for r in runs):6.1f} -> "
+              f"{statistics.median(r['rss_after_mb'] for r in runs):6.1f} MiB")
+        print(f"       heavy modules loaded: {', '.join(last['loaded']) or 'none'}")
+        if last['skipped']:
+            print(f"       not importable here: {', '.join(last['skipped'])}")
+
+    saved_ms = (statistics.median(r['total_s'] for r in results['eager'])
+                - statistics.median(r['total_s'] for r in results['lazy'])) * 1000
+    saved_mb = (statistics.median(r['rss_after_mb'] for r in results['eager'])
+                - statistics.median(r['rss_after_mb'] for r in results['lazy']))
+    print(f"Deferred per worker: {saved_ms:.0f} ms start-up, {saved_mb:.1f} MiB RSS")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+"""Fault-injection benchmark for vision calls against a local OpenAI-compatible stub server.
+
+The stub serves ``POST /v1/chat/completions`` (streaming and non-streaming) with a
+seeded mix of faults: slow tail responses, 429s, 500s and stalled connections. The same
+sequence of calls runs twice:
+
+``plain``      ``OpenAIVisionBackend`` with no SDK retries and the SDK's default
+               timeout. This is how vision calls were made before (a transient error
+               became an empty analysis).
+``resilient``  ``ResilientVisionBackend``: deadline, jittered backoff, hedging and a
+               circuit breaker.
+
+An ``outage`` phase then returns 503 for every request and shows the breaker failing
+fast instead of every call burning its retry budget.
+
+    python benchmarks/bench_vision_resilience.py [--calls 200] [--concurrency 8]
+        [--latency-ms 300] [--slow-rate 0.05] [--error-rate 0.08] [--stall-rate 0.02]
+
+Run only the stub (then point the app at it with OPENAI_BASE_URL=http://127.0.0.1:PORT/v1):
+
+    python benchmarks/bench_vision_resilience.py --serve 8765
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+CORPUS_PATH = os.path.join(BACKEND_DIR, 'benchmarks', 'parser_corpus.jsonl')
+
+
+class StubState:
+    """Fault mix shared by all handler threads; decisions come from a seeded RNG"""
+
+    def __init__(self, args, text):
+        self.latency = args.latency_ms / 1000
+        self.slow = args.slow_ms / 1000
+        self.stall = args.stall_ms / 1000
+        self.slow_rate = args.slow_rate
+        self.error_rate = args.error_rate
+        self.stall_rate = args.stall_rate
+        self.outage = False
+        self.text = text
+        self.rng = random.Random(args.seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def decide(self):
+        with self.lock:
+            self.requests += 1
+            if self.outage:
+                return 'outage'
+            roll = self.rng.random()
+        for fault, rate in (('error', self.error_rate), ('stall', self.stall_rate), ('slow', self.slow_rate)):
+            if roll < rate:
+                return fault
+            roll -= rate
+        return 'ok'
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            fault = state.decide()
+
+            if fault == 'outage':
+                return self._json(503, {'error': {'message': 'upstream unavailable', 'type': 'server_error'}})
+            if fault == 'error':
+                if random.random() < 0.5:
+                    return self._json(429, {'error': {'message': 'rate limited', 'type': 'rate_limit'}},
+                                      headers={'retry-after': '0.2'})
+                return self._json(500, {'error': {'message': 'internal error', 'type': 'server_error'}})
+
+            delay = {'stall': state.stall, 'slow': state.slow}.get(fault, state.latency)
+            usage = {'prompt_tokens': 1100, 'completion_tokens': 400, 'total_tokens': 1500}
+            base = {'id': 'chatcmpl-stub', 'created': int(time.time()), 'model': request.get('model', 'gpt-4o')}
+
+            if not request.get('stream'):
+                time.sleep(delay)
+                return self._json(200, dict(base, object='chat.completion', usage=usage, choices=[{
+                    'index': 0, 'finish_reason': 'stop',
+                    'message': {'role': 'assistant', 'content': state.text}
+                }]))
+
+            # Streaming: the delay is spent before the first token (where stalls happen in practice)
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+
+            def send(payload):
+                data = f"data: {payload}\n\n".encode('utf-8')
+                self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+
+            try:
+                for line in state.text.split('\n'):
+                    send(json.dumps(dict(base, object='chat.completion.chunk', choices=[
+                        {'index': 0, 'delta': {'content': line + '\n'}, 'finish_reason': None}
+                    ])))
+                send(json.dumps(dict(base, object='chat.completion.chunk', choices=[], usage=usage)))
+                send('[DONE]')
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Handler
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # clients hanging up on stalled/hedged requests is expected
+
+
+def start_stub(state, port=0):
+    server = StubServer(('127.0.0.1', port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_calls(backend, calls, concurrency, stream):
+    from services.room_parser import parse_rooms
+
+    request_kwargs = {'model': 'gpt-4o', 'max_tokens': 1000, 'temperature': 0.1,
+                      'messages': [{'role': 'user', 'content': 'Measure the rooms in this floor plan.'}]}
+
+    def one(_):
+        started = time.perf_counter()
+        try:
+            if stream:
+                text = ''.join(chunk.text or '' for chunk in backend.stream(request_kwargs))
+            else:
+                text = backend.complete(request_kwargs).text
+            ok = bool(parse_rooms(text))
+        except Exception as e:
+            ok, text = False, f'{type(e).__name__}'
+        return ok, time.perf_counter() - started, None if ok else text
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, range(calls)))
+
+
+def report(label, results, wall):
+    latencies = [seconds for _, seconds, _ in results]
+    ok = sum(1 for success, _, _ in results if success)
+    errors = {}
+    for success, _, error in results:
+        if not success:
+            errors[error] = errors.get(error, 0) + 1
+    print(f"{label:<10} {ok}/{len(results)} usable ({ok / len(results) * 100:.1f}%), "
+          f"p50 {statistics.median(latencies) * 1000:.0f}ms, p95 {percentile(latencies, 95) * 1000:.0f}ms, "
+          f"p99 {percentile(latencies, 99) * 1000:.0f}ms, max {max(latencies) * 1000:.0f}ms, wall {wall:.1f}s"
+          + (f"; errors {errors}" if errors else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--mode', choices=('stream', 'complete'), default='stream')
+    parser.add_argument('--latency-ms', type=float, default=300.0, help='normal response latency')
+    parser.add_argument('--slow-ms', type=float, default=4000.0, help='latency of slow tail responses')
+    parser.add_argument('--stall-ms', type=float, default=30000.0, help='how long a stalled response hangs')
+    parser.add_argument('--slow-rate', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0.08, help='429/500 share')
+    parser.add_argument('--stall-rate', type=float, default=0.02)
+    parser.add_argument('--deadline', type=float, default=10.0, help='resilient per-call budget, seconds')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--serve', type=int, metavar='PORT', help='only run the stub server')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR)
+
+    with open(CORPUS_PATH, 'r', encoding='utf-8') as f:
+        text = next(case['text'] for case in map(json.loads, f) if case['expected_rooms'])
+
+    state = StubState(args, text)
+    server = start_stub(state, args.serve or 0)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    if args.serve:
+        print(f"Stub OpenAI server on {base_url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            return 0
+
+    from openai import OpenAI
+    from services.resilience import CircuitBreaker
+    from services.vision_backends import OpenAIVisionBackend, ResilientVisionBackend
+
+    stream = args.mode == 'stream'
+    print(f"Stub: {args.latency_ms:.0f}ms normal, {args.slow_rate:.0%} slow ({args.slow_ms:.0f}ms), "
+          f"{args.error_rate:.0%} 429/500, {args.stall_rate:.0%} stalled ({args.stall_ms / 1000:.0f}s); "
+          f"{args.calls} {args.mode} calls at concurrency {args.concurrency}")
+
+    plain = OpenAIVisionBackend(OpenAI(api_key='stub', base_url=base_url, max_retries=0))
+    started = time.perf_counter()
+    results = run_calls(plain, args.calls, args.concurrency, stream)
+    report('plain', results, time.perf_counter() - started)
+
+    state.rng = random.Random(args.seed)
+    resilient = ResilientVisionBackend(
+        OpenAIVisionBackend(OpenAI(api_key='stub', base_url=base_url, max_retries=0)),
+        deadline_seconds=args.deadline, max_attempts=3, backoff_base=0.2, backoff_max=2.0,
+        hedge=True, hedge_min_samples=10, hedge_min_delay=0.5,
+        breaker=CircuitBreaker(failure_rate=0.5, min_calls=10, window_size=20, window_seconds=30, open_seconds=5, name='vision')
+    )
+    started = time.perf_counter()
+    results = run_calls(resilient, args.calls, args.concurrency, stream)
+    report('resilient', results, time.perf_counter() - started)
+    snapshot = resilient.snapshot()
+    print(f"           attempts {snapshot['attempts']}, retries {snapshot['retries']}, hedges {snapshot['hedges']} "
+          f"({snapshot['hedge_wins']} won), deadline exceeded {snapshot['deadline_exceeded']}, "
+          f"hedge delay {snapshot['hedge_delay_seconds'][args.mode] or 0:.2f}s")
+
+    state.outage = True
+    requests_before = state.requests
+    started = time.perf_counter()
+    results = run_calls(resilient, 50, args.concurrency, stream)
+    report('outage', results, time.perf_counter() - started)
+    print(f"           {state.requests - requests_before} upstream requests for 50 calls; "
+          f"breaker {resilient.breaker.snapshot()}")
+
+    server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
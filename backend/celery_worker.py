@@ -0,0 +1,19 @@
+# celery_worker.py - Entry point for Celery analysis workers
+#
+# Start with:
+#   celery -A celery_worker.celery worker --loglevel=info
+#
+# and set ANALYSIS_JOB_BACKEND=celery on the web processes.
+from dotenv import load_dotenv
+load_dotenv()
+
+from app import create_app
+from services.analysis_jobs import analysis_queue
+from services.analyzer_registry import preload_analysis_modules
+
+app = create_app()
+
+# Web workers load the vision/OpenCV stack lazily; analysis workers only exist to run
+# jobs, so import it before the pool forks and children share the pages
+preload_analysis_modules()
+celery = analysis_queue.celery
@@ -102,6 +102,39 @@ class Config:
     OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4o')
     OPENAI_MAX_TOKENS = int(os.environ.get('OPENAI_MAX_TOKENS', 4000))
     OPENAI_TEMPERATURE = float(os.environ.get('OPENAI_TEMPERATURE', 0.3))
+    # Pooled HTTP client shared by every analysis in a worker process (seconds / counts)
+    OPENAI_CONNECT_TIMEOUT = float(os.environ.get('OPENAI_CONNECT_TIMEOUT', 10))
+    OPENAI_READ_TIMEOUT = float(os.environ.get('OPENAI_READ_TIMEOUT', 120))
+    OPENAI_MAX_CONNECTIONS = int(os.environ.get('OPENAI_MAX_CONNECTIONS', 20))
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('OPENAI_MAX_KEEPALIVE_CONNECTIONS', 10))
+    OPENAI_KEEPALIVE_EXPIRY = float(os.environ.get('OPENAI_KEEPALIVE_EXPIRY', 60))
+    OPENAI_MAX_RETRIES = int(os.environ.get('OPENAI_MAX_RETRIES', 2))  # SDK retries, only used with VISION_RESILIENCE_ENABLED off
+    OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL')  # e.g. a local stub server for fault testing
+    ANALYSIS_MAX_CONCURRENT_VISION_CALLS = int(os.environ.get('ANALYSIS_MAX_CONCURRENT_VISION_CALLS', 4))
+    # Vision backend: openai (live), record (live + store responses) or replay (offline)
+    VISION_BACKEND = os.environ.get('VISION_BACKEND', 'openai')
+    VISION_RECORDINGS_DIR = os.environ.get('VISION_RECORDINGS_DIR') or os.path.join(BASE_DIR, 'recordings', 'vision')
+    VISION_REPLAY_LATENCY_MS = float(os.environ['VISION_REPLAY_LATENCY_MS']) if os.environ.get('VISION_REPLAY_LATENCY_MS') else None
+    VISION_REPLAY_JITTER_MS = float(os.environ.get('VISION_REPLAY_JITTER_MS', 0))
+    VISION_REPLAY_ON_MISS = os.environ.get('VISION_REPLAY_ON_MISS', 'error')  # error or any
+    # Vision call resilience: total latency budget, retries with jittered backoff, hedged
+    # second request after the p95 response time, and a failure-rate circuit breaker.
+    # Hedging is opt-in: a hedge is a second paid request (the loser is billed too) and is
+    # only sent when one of ANALYSIS_MAX_CONCURRENT_VISION_CALLS is free
+    VISION_RESILIENCE_ENABLED = os.environ.get('VISION_RESILIENCE_ENABLED', 'true').lower() in ['true', 'on', '1']
+    VISION_DEADLINE_SECONDS = float(os.environ.get('VISION_DEADLINE_SECONDS', 90))
+    VISION_MAX_ATTEMPTS = int(os.environ.get('VISION_MAX_ATTEMPTS', 3))
+    VISION_BACKOFF_BASE_SECONDS = float(os.environ.get('VISION_BACKOFF_BASE_SECONDS', 0.5))
+    VISION_BACKOFF_MAX_SECONDS = float(os.environ.get('VISION_BACKOFF_MAX_SECONDS', 8))
+    VISION_HEDGE_ENABLED = os.environ.get('VISION_HEDGE_ENABLED', 'false').lower() in ['true', 'on', '1']
+    VISION_HEDGE_PERCENTILE = float(os.environ.get('VISION_HEDGE_PERCENTILE', 95))
+    VISION_HEDGE_MIN_SAMPLES = int(os.environ.get('VISION_HEDGE_MIN_SAMPLES', 20))  # no hedging until this many calls observed
+    VISION_HEDGE_MIN_DELAY_SECONDS = float(os.environ.get('VISION_HEDGE_MIN_DELAY_SECONDS', 2))
+    VISION_BREAKER_FAILURE_RATE = float(os.environ.get('VISION_BREAKER_FAILURE_RATE', 0.5))
+    VISION_BREAKER_MIN_CALLS = int(os.environ.get('VISION_BREAKER_MIN_CALLS', 10))
+    VISION_BREAKER_WINDOW_SIZE = int(os.environ.get('VISION_BREAKER_WINDOW_SIZE', 20))  # most recent attempts considered
+    VISION_BREAKER_WINDOW_SECONDS = float(os.environ.get('VISION_BREAKER_WINDOW_SECONDS', 60))
+    VISION_BREAKER_OPEN_SECONDS = float(os.environ.get('VISION_BREAKER_OPEN_SECONDS', 30))
     
     # Stripe Configuration
     STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY')
@@ -261,11 +294,84 @@ class Config:
     CACHE_TYPE = os.environ.get('CACHE_TYPE', 'simple')
     CACHE_REDIS_URL = os.environ.get('REDIS_URL')
     CACHE_DEFAULT_TIMEOUT = int(os.environ.get('CACHE_DEFAULT_TIMEOUT', 300))  # 5 minutes
+    # Compiled per-company price tables: re-check the settings version stamp after this many
+    # seconds (0 = on every quote, so edits made through another worker apply immediately)
+    PRICE_TABLE_REVALIDATE_SECONDS = float(os.environ.get('PRICE_TABLE_REVALIDATE_SECONDS', 0))
+    # Quote previews kept in memory for incremental re-pricing (per worker process)
+    QUOTE_PREVIEW_TTL_SECONDS = int(os.environ.get('QUOTE_PREVIEW_TTL_SECONDS', 1800))
+    QUOTE_PREVIEW_MAX_ENTRIES = int(os.environ.get('QUOTE_PREVIEW_MAX_ENTRIES', 1000))
+    # Batch quotes: PDF rendering processes per web worker (empty = CPU count, 1 = in-process),
+    # seconds allowed per PDF, and projects per request
+    QUOTE_PDF_WORKERS = int(os.environ.get('QUOTE_PDF_WORKERS') or 0)
+    QUOTE_PDF_TIMEOUT = int(os.environ.get('QUOTE_PDF_TIMEOUT', 120))
+    QUOTE_BATCH_MAX_PROJECTS = int(os.environ.get('QUOTE_BATCH_MAX_PROJECTS', 100))
     
     # Task Queue Configuration (for background jobs)
     CELERY_BROKER_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
     CELERY_RESULT_BACKEND = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
     
+    # Floor plan analysis jobs: 'thread' (in-process pool) or 'celery' (worker processes)
+    ANALYSIS_JOB_BACKEND = os.environ.get('ANALYSIS_JOB_BACKEND', 'thread')
+    ANALYSIS_JOB_WORKERS = int(os.environ.get('ANALYSIS_JOB_WORKERS', 2))
+    # Workers refresh the updated_at of the jobs they hold every HEARTBEAT seconds; queued or
+    # running jobs without a heartbeat for STALE seconds were lost with their process and are failed
+    ANALYSIS_JOB_HEARTBEAT_SECONDS = int(os.environ.get('ANALYSIS_JOB_HEARTBEAT_SECONDS', 30))
+    ANALYSIS_JOB_STALE_SECONDS = int(os.environ.get('ANALYSIS_JOB_STALE_SECONDS', 180))
+    # Fair sharing of analysis workers between companies by Subscription.plan_name: relative
+    # weights while several companies wait, jobs each company may run at once, and how many
+    # may wait before new ones are refused (0 = unlimited)
+    ANALYSIS_TIER_WEIGHTS = os.environ.get('ANALYSIS_TIER_WEIGHTS', 'enterprise:8,professional:4,starter:2,trial:1')
+    ANALYSIS_TIER_CONCURRENCY = os.environ.get('ANALYSIS_TIER_CONCURRENCY', 'enterprise:4,professional:2,starter:1,trial:1')
+    ANALYSIS_MAX_QUEUED_PER_COMPANY = int(os.environ.get('ANALYSIS_MAX_QUEUED_PER_COMPANY', 100))
+    ANALYSIS_CAPACITY_RETRY_SECONDS = int(os.environ.get('ANALYSIS_CAPACITY_RETRY_SECONDS', 5))  # celery: re-check a capped company after
+    ANALYSIS_IMAGE_WORKERS = int(os.environ.get('ANALYSIS_IMAGE_WORKERS', 4))  # concurrent images per job
+    ANALYSIS_STREAMING = os.environ.get('ANALYSIS_STREAMING', 'true').lower() in ['true', 'on', '1']  # stream rooms as they are generated
+    ANALYSIS_STREAM_POLL_INTERVAL = float(os.environ.get('ANALYSIS_STREAM_POLL_INTERVAL', 0.5))  # SSE job polling, seconds
+    ANALYSIS_STREAM_TIMEOUT = int(os.environ.get('ANALYSIS_STREAM_TIMEOUT', 900))  # max SSE connection length, seconds
+    ANALYSIS_ROOM_CROP_PADDING = float(os.environ.get('ANALYSIS_ROOM_CROP_PADDING', 0.15))  # margin around a re-analyzed room, fraction of its size
+    # Near-duplicate floor plan detection at upload (perceptual hash Hamming distance, 0-64 bits;
+    # the banded index finds every match up to 3, larger distances only when a band matches)
+    ANALYSIS_DEDUP_ENABLED = os.environ.get('ANALYSIS_DEDUP_ENABLED', 'true').lower() in ['true', 'on', '1']
+    ANALYSIS_DEDUP_MAX_DISTANCE = int(os.environ.get('ANALYSIS_DEDUP_MAX_DISTANCE', 3))
+    # Re-parse of stored analyses (`flask reparse-analyses` / admin endpoint); the state file holds the resume cursor
+    ANALYSIS_BACKFILL_WORKERS = int(os.environ.get('ANALYSIS_BACKFILL_WORKERS', 2))
+    ANALYSIS_BACKFILL_BATCH_SIZE = int(os.environ.get('ANALYSIS_BACKFILL_BATCH_SIZE', 200))
+    ANALYSIS_BACKFILL_STATE_FILE = os.path.abspath(os.environ.get('ANALYSIS_BACKFILL_STATE_FILE') or os.path.join(BASE_DIR, 'cache', 'reparse_state.json'))
+    
+    # Content-addressed cache of GPT vision results (image hash + model + prompt version)
+    ANALYSIS_CACHE_ENABLED = os.environ.get('ANALYSIS_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']
+    ANALYSIS_CACHE_DIR = os.path.abspath(os.environ.get('ANALYSIS_CACHE_DIR') or os.path.join(BASE_DIR, 'cache', 'analysis'))
+    ANALYSIS_CACHE_MAX_ENTRIES = int(os.environ.get('ANALYSIS_CACHE_MAX_ENTRIES', 1000))
+    ANALYSIS_CACHE_TTL_SECONDS = int(os.environ.get('ANALYSIS_CACHE_TTL_SECONDS', 30 * 24 * 3600))  # 30 days
+    
+    # Image pre-processing before the vision call (orient, grayscale, crop, downscale, re-encode)
+    ANALYSIS_IMAGE_PREPROCESS = os.environ.get('ANALYSIS_IMAGE_PREPROCESS', 'true').lower() in ['true', 'on', '1']
+    ANALYSIS_IMAGE_MAX_EDGE = int(os.environ.get('ANALYSIS_IMAGE_MAX_EDGE', 2048))  # pixels
+    ANALYSIS_IMAGE_FORMAT = os.environ.get('ANALYSIS_IMAGE_FORMAT', 'PNG')  # PNG or JPEG
+    ANALYSIS_IMAGE_JPEG_QUALITY = int(os.environ.get('ANALYSIS_IMAGE_JPEG_QUALITY', 85))
+    # Scans above ANALYSIS_LARGE_IMAGE_PIXELS are read in windows (memory-mapped when stored
+    # uncompressed); formats that must be decoded whole are refused above the memory limit
+    ANALYSIS_LARGE_IMAGE_PIXELS = int(os.environ.get('ANALYSIS_LARGE_IMAGE_PIXELS', 40_000_000))
+    ANALYSIS_TILE_WINDOW_MB = int(os.environ.get('ANALYSIS_TILE_WINDOW_MB', 16))
+    ANALYSIS_IMAGE_MEMORY_LIMIT_MB = int(os.environ.get('ANALYSIS_IMAGE_MEMORY_LIMIT_MB', 512))
+    
+    # PDF uploads are rendered page by page (pypdfium2) once and cached by file hash + page
+    ANALYSIS_PDF_DPI = int(os.environ.get('ANALYSIS_PDF_DPI', 200))
+    ANALYSIS_PDF_MAX_EDGE = int(os.environ.get('ANALYSIS_PDF_MAX_EDGE', 4096))  # pixels, caps large sheets
+    ANALYSIS_PDF_MAX_PAGES = int(os.environ.get('ANALYSIS_PDF_MAX_PAGES', 20))
+    ANALYSIS_PDF_CACHE_DIR = os.path.abspath(os.environ.get('ANALYSIS_PDF_CACHE_DIR') or os.path.join(BASE_DIR, 'cache', 'pdf_pages'))
+    ANALYSIS_PDF_CACHE_MAX_ENTRIES = int(os.environ.get('ANALYSIS_PDF_CACHE_MAX_ENTRIES', 500))  # PDFs, not pages
+    
+    # Measurement engine: 'vision' (GPT) or 'geometry' (offline OpenCV only). The geometry
+    # fallback for failed vision calls is opt-in: its rooms are marked unverified and are not
+    # copied into the project's measurements
+    ANALYSIS_MEASUREMENT_ENGINE = os.environ.get('ANALYSIS_MEASUREMENT_ENGINE', 'vision')
+    ANALYSIS_GEOMETRY_FALLBACK = os.environ.get('ANALYSIS_GEOMETRY_FALLBACK', 'false').lower() in ['true', 'on', '1']
+    ANALYSIS_PIXELS_PER_METRE = float(os.environ['ANALYSIS_PIXELS_PER_METRE']) if os.environ.get('ANALYSIS_PIXELS_PER_METRE') else None
+    ANALYSIS_GEOMETRY_MIN_ROOM_M2 = float(os.environ.get('ANALYSIS_GEOMETRY_MIN_ROOM_M2', 1.0))
+    ANALYSIS_GEOMETRY_MAX_EDGE = int(os.environ.get('ANALYSIS_GEOMETRY_MAX_EDGE', 2000))  # pixels
+    ANALYSIS_ASSUMED_WALL_THICKNESS_M = float(os.environ.get('ANALYSIS_ASSUMED_WALL_THICKNESS_M', 0.15))  # scale estimate when no pixels/metre is set
+    
     @classmethod
     def init_app(cls, app):
         """Initialize application with configuration"""
@@ -396,6 +502,12 @@ class TestingConfig(Config):
     # Use simple cache for testing
     CACHE_TYPE = 'simple'
     
+    # Run analysis jobs in-process for tests
+    ANALYSIS_JOB_BACKEND = 'thread'
+    ANALYSIS_STREAM_POLL_INTERVAL = 0.1
+    ANALYSIS_CACHE_DIR = os.path.join(Config.BASE_DIR, 'test_cache', 'analysis')
+    ANALYSIS_PDF_CACHE_DIR = os.path.join(Config.BASE_DIR, 'test_cache', 'pdf_pages')
+    
     # No cache for testing
     SEND_FILE_MAX_AGE_DEFAULT = 0
 
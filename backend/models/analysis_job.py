@@ -0,0 +1,103 @@
+# models/analysis_job.py
+from datetime import datetime
+import uuid
+from . import db
+
+class AnalysisJob(db.Model):
+    """Background floor plan analysis job with status/progress tracking"""
+    __tablename__ = 'analysis_jobs'
+
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    kind = db.Column(db.String(30), nullable=False, default='floor_plan')
+
+    # Status and progress
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, completed, failed
+    progress = db.Column(db.Integer, nullable=False, default=0)  # 0-100
+    stage = db.Column(db.String(50), nullable=True)
+    message = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+
+    # Job input and output
+    params = db.Column(db.JSON, nullable=True)
+    result_summary = db.Column(db.JSON, nullable=True)
+    partial_rooms = db.Column(db.JSON, nullable=True)  # rooms streamed in while the job runs
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id', ondelete='CASCADE'), nullable=False, index=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False, index=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+
+    project = db.relationship('Project', backref=db.backref('analysis_jobs', cascade='all, delete-orphan', passive_deletes=True))
+
+    ACTIVE_STATUSES = ('queued', 'running')
+
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
+
+    @property
+    def duration_seconds(self):
+        if not self.started_at:
+            return None
+        end = self.finished_at or datetime.utcnow()
+        return round((end - self.started_at).total_seconds(), 2)
+
+    def mark_running(self):
+        self.status = 'running'
+        self.started_at = datetime.utcnow()
+        self.progress = max(self.progress or 0, 1)
+        self.stage = 'starting'
+        self.partial_rooms = []
+
+    def update_progress(self, progress, stage=None, message=None):
+        self.progress = max(0, min(100, int(progress)))
+        if stage:
+            self.stage = stage
+        if message:
+            self.message = message
+
+    def add_partial_rooms(self, rooms):
+        # Reassign so SQLAlchemy notices the JSON change
+        self.partial_rooms = list(self.partial_rooms or []) + list(rooms)
+
+    def mark_completed(self, result_summary=None, message=None):
+        self.status = 'completed'
+        self.progress = 100
+        self.stage = 'completed'
+        self.result_summary = result_summary
+        self.message = message
+        self.finished_at = datetime.utcnow()
+
+    def mark_failed(self, error):
+        self.status = 'failed'
+        self.stage = 'failed'
+        self.error = error
+        self.finished_at = datetime.utcnow()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'stage': self.stage,
+            'message': self.message,
+            'error': self.error,
+            'params': self.params or {},
+            'result_summary': self.result_summary,
+            'partial_rooms': self.partial_rooms or [],
+            'project_id': self.project_id,
+            'company_id': self.company_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'duration_seconds': self.duration_seconds
+        }
+
+    def __repr__(self):
+        return f'<AnalysisJob {self.id} project={self.project_id} status={self.status}>'
@@ -0,0 +1,48 @@
+# models/floor_plan_image.py
+from datetime import datetime
+from . import db
+
+class FloorPlanImage(db.Model):
+    """Perceptual hash of an uploaded floor plan, used to spot re-uploads across a company"""
+    __tablename__ = 'floor_plan_images'
+
+    id = db.Column(db.Integer, primary_key=True)
+    image_path = db.Column(db.String(500), nullable=False)
+    dhash = db.Column(db.String(16), nullable=False)  # 64-bit difference hash, hex
+
+    # 16-bit slices of the hash; near-duplicates share at least one band
+    band_0 = db.Column(db.Integer, nullable=False)
+    band_1 = db.Column(db.Integer, nullable=False)
+    band_2 = db.Column(db.Integer, nullable=False)
+    band_3 = db.Column(db.Integer, nullable=False)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Relationships
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id', ondelete='CASCADE'), nullable=False, index=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False, index=True)
+
+    project = db.relationship('Project', backref=db.backref('floor_plan_images', cascade='all, delete-orphan', passive_deletes=True))
+
+    __table_args__ = (
+        db.Index('ix_floor_plan_images_company_band_0', 'company_id', 'band_0'),
+        db.Index('ix_floor_plan_images_company_band_1', 'company_id', 'band_1'),
+        db.Index('ix_floor_plan_images_company_band_2', 'company_id', 'band_2'),
+        db.Index('ix_floor_plan_images_company_band_3', 'company_id', 'band_3'),
+    )
+
+    @property
+    def hash_value(self):
+        return int(self.dhash, 16)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'project_id': self.project_id,
+            'image': self.image_path.replace('\\', '/').split('/')[-1] if self.image_path else None,
+            'dhash': self.dhash,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+    def __repr__(self):
+        return f'<FloorPlanImage {self.id} project={self.project_id} dhash={self.dhash}>'
@@ -60,6 +60,11 @@ class Quote(db.Model):
     is_signed = db.Column(db.Boolean, default=False)
     signed_at = db.Column(db.DateTime, nullable=True)
     
+    # Materialized at write time (see refresh_summary / record_signature) so listings
+    # never aggregate line items or query signatures per row
+    summary = db.Column(db.JSON, nullable=True)
+    signature_info = db.Column(db.JSON, nullable=True)
+    
     # File paths
     pdf_path = db.Column(db.String(500), nullable=True)
     signed_pdf_path = db.Column(db.String(500), nullable=True)
@@ -87,6 +92,75 @@ class Quote(db.Model):
         """Get the most recent signature"""
         return self.signatures.order_by(QuoteSignature.signed_at.desc()).first()
     
+    def build_summary(self):
+        """Line item counts, cost breakdown and per-room totals in one pass over the line items"""
+        counts = {'room_work': 0, 'interior': 0, 'exterior': 0, 'special': 0}
+        breakdown = {'rooms': 0, 'interior': 0, 'exterior': 0, 'special': 0}
+        rooms = {}
+        
+        line_items = self.line_items or []
+        for item in line_items:
+            category = item.get('category')
+            total = item.get('total', 0)
+            if category in counts:
+                counts[category] += 1
+            
+            # Uncategorised items are costed as special work, as in get_cost_breakdown
+            if category == 'room_work':
+                breakdown['rooms'] += total
+            elif category in breakdown:
+                breakdown[category] += total
+            else:
+                breakdown['special'] += total
+            
+            if category == 'room_work' and item.get('room'):
+                room = rooms.setdefault(item['room'], {
+                    'room': item['room'], 'wall_total': 0, 'ceiling_total': 0, 'room_total': 0,
+                    'wall_area': 0, 'ceiling_area': 0
+                })
+                if item.get('surface') == 'walls':
+                    room['wall_total'] += total
+                    room['wall_area'] = max(room['wall_area'], item.get('quantity', 0))
+                elif item.get('surface') == 'ceiling':
+                    room['ceiling_total'] += total
+                    room['ceiling_area'] = max(room['ceiling_area'], item.get('quantity', 0))
+                room['room_total'] += total
+        
+        # Measured areas win when larger, as in get_room_summary
+        for room_data in (self.measurement_details or {}).get('rooms') or []:
+            room = rooms.get(room_data.get('name'))
+            if room:
+                room['wall_area'] = max(room['wall_area'], float(room_data.get('total_wall_area', 0) or room_data.get('walls_surface_m2', 0)))
+                room['ceiling_area'] = max(room['ceiling_area'], float(room_data.get('total_ceiling_area', 0) or room_data.get('area_m2', 0)))
+        
+        return {
+            'total_line_items': len(line_items),
+            'room_based_items': counts['room_work'],
+            'interior_items': counts['interior'],
+            'exterior_items': counts['exterior'],
+            'special_items': counts['special'],
+            'total_rooms': len(rooms),
+            'total_wall_area': sum(room['wall_area'] for room in rooms.values()),
+            'total_ceiling_area': sum(room['ceiling_area'] for room in rooms.values()),
+            'cost_breakdown': breakdown,
+            'room_totals': list(rooms.values())
+        }
+    
+    def refresh_summary(self):
+        """Re-materialize the summary; call whenever line_items or measurement_details change"""
+        self.summary = self.build_summary()
+    
+    def record_signature(self, signature):
+        """Mark the quote signed by ``signature`` (flushed, so its signed_at is set)"""
+        self.is_signed = True
+        self.signed_at = signature.signed_at or datetime.utcnow()
+        self.signature_info = {
+            'client_name': signature.client_name,
+            'client_email': signature.client_email,
+            'signed_at': self.signed_at.isoformat(),
+            'is_verified': signature.is_verified
+        }
+    
     def get_room_summary(self):
         """Get room work summary from line items and measurement details"""
         rooms_summary = {}
@@ -197,8 +271,12 @@ class Quote(db.Model):
         
         return summary
     
-    def to_dict(self, include_project=True, include_company=True, include_summary=True):
-        """Convert quote to dictionary with comprehensive information"""
+    def to_dict(self, include_project=True, include_company=True, include_summary=True, include_details=True):
+        """Convert quote to dictionary with comprehensive information.
+
+        Summaries and signature info come from the materialized columns; ``include_details=False``
+        (listings) leaves out the line items and measurement details.
+        """
         quote_dict = {
             'id': self.id,
             'quote_number': self.quote_number,
@@ -207,8 +285,6 @@ class Quote(db.Model):
             'subtotal': float(self.subtotal),
             'vat_amount': float(self.vat_amount),
             'total_amount': float(self.total_amount),
-            'line_items': self.line_items or [],
-            'measurement_details': self.measurement_details or {},
             'status': self.status,
             'valid_until': self.valid_until.isoformat() if self.valid_until else None,
             'is_expired': self.is_expired,
@@ -222,26 +298,42 @@ class Quote(db.Model):
             'project_id': self.project_id
         }
         
+        if include_details:
+            quote_dict['line_items'] = self.line_items or []
+            quote_dict['measurement_details'] = self.measurement_details or {}
+        
         # Include work summary for better frontend handling
         if include_summary:
-            quote_dict['work_summary'] = self.get_work_summary()
+            # Quotes written before summaries were materialized are summarized on the fly
+            summary = self.summary or self.build_summary()
+            quote_dict['work_summary'] = {
+                'total_rooms': summary['total_rooms'],
+                'total_wall_area': summary['total_wall_area'],
+                'total_ceiling_area': summary['total_ceiling_area'],
+                'total_interior_items': summary['interior_items'],
+                'total_exterior_items': summary['exterior_items'],
+                'total_special_jobs': summary['special_items'],
+                'cost_breakdown': summary['cost_breakdown'],
+                'room_totals': summary['room_totals']
+            }
             quote_dict['organization_info'] = {
-                'total_line_items': len(self.line_items) if self.line_items else 0,
-                'room_based_items': len([item for item in (self.line_items or []) if item.get('category') == 'room_work']),
-                'interior_items': len([item for item in (self.line_items or []) if item.get('category') == 'interior']),
-                'exterior_items': len([item for item in (self.line_items or []) if item.get('category') == 'exterior']),
-                'special_items': len([item for item in (self.line_items or []) if item.get('category') == 'special'])
+                key: summary[key] for key in
+                ('total_line_items', 'room_based_items', 'interior_items', 'exterior_items', 'special_items')
             }
         
         # Include signature info if available
-        latest_signature = self.latest_signature
-        if latest_signature:
-            quote_dict['signature_info'] = {
-                'client_name': latest_signature.client_name,
-                'client_email': latest_signature.client_email,
-                'signed_at': latest_signature.signed_at.isoformat() if latest_signature.signed_at else None,
-                'is_verified': latest_signature.is_verified
-            }
+        signature_info = self.signature_info
+        if signature_info is None and self.is_signed:
+            latest_signature = self.latest_signature  # signed before signature_info existed
+            if latest_signature:
+                signature_info = {
+                    'client_name': latest_signature.client_name,
+                    'client_email': latest_signature.client_email,
+                    'signed_at': latest_signature.signed_at.isoformat() if latest_signature.signed_at else None,
+                    'is_verified': latest_signature.is_verified
+                }
+        if signature_info:
+            quote_dict['signature_info'] = signature_info
         
         # Include project and client data
         if include_project and self.project:
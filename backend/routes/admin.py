@@ -11,7 +11,15 @@ from models.company import Company
 from models.quote import Quote
 from models.subscription import Subscription
 from models.project import Project
+from models.analysis_job import AnalysisJob
 from utils.decorators import require_admin
+from services.analysis_cache import get_analysis_cache
+from services.analyzer_registry import analyzer_registry
+from services.analysis_jobs import analysis_queue
+from services.analysis_scheduler import tenant_queue_stats
+from services.price_table_cache import get_price_table_cache
+from services.analysis_metrics import aggregate_job_timings
+from services.analysis_backfill import run_backfill, get_backfill_state
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -1205,6 +1213,42 @@ def get_revenue_analytics():
         current_app.logger.error(f'Get revenue analytics error: {e}')
         return jsonify({'error': 'Failed to get revenue analytics'}), 500
 
+@admin_bp.route('/analytics/analysis-performance', methods=['GET'])
+@jwt_required()
+@require_admin
+def get_analysis_performance():
+    """Per-company histograms of floor plan analysis stage timings and token usage"""
+    try:
+        days = request.args.get('days', 7, type=int)
+        company_id = request.args.get('company_id', type=int)
+        start_date = datetime.utcnow() - timedelta(days=days)
+        
+        query = AnalysisJob.query.filter(
+            AnalysisJob.status == 'completed',
+            AnalysisJob.finished_at >= start_date
+        )
+        if company_id:
+            query = query.filter(AnalysisJob.company_id == company_id)
+        jobs = query.all()
+        
+        per_company = aggregate_job_timings(jobs)
+        company_names = dict(
+            db.session.query(Company.id, Company.name).filter(Company.id.in_(list(per_company))).all()
+        ) if per_company else {}
+        
+        return jsonify({
+            'period_days': days,
+            'overall': aggregate_job_timings(jobs, key=lambda job: 'all').get('all'),
+            'companies': [
+                {'company_id': cid, 'company_name': company_names.get(cid), **metrics}
+                for cid, metrics in sorted(per_company.items(), key=lambda item: -item[1]['jobs'])
+            ]
+        })
+        
+    except Exception as e:
+        current_app.logger.error(f'Get analysis performance error: {e}')
+        return jsonify({'error': 'Failed to get analysis performance metrics'}), 500
+
 # =====================================================
 # SYSTEM MANAGEMENT ROUTES
 # =====================================================
@@ -1257,6 +1301,116 @@ def system_health():
             'timestamp': datetime.utcnow().isoformat()
         }), 500
 
+@admin_bp.route('/system/analysis-cache', methods=['GET'])
+@jwt_required()
+@require_admin
+def analysis_cache_stats():
+    """Get floor plan analysis cache hit/miss counters for this process"""
+    try:
+        cache = get_analysis_cache()
+        if cache is None:
+            return jsonify({'enabled': False})
+        
+        return jsonify({
+            'enabled': True,
+            'stats': cache.stats(),
+            'timestamp': datetime.utcnow().isoformat()
+        })
+        
+    except Exception as e:
+        current_app.logger.error(f'Analysis cache stats error: {e}')
+        return jsonify({'error': 'Failed to get analysis cache stats'}), 500
+
+@admin_bp.route('/system/analyzer-pool', methods=['GET'])
+@jwt_required()
+@require_admin
+def analyzer_pool_stats():
+    """Get OpenAI connection pool reuse and vision concurrency stats for this worker"""
+    try:
+        return jsonify({
+            'stats': analyzer_registry.pool_stats(),
+            'timestamp': datetime.utcnow().isoformat()
+        })
+        
+    except Exception as e:
+        current_app.logger.error(f'Analyzer pool stats error: {e}')
+        return jsonify({'error': 'Failed to get analyzer pool stats'}), 500
+
+@admin_bp.route('/system/analysis-scheduler', methods=['GET'])
+@jwt_required()
+@require_admin
+def analysis_scheduler_stats():
+    """Get analysis queue depth and queue wait per company, plus this worker's scheduler state"""
+    try:
+        return jsonify({
+            'backend': analysis_queue.backend,
+            'tenants': tenant_queue_stats(window_hours=request.args.get('hours', 24, type=int)),
+            'scheduler': analysis_queue.stats(),
+            'timestamp': datetime.utcnow().isoformat()
+        })
+        
+    except Exception as e:
+        current_app.logger.error(f'Analysis scheduler stats error: {e}')
+        return jsonify({'error': 'Failed to get analysis scheduler stats'}), 500
+
+@admin_bp.route('/system/price-tables', methods=['GET'])
+@jwt_required()
+@require_admin
+def price_table_cache_stats():
+    """Get compiled price table cache hit/miss counters for this process"""
+    try:
+        return jsonify({
+            'stats': get_price_table_cache().stats(),
+            'timestamp': datetime.utcnow().isoformat()
+        })
+        
+    except Exception as e:
+        current_app.logger.error(f'Price table cache stats error: {e}')
+        return jsonify({'error': 'Failed to get price table cache stats'}), 500
+
+@admin_bp.route('/system/reparse-analyses', methods=['GET'])
+@jwt_required()
+@require_admin
+def get_reparse_status():
+    """Get progress of the stored-analysis re-parse (resume cursor and change counts)"""
+    try:
+        return jsonify({'state': get_backfill_state()})
+
+    except Exception as e:
+        current_app.logger.error(f'Get reparse status error: {e}')
+        return jsonify({'error': 'Failed to get re-parse status'}), 500
+
+@admin_bp.route('/system/reparse-analyses', methods=['POST'])
+@jwt_required()
+@require_admin
+def reparse_analyses():
+    """Re-run the current room parser over stored analyses (no model calls).
+
+    Handles up to ``limit`` projects per request and resumes from the saved cursor,
+    so repeated calls walk the whole table; ``done`` is true once it is finished.
+    ``dry_run`` calls write nothing to the database and resume from a separate dry-run
+    cursor; ``restart`` starts the chosen cursor over from the first project.
+    """
+    try:
+        data = request.get_json() or {}
+        state = run_backfill(
+            batch_size=int(data.get('batch_size', current_app.config['ANALYSIS_BACKFILL_BATCH_SIZE'])),
+            workers=int(data['workers']) if data.get('workers') else None,
+            limit=int(data.get('limit', 500)),
+            dry_run=bool(data.get('dry_run', False)),
+            restart=bool(data.get('restart', False))
+        )
+
+        return jsonify({
+            'message': 'Re-parse complete' if state['done'] else 'Re-parse batch complete',
+            'state': state
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Reparse analyses error: {e}')
+        return jsonify({'error': 'Failed to re-parse analyses'}), 500
+
 @admin_bp.route('/system/logs', methods=['GET'])
 @jwt_required()
 @require_admin
@@ -1,5 +1,5 @@
 import os
-from flask import Blueprint, request, jsonify, current_app, send_file
+from flask import Blueprint, request, jsonify, current_app, send_file, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
@@ -12,7 +12,15 @@ from models.user import User
 from models.project import Project
 from models.client import Client
 from models.subscription import Subscription
-from services.floor_plan_analyzer import FloorPlanAnalyzer
+from models.analysis_job import AnalysisJob
+from services.analysis_jobs import analysis_queue, create_analysis_job, get_active_job, stream_job_events, find_room
+from services.analysis_scheduler import AdmissionRejected, company_plan, tenant_queue_stats
+from services.floor_plan_dedup import register_floor_plan, prune_floor_plan_hashes, find_reusable_analyses, reuse_analysis
+from services.analysis_artifacts import render_derived_report
+from services.polygon_measurement import measure_rooms, merge_into_measurements
+from services.pricing_engine import pricing_from_request, price_quote
+from services.price_table_cache import company_price_table
+from services.quote_preview import preview_quote, PreviewExpired
 from utils.decorators import require_active_subscription
 from utils.validators import allowed_file
 
@@ -408,6 +416,8 @@ def upload_project_files(project_id):
         
         files = request.files.getlist('files')
         uploaded_files = []
+        hashed_images = []
+        dedup_enabled = current_app.config.get('ANALYSIS_DEDUP_ENABLED', True)
         
         for file in files:
             if file and file.filename:
@@ -437,11 +447,29 @@ def upload_project_files(project_id):
                 })
                 
                 project.add_uploaded_image(file_path)
+                
+                if dedup_enabled:
+                    try:
+                        image = register_floor_plan(project, file_path)
+                        if image:
+                            hashed_images.append(image)
+                    except Exception as e:
+                        current_app.logger.warning(f'Perceptual hash failed for {filename}: {e}')
+        
+        if dedup_enabled:
+            prune_floor_plan_hashes(project)
+            db.session.commit()
+        
+        # Near-duplicates of these plans that another project already analysed
+        duplicate_analyses = []
+        if hashed_images:
+            duplicate_analyses = find_reusable_analyses(user.company_id, hashed_images, project.id)
         
         return jsonify({
             'message': f'Successfully uploaded {len(uploaded_files)} files',
             'files': uploaded_files,
-            'project': project.to_dict()
+            'project': project.to_dict(),
+            'duplicate_analyses': duplicate_analyses
         })
         
     except Exception as e:
@@ -449,11 +477,53 @@ def upload_project_files(project_id):
         return jsonify({'error': 'Failed to upload files'}), 500
 
 
+@projects_bp.route('/<int:project_id>/reuse-analysis', methods=['POST'])
+@jwt_required()
+@require_active_subscription
+def reuse_project_analysis(project_id):
+    """Copy the analysis of a near-duplicate floor plan from another project instead of re-analysing"""
+    try:
+        current_user_id = get_jwt_identity()
+        user = db.session.get(User, int(current_user_id))
+        
+        project = Project.query.filter_by(id=project_id, company_id=user.company_id).first()
+        if not project:
+            return jsonify({'error': 'Project not found'}), 404
+        
+        data = request.get_json(silent=True) or {}
+        source_project_id = data.get('source_project_id')
+        if not source_project_id:
+            return jsonify({'error': 'source_project_id is required'}), 400
+        
+        source = Project.query.filter_by(id=source_project_id, company_id=user.company_id).first()
+        if not source or source.id == project.id:
+            return jsonify({'error': 'Source project not found'}), 404
+        
+        if not (source.floor_plan_analysis or {}).get('structured_measurements'):
+            return jsonify({'error': 'Source project has no analysis to reuse'}), 400
+        
+        if get_active_job(project_id):
+            return jsonify({'error': 'An analysis is already in progress for this project'}), 409
+        
+        reuse_analysis(project, source)
+        db.session.commit()
+        
+        return jsonify({
+            'message': f'Reused floor plan analysis from project "{source.name}"',
+            'project': project.to_dict()
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Reuse analysis error: {str(e)}\n{traceback.format_exc()}')
+        return jsonify({'error': 'Failed to reuse analysis'}), 500
+
+
 @projects_bp.route('/<int:project_id>/analyze', methods=['POST'])
 @jwt_required()
 @require_active_subscription
 def analyze_floor_plan(project_id):
-    """Analyze uploaded floor plan using simplified AI (rooms, walls, and ceilings only)"""
+    """Queue a background AI analysis of the uploaded floor plan and return the job immediately"""
     try:
         current_user_id = get_jwt_identity()
         user = db.session.get(User, int(current_user_id))
@@ -469,120 +539,57 @@ def analyze_floor_plan(project_id):
         if not project.uploaded_images:
             return jsonify({'error': 'No images uploaded for analysis'}), 400
         
-        # 🔧 NEW: Clean up existing analysis files and data
-        current_app.logger.info(f"🧹 Cleaning up existing analysis data for project {project_id}")
-        
-        # Clear existing analysis data
-        project.floor_plan_analysis = None
-        project.manual_measurements = None
-        
-        # Remove existing generated files
-        if project.generated_files:
-            for file_path in project.generated_files:
-                try:
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
-                        current_app.logger.info(f"🗑️ Deleted existing file: {file_path}")
-                except Exception as e:
-                    current_app.logger.warning(f"⚠️ Could not delete file {file_path}: {e}")
-        
-        # Remove existing analysis directories
-        base_results_dir = os.path.join(
-            current_app.config['RESULTS_FOLDER'],
-            str(user.company_id),
-            str(project_id)
-        )
-        
-        if os.path.exists(base_results_dir):
+        # Only one analysis per project at a time
+        active_job = get_active_job(project_id)
+        if active_job:
+            return jsonify({
+                'error': 'An analysis is already in progress for this project',
+                'job': active_job.to_dict(),
+                'status_url': f'/api/projects/{project_id}/analysis-jobs/{active_job.id}'
+            }), 409
+        
+        # force_refresh bypasses the analysis cache and always calls the vision model
+        data = request.get_json(silent=True) or {}
+        force_refresh = data.get('force_refresh', request.args.get('force_refresh', False))
+        if isinstance(force_refresh, str):
+            force_refresh = force_refresh.lower() in ('1', 'true', 'yes')
+        
+        params = {'force_refresh': bool(force_refresh)}
+        # Optional per-image floor names for multi-storey projects, in upload order
+        if isinstance(data.get('floor_labels'), list):
+            params['floor_labels'] = [str(label)[:50] for label in data['floor_labels']]
+        
+        # 'geometry' measures rooms offline with OpenCV instead of the vision API
+        engine = data.get('engine')
+        if engine:
+            if engine not in ('vision', 'geometry'):
+                return jsonify({'error': 'engine must be "vision" or "geometry"'}), 400
+            params['engine'] = engine
+        if data.get('pixels_per_metre') is not None:
             try:
-                import shutil
-                shutil.rmtree(base_results_dir)
-                current_app.logger.info(f"🗑️ Deleted existing analysis directory: {base_results_dir}")
-            except Exception as e:
-                current_app.logger.warning(f"⚠️ Could not delete directory {base_results_dir}: {e}")
+                params['pixels_per_metre'] = float(data['pixels_per_metre'])
+            except (TypeError, ValueError):
+                return jsonify({'error': 'pixels_per_metre must be a number'}), 400
         
-        project.generated_files = []
-        project.status = 'analyzing'
+        try:
+            analysis_queue.admit(project.company_id)
+        except AdmissionRejected as e:
+            return jsonify({'error': str(e), 'queued': e.queued, 'limit': e.limit}), 429
+
+        job = create_analysis_job(project, user, params=params)
         db.session.commit()
-        current_app.logger.info("✅ Cleanup completed, starting fresh analysis")
-        
-        # Create new analysis
-        analyzer = FloorPlanAnalyzer(
-            openai_api_key=current_app.config['OPENAI_API_KEY']
-        )
-        
-        results_dir = os.path.join(
-            current_app.config['RESULTS_FOLDER'],
-            str(user.company_id),
-            str(project_id),
-            f"analysis_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
-        )
-        os.makedirs(results_dir, exist_ok=True)
         
-        floor_plan_path = project.uploaded_images[0]
+        analysis_queue.enqueue(job)
         
-        current_app.logger.info(f"🚀 Starting fresh AI analysis for project {project_id}")
-        analysis_results = analyzer.process_floor_plan(
-            image_path=floor_plan_path,
-            results_dir=results_dir,
-            analysis_id=f"project_{project_id}"
-        )
-        
-        if analysis_results.get('status') == 'success':
-            # Save analysis results
-            project.floor_plan_analysis = analysis_results
-            
-            # 🔧 ENHANCED: Save structured measurements immediately to database
-            if 'structured_measurements' in analysis_results:
-                measurements = analysis_results['structured_measurements']
-                project.manual_measurements = measurements
-                
-                # Log the measurements for debugging
-                rooms_count = len(measurements.get('rooms', []))
-                current_app.logger.info(f"💾 Saving {rooms_count} rooms to database")
-                
-                for i, room in enumerate(measurements.get('rooms', [])):
-                    walls_count = len(room.get('walls', []))
-                    ceiling_area = room.get('ceiling', {}).get('area', 0) if room.get('ceiling') else 0
-                    current_app.logger.info(f"  Room {i+1}: {room.get('name')} - {walls_count} walls, ceiling: {ceiling_area}m²")
-            
-            # Save generated files
-            generated_files = []
-            for filename in os.listdir(results_dir):
-                file_path = os.path.join(results_dir, filename)
-                generated_files.append(file_path)
-            
-            project.generated_files = generated_files
-            project.status = 'ready'
-            project.updated_at = datetime.utcnow()
-            db.session.commit()
-            
-            # Log success with details
-            rooms_detected = len(analysis_results.get('structured_measurements', {}).get('rooms', []))
-            current_app.logger.info(f"✅ Analysis completed successfully - {rooms_detected} rooms detected")
-            
-            return jsonify({
-                'message': f'Floor plan analysis completed successfully - {rooms_detected} rooms detected',
-                'analysis': analysis_results,
-                'project': project.to_dict()
-            })
-        else:
-            project.status = 'draft'
-            db.session.commit()
-            error_details = analysis_results.get('message', 'Unknown error')
-            current_app.logger.error(f'Floor plan analysis failed: {error_details}')
-            return jsonify({
-                'error': 'Floor plan analysis failed',
-                'details': error_details
-            }), 500
+        return jsonify({
+            'message': 'Floor plan analysis started',
+            'job': job.to_dict(),
+            'job_id': job.id,
+            'status_url': f'/api/projects/{project_id}/analysis-jobs/{job.id}'
+        }), 202
             
     except Exception as e:
-        try:
-            project.status = 'draft'
-            db.session.commit()
-        except:
-            pass
-            
+        db.session.rollback()
         error_msg = f'Analyze floor plan error: {str(e)}\n{traceback.format_exc()}'
         current_app.logger.error(error_msg)
         return jsonify({
@@ -591,6 +598,166 @@ def analyze_floor_plan(project_id):
         }), 500
 
 
+@projects_bp.route('/<int:project_id>/rooms/<int:room_id>/reanalyze', methods=['POST'])
+@jwt_required()
+@require_active_subscription
+def reanalyze_room(project_id, room_id):
+    """Queue a re-analysis of one room from a crop of the floor plan
+
+    Body (all optional): ``{"bbox": [x, y, width, height], "image_index": 0,
+    "pixels_per_metre": 95}``. The region defaults to the room's stored region or the
+    bounds of its drawn polygon; the image to the room's floor. Only that crop is sent to
+    the vision model and the result replaces the room's wall and ceiling areas; the rest
+    of the analysis is left untouched.
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        user = db.session.get(User, int(current_user_id))
+
+        project = Project.query.filter_by(
+            id=project_id,
+            company_id=user.company_id
+        ).first()
+
+        if not project:
+            return jsonify({'error': 'Project not found'}), 404
+
+        room = find_room(project.manual_measurements, room_id)
+        if not room:
+            return jsonify({'error': 'Room not found'}), 404
+
+        if not project.uploaded_images:
+            return jsonify({'error': 'No images uploaded for analysis'}), 400
+
+        active_job = get_active_job(project_id)
+        if active_job:
+            return jsonify({
+                'error': 'An analysis is already in progress for this project',
+                'job': active_job.to_dict(),
+                'status_url': f'/api/projects/{project_id}/analysis-jobs/{active_job.id}'
+            }), 409
+
+        data = request.get_json(silent=True) or {}
+        bbox = data.get('bbox') or room.get('region') or room.get('bbox')
+        if not bbox and room.get('polygon'):
+            xs = [point[0] for point in room['polygon']]
+            ys = [point[1] for point in room['polygon']]
+            bbox = [min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys)]
+        try:
+            bbox = [float(value) for value in bbox or []]
+        except (TypeError, ValueError):
+            return jsonify({'error': 'bbox must be [x, y, width, height] in image pixels'}), 400
+        if len(bbox) != 4 or bbox[2] <= 0 or bbox[3] <= 0:
+            return jsonify({'error': 'bbox must be [x, y, width, height] in image pixels'}), 400
+
+        # PDF pages count as separate images, in the order the analysis used them. Counting
+        # them may mean rasterizing a PDF, so the job checks the upper bound, not the request
+        image_index = data.get('image_index', room.get('floor_index') or 0)
+        if not isinstance(image_index, int) or isinstance(image_index, bool) or image_index < 0:
+            return jsonify({'error': 'image_index must be a non-negative integer'}), 400
+
+        params = {'room_id': room_id, 'bbox': bbox, 'image_index': image_index}
+        pixels_per_metre = (data.get('pixels_per_metre')
+                            or (project.manual_measurements.get('polygon_scale') or {}).get('pixels_per_metre')
+                            or current_app.config.get('ANALYSIS_PIXELS_PER_METRE'))
+        if pixels_per_metre is not None:
+            try:
+                params['pixels_per_metre'] = float(pixels_per_metre)
+            except (TypeError, ValueError):
+                return jsonify({'error': 'pixels_per_metre must be a number'}), 400
+
+        try:
+            analysis_queue.admit(project.company_id)
+        except AdmissionRejected as e:
+            return jsonify({'error': str(e), 'queued': e.queued, 'limit': e.limit}), 429
+
+        job = create_analysis_job(project, user, params=params, kind='room')
+        db.session.commit()
+
+        analysis_queue.enqueue(job)
+
+        return jsonify({
+            'message': f"Re-analysis of {room.get('name')} started",
+            'job': job.to_dict(),
+            'job_id': job.id,
+            'status_url': f'/api/projects/{project_id}/analysis-jobs/{job.id}'
+        }), 202
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Room re-analysis error: {str(e)}\n{traceback.format_exc()}')
+        return jsonify({'error': 'Failed to start room re-analysis'}), 500
+
+
+@projects_bp.route('/<int:project_id>/analysis-jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_analysis_job(project_id, job_id):
+    """Get status and progress of a floor plan analysis job"""
+    try:
+        current_user_id = get_jwt_identity()
+        user = db.session.get(User, int(current_user_id))
+        
+        job = AnalysisJob.query.filter_by(
+            id=job_id,
+            project_id=project_id,
+            company_id=user.company_id
+        ).first()
+        
+        if not job:
+            return jsonify({'error': 'Analysis job not found'}), 404
+        
+        response = {'job': job.to_dict()}
+        
+        # Completed jobs carry the same payload the synchronous endpoint used to return
+        if job.status == 'completed' and job.project:
+            response['message'] = job.message
+            response['analysis'] = job.project.floor_plan_analysis
+            response['project'] = job.project.to_dict()
+        
+        return jsonify(response)
+        
+    except Exception as e:
+        current_app.logger.error(f'Get analysis job error: {str(e)}\n{traceback.format_exc()}')
+        return jsonify({'error': 'Failed to get analysis job'}), 500
+
+
+@projects_bp.route('/<int:project_id>/analysis-jobs/<job_id>/events', methods=['GET'])
+@jwt_required()
+def stream_analysis_job(project_id, job_id):
+    """Server-sent events for an analysis job: rooms as they are parsed, progress, completion"""
+    try:
+        current_user_id = get_jwt_identity()
+        user = db.session.get(User, int(current_user_id))
+        
+        job = AnalysisJob.query.filter_by(
+            id=job_id,
+            project_id=project_id,
+            company_id=user.company_id
+        ).first()
+        
+        if not job:
+            return jsonify({'error': 'Analysis job not found'}), 404
+        
+        events = stream_job_events(
+            job.id,
+            poll_interval=current_app.config.get('ANALYSIS_STREAM_POLL_INTERVAL', 0.5),
+            timeout=current_app.config.get('ANALYSIS_STREAM_TIMEOUT', 900)
+        )
+        
+        return Response(
+            stream_with_context(events),
+            mimetype='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'  # disable proxy buffering (nginx)
+            }
+        )
+        
+    except Exception as e:
+        current_app.logger.error(f'Stream analysis job error: {str(e)}\n{traceback.format_exc()}')
+        return jsonify({'error': 'Failed to stream analysis job'}), 500
+
+
 @projects_bp.route('/<int:project_id>/manual-measurements', methods=['POST'])
 @jwt_required()
 def save_manual_measurements(project_id):
@@ -631,6 +798,57 @@ def save_manual_measurements(project_id):
         return jsonify({'error': 'Failed to save measurements'}), 500
 
 
+@projects_bp.route('/<int:project_id>/polygon-measurements', methods=['POST'])
+@jwt_required()
+def measure_room_polygons(project_id):
+    """Measure room outlines drawn on the floor plan (pixel coordinates + calibrated scale)
+
+    Body: ``{"scale": {"points": [[x1, y1], [x2, y2]], "length_m": 4.2} | {"pixels_per_metre": 95},
+    "rooms": [{"name", "type", "points": [[x, y], ...], "openings": [{"width_m", "height_m", "count"}]}],
+    "wall_height": 2.4, "save": true, "replace": false}``. With ``save`` the rooms are merged
+    into the project's manual measurements (``replace`` drops the existing rooms first).
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        user = db.session.get(User, int(current_user_id))
+
+        project = Project.query.filter_by(
+            id=project_id,
+            company_id=user.company_id
+        ).first()
+
+        if not project:
+            return jsonify({'error': 'Project not found'}), 404
+
+        data = request.get_json() or {}
+        wall_height = float(data.get('wall_height') or current_app.config.get('WALL_HEIGHT', 2.4))
+
+        try:
+            result = measure_rooms(data.get('rooms') or [], data.get('scale'), wall_height)
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': str(e)}), 400
+
+        if data.get('save', True):
+            project.manual_measurements = merge_into_measurements(
+                project.manual_measurements, result, replace=bool(data.get('replace', False))
+            )
+            if project.status == 'draft':
+                project.status = 'ready'
+            project.updated_at = datetime.utcnow()
+            db.session.commit()
+
+        return jsonify({
+            'message': f"Measured {len(result['rooms'])} rooms",
+            'measurements': result,
+            'project': project.to_dict()
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Polygon measurement error: {str(e)}\n{traceback.format_exc()}')
+        return jsonify({'error': 'Failed to measure room polygons'}), 500
+
+
 @projects_bp.route('/<int:project_id>/files/<path:filename>', methods=['GET'])
 @jwt_required()
 def download_project_file(project_id, filename):
@@ -670,7 +888,16 @@ def download_project_file(project_id, filename):
                 file_found = True
         
         if not file_found or not os.path.exists(file_path):
-            return jsonify({'error': 'File not found'}), 404
+            # Summary/measurement reports aren't stored; render them from the analysis
+            report = render_derived_report(project, filename)
+            if report is None:
+                return jsonify({'error': 'File not found'}), 404
+            return send_file(
+                report,
+                mimetype='application/json',
+                as_attachment=True,
+                download_name=filename
+            )
         
         return send_file(
             file_path,
@@ -941,6 +1168,31 @@ def email_quote(project_id):
             'details': str(e)
         }), 500
 
+@projects_bp.route('/analysis-queue', methods=['GET'])
+@jwt_required()
+def get_analysis_queue():
+    """Queue depth and recent queue wait of the company's floor plan analyses"""
+    try:
+        current_user_id = get_jwt_identity()
+        user = db.session.get(User, int(current_user_id))
+        
+        if not user or not user.company:
+            return jsonify({'error': 'User or company not found'}), 404
+        
+        stats = tenant_queue_stats(user.company_id).get(str(user.company_id)) or {
+            'queued': 0, 'running': 0, 'oldest_queued_s': 0.0, 'started': 0, 'avg_wait_s': 0.0, 'max_wait_s': 0.0
+        }
+        return jsonify({
+            'plan': company_plan(user.company_id),
+            'max_queued': current_app.config.get('ANALYSIS_MAX_QUEUED_PER_COMPANY'),
+            'queue': stats
+        })
+        
+    except Exception as e:
+        current_app.logger.error(f'Get analysis queue error: {str(e)}')
+        return jsonify({'error': 'Failed to get analysis queue'}), 500
+
+
 @projects_bp.route('/stats', methods=['GET'])
 @jwt_required()
 def get_project_stats():
@@ -1057,6 +1309,64 @@ def get_project_stats():
         }), 200
 
 
+def _new_quote(project, data, priced, measurement_details):
+    """An unsaved total wall area Quote for a project from ``price_quote`` output"""
+    from models.quote import Quote
+    
+    quote = Quote(
+        quote_number=Quote.generate_quote_number(),
+        title=data.get('title', f"Total Wall Area Paint Quote - {project.name}"),
+        description=data.get('description', f"Detailed painting quote for {project.name} with total wall area approach"),
+        subtotal=round(priced['subtotal'], 2),
+        vat_amount=round(priced['vat_amount'], 2),
+        total_amount=round(priced['total_amount'], 2),
+        line_items=priced['line_items'],
+        project_id=project.id,
+        valid_until=datetime.utcnow() + timedelta(days=int(data.get('valid_days', 30))),
+        measurement_details=measurement_details
+    )
+    quote.refresh_summary()
+    return quote
+
+
+def _attach_quote_pdf(project, quote, pdf_path, line_items_count):
+    """Record a generated quote (and its PDF, if any) on the project"""
+    quote.pdf_path = pdf_path
+    project.quote_pdf_path = pdf_path
+    
+    project.quote_data = {
+        'quote_id': quote.id,
+        'quote_number': quote.quote_number,
+        'subtotal': quote.subtotal,
+        'vat_amount': quote.vat_amount,
+        'total_amount': quote.total_amount,
+        'line_items_count': line_items_count,
+        'generated_at': datetime.utcnow().isoformat(),
+        'pdf_generated': pdf_path is not None,
+        'approach': 'total_wall_area',
+        'is_signed': False,
+        'signed_at': None
+    }
+    
+    if project.status in ['draft', 'ready']:
+        project.status = 'quoted'
+
+
+def _saved_measurement_details(manual_measurements):
+    """Quote measurement details from a project's saved manual measurements.
+
+    Saved measurements use the editor's camelCase keys; interior/exterior items and
+    special jobs only price when they carry a ``unit_price``.
+    """
+    measurements = manual_measurements or {}
+    return {
+        'rooms': measurements.get('rooms') or [],
+        'interior_items': measurements.get('interior_items') or measurements.get('interiorItems') or {},
+        'exterior_items': measurements.get('exterior_items') or measurements.get('exteriorItems') or {},
+        'special_jobs': measurements.get('special_jobs') or measurements.get('specialJobs') or []
+    }
+
+
 @projects_bp.route('/<int:project_id>/quote', methods=['POST'])
 @jwt_required()
 def generate_comprehensive_quote_total_wall_area(project_id):
@@ -1079,382 +1389,25 @@ def generate_comprehensive_quote_total_wall_area(project_id):
         data = request.get_json()
         current_app.logger.info(f"📋 Received request data keys: {list(data.keys())}")
         
-        # 🔧 FIXED: Handle different pricing data formats
-        def get_price(key, default_value):
-            """Safely extract price from various data formats"""
-            try:
-                value = data.get(key, default_value)
-                
-                # If it's already a number, return it
-                if isinstance(value, (int, float)):
-                    return float(value)
-                
-                # If it's a string, convert to float
-                if isinstance(value, str):
-                    return float(value)
-                
-                # If it's a dict, look for common price fields
-                if isinstance(value, dict):
-                    for price_key in ['price', 'value', 'amount', 'cost']:
-                        if price_key in value:
-                            return float(value[price_key])
-                        
-
-
-                    
-                    
-                    
-                    
-                    pricing_options = ['one_coat', 'single', 'basic', 'standard', 'default']
-            
-                    for option in pricing_options:
-                        if option in value and isinstance(value[option], dict):
-                            if 'price' in value[option]:
-                                current_app.logger.info(f"💰 Using {option} price for {key}: {value[option]['price']}")
-                                return float(value[option]['price'])
-            
-                    # If no standard options found, use the first available price
-                    for nested_key, nested_value in value.items():
-                        if isinstance(nested_value, dict) and 'price' in nested_value:
-                            current_app.logger.info(f"💰 Using {nested_key} price for {key}: {nested_value['price']}")
-                            return float(nested_value['price'])
-                        elif isinstance(nested_value, (int, float)):
-                            current_app.logger.info(f"💰 Using {nested_key} price for {key}: {nested_value}")
-                            return float(nested_value)
-
-
-
-
-
-
-                    # If no price field found, use the default
-                    current_app.logger.warning(f"⚠️ Price {key} is dict but no price field found: {value}")
-                    return float(default_value)
-                
-                # If it's None or other type, use default
-                current_app.logger.warning(f"⚠️ Price {key} has unexpected type {type(value)}: {value}")
-                return float(default_value)
-                
-            except (ValueError, TypeError) as e:
-                current_app.logger.error(f"❌ Error parsing price {key}: {e}")
-                return float(default_value)
-        
-        # Extract pricing with safe handling
-        pricing = {
-            'wall_sanding_price': get_price('wall_sanding_price', 5.00),
-            'wall_priming_price': get_price('wall_priming_price', 4.50),
-            'wall_one_coat_price': get_price('wall_one_coat_price', 6.00),
-            'wall_two_coats_price': get_price('wall_two_coats_price', 9.50),
-            'ceiling_prep_price': get_price('ceiling_prep_price', 4.00),
-            'ceiling_priming_price': get_price('ceiling_priming_price', 5.50),
-            'ceiling_one_coat_price': get_price('ceiling_one_coat_price', 5.50),
-            'ceiling_two_coats_price': get_price('ceiling_two_coats_price', 8.50),
-            'cleanup_fee': get_price('cleanup_fee', 150.00)
-        }
-        
-        current_app.logger.info(f"💰 Extracted pricing: {pricing}")
-        
-        # Process measurement details from the request
+        # Prices may arrive as numbers, strings or nested option dicts; any the request
+        # leaves out come from the company's compiled pricing settings
+        pricing = pricing_from_request(data, defaults=company_price_table(user.company_id).quote_prices)
         measurement_details = data.get('measurement_details', {})
         
-        # Generate line items from total wall area approach
-        line_items = []
-        
-        current_app.logger.info(f"🔄 Processing quote for project {project_id} with total wall area approach")
-        
-        # Process rooms with total wall area approach
-        rooms_data = measurement_details.get('rooms', [])
-        current_app.logger.info(f"🏠 Processing {len(rooms_data)} rooms with total wall area")
-        
-        for room_data in rooms_data:
-            room_name = room_data.get('name', 'Unknown Room')
-            
-            # Use correct field names from frontend
-            walls_surface_m2 = float(room_data.get('walls_surface_m2', 0) or room_data.get('total_wall_area', 0))
-            area_m2 = float(room_data.get('area_m2', 0) or room_data.get('total_ceiling_area', 0))
-            
-            current_app.logger.info(f"🔄 Processing room: {room_name} - Walls: {walls_surface_m2}m², Ceiling: {area_m2}m²")
-            
-            # Skip if no valid areas
-            if walls_surface_m2 <= 0 and area_m2 <= 0:
-                current_app.logger.warning(f"⚠️ Skipping room {room_name} - no valid areas found")
-                continue
-            
-            # Process wall treatments for total wall area
-            wall_treatments = room_data.get('wall_treatments', {})
-            if walls_surface_m2 > 0:
-                if wall_treatments.get('sanding_filling') is True:
-                    price = pricing['wall_sanding_price']
-                    line_items.append({
-                        'description': f'{room_name} - Walls - Sanding & Filling',
-                        'quantity': walls_surface_m2,
-                        'unit': 'm²',
-                        'unit_price': price,
-                        'total': walls_surface_m2 * price,
-                        'category': 'room_work',
-                        'room': room_name,
-                        'surface': 'walls',
-                        'treatment': 'sanding_filling'
-                    })
-                    current_app.logger.info(f"✅ Added wall sanding: {walls_surface_m2}m² × €{price}")
-                
-                if wall_treatments.get('priming') is True:
-                    price = pricing['wall_priming_price']
-                    line_items.append({
-                        'description': f'{room_name} - Walls - Priming',
-                        'quantity': walls_surface_m2,
-                        'unit': 'm²',
-                        'unit_price': price,
-                        'total': walls_surface_m2 * price,
-                        'category': 'room_work',
-                        'room': room_name,
-                        'surface': 'walls',
-                        'treatment': 'priming'
-                    })
-                    current_app.logger.info(f"✅ Added wall priming: {walls_surface_m2}m² × €{price}")
-                
-                if wall_treatments.get('one_coat') is True:
-                    price = pricing['wall_one_coat_price']
-                    line_items.append({
-                        'description': f'{room_name} - Walls - Painting (1 Coat)',
-                        'quantity': walls_surface_m2,
-                        'unit': 'm²',
-                        'unit_price': price,
-                        'total': walls_surface_m2 * price,
-                        'category': 'room_work',
-                        'room': room_name,
-                        'surface': 'walls',
-                        'treatment': 'one_coat'
-                    })
-                    current_app.logger.info(f"✅ Added wall one coat: {walls_surface_m2}m² × €{price}")
-                
-                if wall_treatments.get('two_coats') is True:
-                    price = pricing['wall_two_coats_price']
-                    line_items.append({
-                        'description': f'{room_name} - Walls - Painting (2 Coats)',
-                        'quantity': walls_surface_m2,
-                        'unit': 'm²',
-                        'unit_price': price,
-                        'total': walls_surface_m2 * price,
-                        'category': 'room_work',
-                        'room': room_name,
-                        'surface': 'walls',
-                        'treatment': 'two_coats'
-                    })
-                    current_app.logger.info(f"✅ Added wall two coats: {walls_surface_m2}m² × €{price}")
-            
-            # Process ceiling treatments for ceiling area
-            ceiling_treatments = room_data.get('ceiling_treatments', {})
-            if area_m2 > 0:
-                if ceiling_treatments.get('sanding_filling') is True:
-                    price = pricing['ceiling_prep_price']
-                    line_items.append({
-                        'description': f'{room_name} - Ceiling - Sanding & Filling',
-                        'quantity': area_m2,
-                        'unit': 'm²',
-                        'unit_price': price,
-                        'total': area_m2 * price,
-                        'category': 'room_work',
-                        'room': room_name,
-                        'surface': 'ceiling',
-                        'treatment': 'sanding_filling'
-                    })
-                    current_app.logger.info(f"✅ Added ceiling sanding/filling: {area_m2}m² × €{price}")
-                
-                if ceiling_treatments.get('priming') is True:
-                    price = pricing['ceiling_priming_price']
-                    line_items.append({
-                        'description': f'{room_name} - Ceiling - Priming',
-                        'quantity': area_m2,
-                        'unit': 'm²',
-                        'unit_price': price,
-                        'total': area_m2 * price,
-                        'category': 'room_work',
-                        'room': room_name,
-                        'surface': 'ceiling',
-                        'treatment': 'priming'
-                    })
-                    current_app.logger.info(f"✅ Added ceiling priming: {area_m2}m² × €{price}")
-                
-                if ceiling_treatments.get('one_coat') is True:
-                    price = pricing['ceiling_one_coat_price']
-                    line_items.append({
-                        'description': f'{room_name} - Ceiling - Painting (1 Coat)',
-                        'quantity': area_m2,
-                        'unit': 'm²',
-                        'unit_price': price,
-                        'total': area_m2 * price,
-                        'category': 'room_work',
-                        'room': room_name,
-                        'surface': 'ceiling',
-                        'treatment': 'one_coat'
-                    })
-                    current_app.logger.info(f"✅ Added ceiling one coat: {area_m2}m² × €{price}")
-                
-                if ceiling_treatments.get('two_coats') is True:
-                    price = pricing['ceiling_two_coats_price']
-                    line_items.append({
-                        'description': f'{room_name} - Ceiling - Painting (2 Coats)',
-                        'quantity': area_m2,
-                        'unit': 'm²',
-                        'unit_price': price,
-                        'total': area_m2 * price,
-                        'category': 'room_work',
-                        'room': room_name,
-                        'surface': 'ceiling',
-                        'treatment': 'two_coats'
-                    })
-                    current_app.logger.info(f"✅ Added ceiling two coats: {area_m2}m² × €{price}")
-        
-        # Process interior items with safe pricing
-        interior_items_data = measurement_details.get('interior_items', {})
-        current_app.logger.info(f"🏠 Processing interior items: {len(interior_items_data)} types")
-        
-        for item_type, items in interior_items_data.items():
-            if isinstance(items, list) and items:
-                for item_data in items:
-                    try:
-                        quantity = float(item_data.get('quantity', 0))
-                        unit_price = float(item_data.get('unit_price', 0))
-                        
-                        if quantity > 0 and unit_price > 0:
-                            base_description = item_data.get('description', item_type.replace('_', ' ').title())
-                            detailed_description = f"Interior - {base_description}"
-                            
-                            line_items.append({
-                                'description': detailed_description,
-                                'quantity': quantity,
-                                'unit': 'piece',
-                                'unit_price': unit_price,
-                                'total': quantity * unit_price,
-                                'category': 'interior',
-                                'item_type': item_type,
-                                'specifications': {
-                                    'type': item_type,
-                                    'location': item_data.get('location', ''),
-                                    'notes': item_data.get('notes', '')
-                                }
-                            })
-                            
-                            current_app.logger.info(f"✅ Added interior item: {detailed_description}, qty: {quantity}")
-                    except (ValueError, TypeError) as e:
-                        current_app.logger.error(f"❌ Error processing interior item {item_type}: {e}")
-                        continue
-        
-        # Process exterior items with safe pricing
-        exterior_items_data = measurement_details.get('exterior_items', {})
-        current_app.logger.info(f"🌿 Processing exterior items: {len(exterior_items_data)} types")
-        
-        for item_type, items in exterior_items_data.items():
-            if isinstance(items, list) and items:
-                for item_data in items:
-                    try:
-                        quantity = float(item_data.get('quantity', 0))
-                        unit_price = float(item_data.get('unit_price', 0))
-                        
-                        if quantity > 0 and unit_price > 0:
-                            base_description = item_data.get('description', item_type.replace('_', ' ').title())
-                            detailed_description = f"Exterior - {base_description}"
-                            
-                            line_items.append({
-                                'description': detailed_description,
-                                'quantity': quantity,
-                                'unit': 'm' if item_type in ['fasciaBoards', 'rainPipe'] else 'piece',
-                                'unit_price': unit_price,
-                                'total': quantity * unit_price,
-                                'category': 'exterior',
-                                'item_type': item_type,
-                                'specifications': {
-                                    'type': item_type,
-                                    'location': item_data.get('location', ''),
-                                    'notes': item_data.get('notes', '')
-                                }
-                            })
-                            
-                            current_app.logger.info(f"✅ Added exterior item: {detailed_description}, qty: {quantity}")
-                    except (ValueError, TypeError) as e:
-                        current_app.logger.error(f"❌ Error processing exterior item {item_type}: {e}")
-                        continue
-        
-        # Process special jobs with safe pricing
-        special_jobs_data = measurement_details.get('special_jobs', [])
-        current_app.logger.info(f"🔧 Processing {len(special_jobs_data)} special jobs")
-        
-        for job_data in special_jobs_data:
-            try:
-                quantity = float(job_data.get('quantity', 0))
-                unit_price = float(job_data.get('unit_price', 0))
-                
-                if quantity > 0 and unit_price > 0:
-                    job_name = job_data.get('name', 'Custom Work')
-                    job_description = job_data.get('description', '')
-                    
-                    detailed_description = f"Special Job - {job_name}"
-                    if job_description:
-                        detailed_description += f" ({job_description})"
-                    
-                    line_items.append({
-                        'description': detailed_description,
-                        'quantity': quantity,
-                        'unit': job_data.get('unit', 'job'),
-                        'unit_price': unit_price,
-                        'total': quantity * unit_price,
-                        'category': 'special',
-                        'specifications': {
-                            'job_type': job_data.get('type', 'custom'),
-                            'name': job_name,
-                            'description': job_description,
-                            'notes': job_data.get('notes', '')
-                        }
-                    })
-                    
-                    current_app.logger.info(f"✅ Added special job: {job_name}, qty: {quantity}")
-            except (ValueError, TypeError) as e:
-                current_app.logger.error(f"❌ Error processing special job: {e}")
-                continue
-        
-        # Add cleanup fee
-        # if line_items:
-        #     cleanup_fee = pricing['cleanup_fee']
-        #     line_items.append({
-        #         'description': 'Site Cleanup & Preparation',
-        #         'quantity': 1,
-        #         'unit': 'job',
-        #         'unit_price': cleanup_fee,
-        #         'total': cleanup_fee,
-        #         'category': 'general'
-        #     })
-        #     current_app.logger.info(f"✅ Added cleanup fee: €{cleanup_fee}")
+        vat_rate = float(getattr(user.company, 'vat_rate', 0.20))
+        priced = price_quote(measurement_details, pricing, vat_rate)
+        line_items = priced['line_items']
         
         if not line_items:
             current_app.logger.error("❌ No line items generated")
             return jsonify({'error': 'No work items found to generate quote from'}), 400
         
-        # Calculate totals
-        subtotal = sum(float(item['total']) for item in line_items)
-        vat_rate = float(getattr(user.company, 'vat_rate', 0.20))
-        vat_amount = subtotal * vat_rate
-        total_amount = subtotal + vat_amount
-        
-        current_app.logger.info(f"💰 Quote totals: Subtotal €{subtotal:.2f}, VAT €{vat_amount:.2f}, Total €{total_amount:.2f}")
-        
-        # Import Quote model
-        from models.quote import Quote
-        
-        # Create quote
-        quote = Quote(
-            quote_number=Quote.generate_quote_number(),
-            title=data.get('title', f"Total Wall Area Paint Quote - {project.name}"),
-            description=data.get('description', f"Detailed painting quote for {project.name} with total wall area approach"),
-            subtotal=round(subtotal, 2),
-            vat_amount=round(vat_amount, 2),
-            total_amount=round(total_amount, 2),
-            line_items=line_items,
-            project_id=project_id,
-            valid_until=datetime.utcnow() + timedelta(days=int(data.get('valid_days', 30))),
-            measurement_details=measurement_details
-        )
+        subtotal, vat_amount, total_amount = priced['subtotal'], priced['vat_amount'], priced['total_amount']
+        current_app.logger.info(f"💰 Quote for project {project_id}: {len(line_items)} line items from "
+                                f"{len(priced['room_totals'])} rooms - Subtotal €{subtotal:.2f}, VAT €{vat_amount:.2f}, "
+                                f"Total €{total_amount:.2f}")
         
+        quote = _new_quote(project, data, priced, measurement_details)
         db.session.add(quote)
         db.session.flush()
         
@@ -1481,26 +1434,7 @@ def generate_comprehensive_quote_total_wall_area(project_id):
             pdf_path = None
         
         # Update quote and project
-        quote.pdf_path = pdf_path
-        project.quote_pdf_path = pdf_path
-        
-        project.quote_data = {
-            'quote_id': quote.id,
-            'quote_number': quote.quote_number,
-            'subtotal': quote.subtotal,
-            'vat_amount': quote.vat_amount,
-            'total_amount': quote.total_amount,
-            'line_items_count': len(line_items),
-            'generated_at': datetime.utcnow().isoformat(),
-            'pdf_generated': pdf_path is not None,
-            'approach': 'total_wall_area',
-            'is_signed': False,
-            'signed_at': None
-        }
-        
-        if project.status in ['draft', 'ready']:
-            project.status = 'quoted'
-        
+        _attach_quote_pdf(project, quote, pdf_path, len(line_items))
         db.session.commit()
         
         current_app.logger.info(f"🎉 Total wall area quote generation completed successfully with {len(line_items)} line items")
@@ -1523,6 +1457,170 @@ def generate_comprehensive_quote_total_wall_area(project_id):
         return jsonify({'error': f'Failed to generate quote: {str(e)}'}), 500
 
 
+@projects_bp.route('/<int:project_id>/quote/preview', methods=['POST'])
+@jwt_required()
+def preview_quote_totals(project_id):
+    """Price a quote without saving it or rendering a PDF.
+
+    Send the same body as ``POST /quote`` for a full preview, or ``{'preview_token',
+    'changes': [{'room': index, ...}]}`` to re-price only the rooms that changed.
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        user = db.session.get(User, int(current_user_id))
+        
+        project = Project.query.filter_by(
+            id=project_id,
+            company_id=user.company_id
+        ).first()
+        
+        if not project:
+            return jsonify({'error': 'Project not found'}), 404
+        
+        data = request.get_json(silent=True) or {}
+        pricing = None
+        if not data.get('preview_token'):
+            pricing = pricing_from_request(data, defaults=company_price_table(user.company_id).quote_prices)
+        vat_rate = float(getattr(user.company, 'vat_rate', 0.20))
+        
+        try:
+            return jsonify(preview_quote(user.company_id, project_id, data, pricing, vat_rate))
+        except PreviewExpired as e:
+            return jsonify({'error': str(e), 'code': 'preview_expired'}), 410
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+    except Exception as e:
+        current_app.logger.error(f'Quote preview error: {str(e)}\n{traceback.format_exc()}')
+        return jsonify({'error': 'Failed to preview quote'}), 500
+
+
+
+@projects_bp.route('/quotes/batch', methods=['POST'])
+@jwt_required()
+def generate_quotes_batch():
+    """Generate quotes for many projects with shared pricing.
+
+    Body: ``project_ids`` plus the pricing/``title``/``description``/``valid_days`` fields of
+    ``POST /<id>/quote``, and optionally ``measurement_details`` keyed by project id (projects
+    without an entry are quoted from their saved measurements). All quotes are created in
+    one transaction; their PDFs are then rendered in parallel. Returns a per-project manifest.
+    """
+    try:
+        started = datetime.utcnow()
+        current_user_id = get_jwt_identity()
+        user = db.session.get(User, int(current_user_id))
+        
+        data = request.get_json(silent=True) or {}
+        project_ids = data.get('project_ids')
+        max_projects = current_app.config.get('QUOTE_BATCH_MAX_PROJECTS', 100)
+        if (not isinstance(project_ids, list) or not project_ids
+                or not all(isinstance(pid, int) and not isinstance(pid, bool) for pid in project_ids)):
+            return jsonify({'error': 'project_ids must be a non-empty list of project ids'}), 400
+        project_ids = list(dict.fromkeys(project_ids))
+        if len(project_ids) > max_projects:
+            return jsonify({'error': f'At most {max_projects} projects can be quoted in one batch'}), 400
+        
+        overrides = data.get('measurement_details') or {}
+        if not isinstance(overrides, dict):
+            return jsonify({'error': 'measurement_details must map project ids to measurement details'}), 400
+        
+        projects = {
+            project.id: project for project in Project.query.filter(
+                Project.id.in_(project_ids),
+                Project.company_id == user.company_id
+            )
+        }
+        
+        # Prices and VAT are resolved once for the whole batch
+        pricing = pricing_from_request(data, defaults=company_price_table(user.company_id).quote_prices)
+        vat_rate = float(getattr(user.company, 'vat_rate', 0.20))
+        
+        manifest = {}
+        created = []
+        for project_id in project_ids:
+            project = projects.get(project_id)
+            if project is None:
+                manifest[project_id] = {'project_id': project_id, 'status': 'not_found', 'error': 'Project not found'}
+                continue
+            
+            measurement_details = overrides.get(str(project_id)) or _saved_measurement_details(project.manual_measurements)
+            priced = price_quote(measurement_details, pricing, vat_rate)
+            if not priced['line_items']:
+                manifest[project_id] = {'project_id': project_id, 'status': 'skipped',
+                                        'error': 'No work items found to generate quote from'}
+                continue
+            
+            quote = _new_quote(project, data, priced, measurement_details)
+            db.session.add(quote)
+            created.append((project, quote))
+        
+        db.session.flush()
+        
+        # Build every PDF's HTML here (one generator, so each logo is downloaded once) and
+        # commit the quotes before the slow part, so rendering holds no transaction open
+        from services.quote_generator import QuoteGenerator
+        from services.quote_batch import render_pdfs
+        quote_generator = QuoteGenerator()
+        
+        jobs, prepare_errors = [], {}
+        results_folder = current_app.config.get('RESULTS_FOLDER', 'static/generated')
+        for project, quote in created:
+            output_dir = os.path.join(results_folder, str(user.company_id), str(project.id))
+            try:
+                html_content, pdf_path = quote_generator.prepare_quote_pdf(quote, project, user.company, output_dir)
+                jobs.append((project.id, html_content, pdf_path))
+            except Exception as e:
+                current_app.logger.error(f"❌ Preparing quote PDF for project {project.id} failed: {str(e)}")
+                prepare_errors[project.id] = str(e)
+            _attach_quote_pdf(project, quote, None, len(quote.line_items))
+        db.session.commit()
+        
+        rendered = render_pdfs(jobs)
+        
+        for project, quote in created:
+            result = rendered.get(project.id) or {'pdf_path': None, 'error': prepare_errors.get(project.id)}
+            if result['pdf_path']:
+                _attach_quote_pdf(project, quote, result['pdf_path'], len(quote.line_items))
+            else:
+                current_app.logger.error(f"❌ PDF generation failed for project {project.id}: {result['error']}")
+            manifest[project.id] = {
+                'project_id': project.id,
+                'status': 'created',
+                'quote_id': quote.id,
+                'quote_number': quote.quote_number,
+                'subtotal': quote.subtotal,
+                'vat_amount': quote.vat_amount,
+                'total_amount': quote.total_amount,
+                'line_items_count': len(quote.line_items),
+                'pdf_path': result['pdf_path'],
+                'pdf_generated': result['pdf_path'] is not None,
+                'pdf_error': result['error'],
+                'render_ms': result.get('render_ms')
+            }
+        db.session.commit()
+        
+        results = [manifest[project_id] for project_id in project_ids]
+        summary = {status: sum(1 for result in results if result['status'] == status)
+                   for status in ('created', 'skipped', 'not_found')}
+        summary['pdfs_generated'] = sum(1 for result in results if result.get('pdf_generated'))
+        elapsed_ms = round((datetime.utcnow() - started).total_seconds() * 1000, 1)
+        current_app.logger.info(f"🎉 Batch quote generation: {summary['created']} quotes, "
+                                f"{summary['pdfs_generated']} PDFs for {len(project_ids)} projects in {elapsed_ms}ms")
+        
+        return jsonify({
+            'message': f"Generated {summary['created']} of {len(project_ids)} quotes",
+            'results': results,
+            'summary': summary,
+            'pricing_used': pricing,
+            'elapsed_ms': elapsed_ms
+        }), 201 if summary['created'] else 200
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Batch quote generation error: {str(e)}\n{traceback.format_exc()}')
+        return jsonify({'error': f'Failed to generate quotes: {str(e)}'}), 500
+
 @projects_bp.route('/clients/proj', methods=['GET'])
 @jwt_required()
 def get_clients():
@@ -1,6 +1,7 @@
 import os
 from flask import Blueprint, request, jsonify, current_app, send_file, render_template_string
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.orm import contains_eager
 from datetime import datetime, timedelta
 import json
 import secrets
@@ -90,6 +91,7 @@ def generate_quote(project_id):
             project_id=project_id,
             valid_until=datetime.utcnow() + timedelta(days=data.get('valid_days', 30))
         )
+        quote.refresh_summary()
         
         db.session.add(quote)
         db.session.flush()  # Get quote ID
@@ -458,6 +460,7 @@ def auto_generate_quote(project_id):
             project_id=project_id,
             valid_until=datetime.utcnow() + timedelta(days=data.get('valid_days', 30))
         )
+        quote.refresh_summary()
         
         db.session.add(quote)
         db.session.flush()
@@ -622,6 +625,7 @@ def update_quote(quote_id):
             quote.subtotal = round(subtotal, 2)
             quote.vat_amount = round(vat_amount, 2)
             quote.total_amount = round(total_amount, 2)
+            quote.refresh_summary()
         
         if 'valid_until' in data:
             try:
@@ -707,8 +711,11 @@ def get_quotes():
         date_from = request.args.get('date_from')
         date_to = request.args.get('date_to')
         
-        # Build query
-        query = Quote.query.join(Project).filter(Project.company_id == user.company_id)
+        # Build query: projects, their clients and the company come back in the same SELECT
+        query = Quote.query.join(Project).filter(Project.company_id == user.company_id).options(
+            contains_eager(Quote.project).joinedload(Project.client),
+            contains_eager(Quote.project).joinedload(Project.company)
+        )
         
         # Apply filters
         if status_filter:
@@ -747,19 +754,9 @@ def get_quotes():
             page=page, per_page=per_page, error_out=False
         )
         
-        quotes_data = []
-        for quote in quotes_paginated.items:
-            quote_dict = quote.to_dict(include_project=True)
-            
-            # Add organization info for each quote
-            line_items = quote_dict.get('line_items', [])
-            quote_dict['organization_info'] = {
-                'room_based_items': len([item for item in line_items if ' - ' in item.get('description', '')]),
-                'interior_items': len([item for item in line_items if 'Interior' in item.get('description', '')]),
-                'exterior_items': len([item for item in line_items if 'Exterior' in item.get('description', '')])
-            }
-            
-            quotes_data.append(quote_dict)
+        # Counts, totals and signature status are materialized on the quote, so rows are
+        # serialized as stored; line items are only returned by the quote detail endpoint
+        quotes_data = [quote.to_dict(include_project=True, include_details=False) for quote in quotes_paginated.items]
         
         return jsonify({
             'quotes': quotes_data,
@@ -1245,12 +1242,11 @@ def sign_quote(quote_id):
         )
         
         # Update quote status
-        quote.is_signed = True
-        quote.signed_at = datetime.utcnow()
         quote.status = 'accepted'
         
         db.session.add(signature)
         db.session.flush()
+        quote.record_signature(signature)
 
         # Generate signed PDF with signature
         try:
@@ -4,6 +4,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db
 from models.user import User
 from models.pricing import PricingSettings
+from services.price_table_cache import invalidate_company_prices
 from datetime import datetime
 import traceback
 
@@ -178,6 +179,7 @@ def update_pricing_settings():
         
         # Save to database
         db.session.commit()
+        invalidate_company_prices(user.company_id)
 
         # Get updated pricing
         try:
@@ -222,6 +224,7 @@ def reset_pricing_settings():
         new_pricing = PricingSettings(company_id=user.company_id, created_by=user.id)
         db.session.add(new_pricing)
         db.session.commit()
+        invalidate_company_prices(user.company_id)
 
         # Get new pricing
         try:
@@ -0,0 +1,109 @@
+# services/analysis_artifacts.py - Compact on-disk analysis results and on-demand reports
+import os
+import io
+import gzip
+import json
+import logging
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_FILENAME = 'analysis_results.json.gz'
+ARTIFACT_COMPRESSLEVEL = 6  # level 9 is ~3x slower for <2% smaller analysis files
+
+# Files the analyzer used to write next to the results; now rendered from the artifact when downloaded
+SUMMARY_REPORT = 'summary_report.json'
+STRUCTURED_MEASUREMENTS_REPORT = 'structured_measurements.json'
+FULL_RESULTS_REPORT = 'analysis_results.json'
+DERIVED_REPORTS = (SUMMARY_REPORT, STRUCTURED_MEASUREMENTS_REPORT, FULL_RESULTS_REPORT)
+
+
+def write_analysis_artifact(results: Dict[str, Any], results_dir: str) -> str:
+    """Write the canonical analysis result as minified, gzip-compressed JSON"""
+    path = os.path.join(results_dir, ARTIFACT_FILENAME)
+    payload = json.dumps(results, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    tmp_path = f'{path}.tmp'
+    # mtime=0 keeps the bytes identical for identical results
+    with open(tmp_path, 'wb') as raw, gzip.GzipFile(filename=FULL_RESULTS_REPORT, mode='wb', fileobj=raw,
+                                                    compresslevel=ARTIFACT_COMPRESSLEVEL, mtime=0) as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_analysis_artifact(path: str) -> Dict[str, Any]:
+    with gzip.open(path, 'rb') as f:
+        return json.loads(f.read().decode('utf-8'))
+
+
+def report_paths(results_dir: str) -> Dict[str, str]:
+    """Download paths of the derived reports (rendered on request, not stored)"""
+    return {
+        'summary_report': os.path.join(results_dir, SUMMARY_REPORT),
+        'structured_measurements': os.path.join(results_dir, STRUCTURED_MEASUREMENTS_REPORT)
+    }
+
+
+def build_summary_report(structured_measurements: Dict[str, Any], timestamp: Optional[str] = None) -> Dict[str, Any]:
+    rooms = structured_measurements.get('rooms', [])
+    total_wall_area = sum(room['walls_surface_m2'] for room in rooms)
+    total_ceiling_area = sum(room['area_m2'] for room in rooms)
+
+    return {
+        "analysis_summary": {
+            "timestamp": timestamp,
+            "analysis_method": "GPT-4 Vision with Total Wall Area",
+            "rooms_detected": len(rooms),
+            "total_wall_area_m2": round(total_wall_area, 2),
+            "total_ceiling_area_m2": round(total_ceiling_area, 2),
+            "total_paintable_area_m2": round(total_wall_area + total_ceiling_area, 2)
+        },
+        "room_breakdown": [
+            {
+                "name": room['name'],
+                "type": room['type'],
+                "walls_surface_m2": room['walls_surface_m2'],
+                "ceiling_area_m2": room['area_m2']
+            }
+            for room in rooms
+        ],
+        "notes": "Total wall area analysis - treatments to be selected by user"
+    }
+
+
+def find_artifact(generated_files) -> Optional[str]:
+    for file_path in generated_files or []:
+        if os.path.basename(file_path) == ARTIFACT_FILENAME and os.path.exists(file_path):
+            return file_path
+    return None
+
+
+def render_derived_report(project, filename: str) -> Optional[io.BytesIO]:
+    """Render one of ``DERIVED_REPORTS`` for a project, or None if it has no analysis.
+
+    Summary and measurements come from the stored analysis (so re-parsed room lists are
+    reflected); the full results are decompressed from the project's artifact.
+    """
+    if filename not in DERIVED_REPORTS:
+        return None
+
+    analysis = project.floor_plan_analysis or {}
+    artifact_path = find_artifact(project.generated_files)
+
+    if filename == FULL_RESULTS_REPORT:
+        if not artifact_path:
+            return None
+        report = load_analysis_artifact(artifact_path)
+    else:
+        if not analysis.get('structured_measurements') and artifact_path:
+            analysis = load_analysis_artifact(artifact_path)
+        measurements = analysis.get('structured_measurements')
+        if not measurements:
+            return None
+        if filename == SUMMARY_REPORT:
+            report = build_summary_report(measurements, analysis.get('timestamp'))
+        else:
+            report = measurements
+
+    return io.BytesIO(json.dumps(report, indent=4, ensure_ascii=False).encode('utf-8'))
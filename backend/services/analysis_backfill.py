@@ -0,0 +1,277 @@
+# services/analysis_backfill.py - Re-parse stored GPT analyses with the current parser
+import os
+import re
+import copy
+import json
+import logging
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from models import db
+from models.project import Project
+
+logger = logging.getLogger(__name__)
+
+FLOOR_SECTION_RE = re.compile(r'^=== (?P<label>.+?) ===[ \t]*$', re.MULTILINE)
+
+_analyzer = None
+
+
+def _get_analyzer():
+    """Per-process analyzer used only for parsing and normalising; it never calls the model"""
+    global _analyzer
+    if _analyzer is None:
+        from services.floor_plan_analyzer import FloorPlanAnalyzer
+        from services.vision_backends import VisionBackend
+
+        _analyzer = FloorPlanAnalyzer(openai_api_key=None, vision_backend=VisionBackend())
+    return _analyzer
+
+
+def _room_signature(room: Dict) -> tuple:
+    return (
+        room.get('floor'),
+        room.get('name'),
+        room.get('type'),
+        round(float(room.get('walls_surface_m2') or 0), 2),
+        round(float(room.get('area_m2') or 0), 2)
+    )
+
+
+def _parse_sections(analyzer, analysis: Dict[str, Any], text: str) -> List[Dict]:
+    """Room details for the stored text; multi-floor texts are parsed per ``=== floor ===`` section"""
+    floors = analysis.get('floors') or []
+    sections = list(FLOOR_SECTION_RE.finditer(text)) if floors else []
+    if not sections:
+        return analyzer._extract_total_wall_area_room_data(text)
+
+    floor_index = {floor.get('floor'): floor.get('floor_index') for floor in floors}
+    details = []
+    for position, match in enumerate(sections):
+        end = sections[position + 1].start() if position + 1 < len(sections) else len(text)
+        label = match.group('label')
+        for room in analyzer._extract_total_wall_area_room_data(text[match.end():end]):
+            room = dict(room, id=len(details) + 1, floor=label)
+            if floor_index.get(label) is not None:
+                room['floor_index'] = floor_index[label]
+            details.append(room)
+    return details
+
+
+def reparse_analysis(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """Re-run the parser and normaliser over one stored analysis (pure; safe in a worker process)
+
+    Returns ``{'status': 'changed' | 'unchanged' | 'skipped', ...}``; changed results carry the
+    new ``room_details`` and ``structured_measurements``. Treatment selections are kept for
+    rooms that still exist under the same floor and name.
+    """
+    gpt_analysis = (analysis or {}).get('gpt_analysis') or {}
+    text = gpt_analysis.get('full_analysis')
+    if not text:
+        return {'status': 'skipped', 'reason': 'no stored analysis text'}
+    if gpt_analysis.get('engine') == 'geometry' or analysis.get('measurement_engine') == 'geometry':
+        return {'status': 'skipped', 'reason': 'measured by the geometry engine'}
+
+    analyzer = _get_analyzer()
+    room_details = _parse_sections(analyzer, analysis, text)
+
+    structured = analyzer._generate_total_wall_area_structured_measurements({'room_details': room_details})
+    validated = analyzer._validate_and_normalize_total_wall_area_measurements(structured)
+
+    old_structured = analysis.get('structured_measurements') or {}
+    old_rooms = {(room.get('floor'), room.get('name')): room for room in old_structured.get('rooms', [])}
+    for detail, room in zip(room_details, validated['rooms']):
+        for key in ('floor', 'floor_index'):
+            if key in detail:
+                room[key] = detail[key]
+        previous = old_rooms.get((room.get('floor'), room.get('name')))
+        if previous:
+            for key in ('wall_treatments', 'ceiling_treatments'):
+                if previous.get(key):
+                    room[key] = previous[key]
+
+    old_signature = [_room_signature(room) for room in old_structured.get('rooms', [])]
+    new_signature = [_room_signature(room) for room in validated['rooms']]
+    if old_signature == new_signature:
+        return {'status': 'unchanged', 'rooms': len(new_signature)}
+
+    new_structured = dict(old_structured)
+    new_structured['rooms'] = validated['rooms']
+    new_structured['reparsed_at'] = datetime.utcnow().isoformat()
+    return {
+        'status': 'changed',
+        'old_rooms': len(old_signature),
+        'new_rooms': len(new_signature),
+        'room_details': room_details,
+        'structured_measurements': new_structured
+    }
+
+
+def _apply(project: Project, result: Dict[str, Any]) -> bool:
+    """Store a changed result; returns True when the editable measurements were updated too"""
+    analysis = copy.deepcopy(project.floor_plan_analysis)
+    old_structured = analysis.get('structured_measurements')
+
+    analysis.setdefault('gpt_analysis', {})['room_details'] = result['room_details']
+    analysis['structured_measurements'] = result['structured_measurements']
+    analysis['reparsed_at'] = result['structured_measurements']['reparsed_at']
+    project.floor_plan_analysis = analysis
+
+    # Only replace the editable copy if the user hasn't changed it since the analysis
+    if project.manual_measurements == old_structured:
+        project.manual_measurements = copy.deepcopy(result['structured_measurements'])
+        return True
+    return False
+
+
+def _load_state(path: str) -> Dict[str, Any]:
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def _save_state(path: str, state: Dict[str, Any]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _new_state() -> Dict[str, Any]:
+    return {
+        'cursor': 0,
+        'processed': 0,
+        'changed': 0,
+        'unchanged': 0,
+        'skipped': 0,
+        'failed': 0,
+        'manual_measurements_updated': 0,
+        'manual_measurements_kept': 0,
+        'changed_project_ids': [],
+        'started_at': datetime.utcnow().isoformat(),
+        'updated_at': None,
+        'done': False
+    }
+
+
+def dry_run_state_path(state_path: str) -> str:
+    """Dry runs keep their cursor next to the real one, so they never move it"""
+    root, ext = os.path.splitext(state_path)
+    return f'{root}.dry_run{ext}'
+
+
+def run_backfill(batch_size: Optional[int] = None, workers: Optional[int] = None, limit: Optional[int] = None,
+                 dry_run: bool = False, restart: bool = False, state_path: Optional[str] = None) -> Dict[str, Any]:
+    """Re-parse stored analyses in id order, resuming from the saved cursor.
+
+    Parsing runs on a process pool; database reads and writes stay in this process and
+    are committed per batch together with the cursor, so an interrupted run continues
+    where it stopped. ``limit`` caps the projects handled in this call. Dry runs report
+    what would change without writing to the database; they resume from a cursor of
+    their own (see ``dry_run_state_path``), so repeated limited dry runs walk the table too.
+
+    Parser workers are spawned, not forked: this also runs inside web workers, whose
+    scheduler/HTTP threads may hold locks a forked child would inherit locked.
+    """
+    config = current_app.config
+    state_path = state_path or config['ANALYSIS_BACKFILL_STATE_FILE']
+    if dry_run:
+        state_path = dry_run_state_path(state_path)
+    batch_size = batch_size or config.get('ANALYSIS_BACKFILL_BATCH_SIZE', 200)
+    workers = workers or config.get('ANALYSIS_BACKFILL_WORKERS', 2)
+
+    state = _new_state() if restart else (_load_state(state_path) or _new_state())
+    if state.get('done') and not restart:
+        return dict(state, state_file=state_path)
+    state['dry_run'] = dry_run
+
+    handled = 0
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        while limit is None or handled < limit:
+            size = batch_size if limit is None else min(batch_size, limit - handled)
+            projects = Project.query.filter(
+                Project.id > state['cursor'],
+                Project.floor_plan_analysis.isnot(None)
+            ).order_by(Project.id).limit(size).all()
+            if not projects:
+                state['done'] = True
+                break
+
+            analyses = [project.floor_plan_analysis for project in projects]
+            if executor:
+                results = list(executor.map(_safe_reparse, analyses, chunksize=max(1, len(analyses) // (workers * 4))))
+            else:
+                results = [_safe_reparse(analysis) for analysis in analyses]
+
+            for project, result in zip(projects, results):
+                state['processed'] += 1
+                state[result['status']] += 1
+                if result['status'] == 'failed':
+                    logger.warning(f"⚠️ Re-parse failed for project {project.id}: {result.get('error')}")
+                elif result['status'] == 'changed':
+                    if len(state['changed_project_ids']) < 500:
+                        state['changed_project_ids'].append(project.id)
+                    if not dry_run:
+                        updated = _apply(project, result)
+                        state['manual_measurements_updated' if updated else 'manual_measurements_kept'] += 1
+
+            state['cursor'] = projects[-1].id
+            state['updated_at'] = datetime.utcnow().isoformat()
+            handled += len(projects)
+
+            if dry_run:
+                db.session.rollback()
+            else:
+                db.session.commit()
+            _save_state(state_path, state)
+
+            logger.info(f"🔁 Re-parsed {state['processed']} analyses (cursor {state['cursor']}): "
+                        f"{state['changed']} changed, {state['unchanged']} unchanged, {state['skipped']} skipped")
+    finally:
+        if executor:
+            executor.shutdown()
+
+    if state['done']:
+        _save_state(state_path, state)
+    return dict(state, state_file=state_path)
+
+
+def get_backfill_state(state_path: Optional[str] = None) -> Dict[str, Any]:
+    state_path = state_path or current_app.config['ANALYSIS_BACKFILL_STATE_FILE']
+    return dict(_load_state(state_path), state_file=state_path)
+
+
+def _safe_reparse(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        return reparse_analysis(analysis)
+    except Exception as e:
+        return {'status': 'failed', 'error': str(e)}
+
+
+@click.command('reparse-analyses')
+@click.option('--batch-size', type=int, default=None, help='Projects per batch/commit (default ANALYSIS_BACKFILL_BATCH_SIZE).')
+@click.option('--workers', type=int, default=None, help='Parser processes (default ANALYSIS_BACKFILL_WORKERS).')
+@click.option('--limit', type=int, default=None, help='Stop after this many projects.')
+@click.option('--dry-run', is_flag=True, help='Report changes without writing (dry runs keep a cursor of their own).')
+@click.option('--restart', is_flag=True, help='Ignore the saved cursor and start from the first project.')
+@with_appcontext
+def reparse_analyses_command(batch_size, workers, limit, dry_run, restart):
+    """Re-parse stored floor plan analyses with the current room parser (no API calls)."""
+    state = run_backfill(batch_size=batch_size, workers=workers, limit=limit, dry_run=dry_run, restart=restart)
+    resume = '' if state['done'] else f" (resumes after project {state['cursor']})"
+    click.echo(
+        f"{'Dry run: ' if dry_run else ''}{state['processed']} analyses processed, "
+        f"{state['changed']} room lists changed, {state['unchanged']} unchanged, "
+        f"{state['skipped']} skipped, {state['failed']} failed{resume}"
+    )
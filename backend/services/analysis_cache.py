@@ -0,0 +1,196 @@
+# services/analysis_cache.py - Content-addressed cache of vision analysis results
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Optional
+
+from flask import current_app
+
+
+class AnalysisCache:
+    """On-disk cache of GPT vision results keyed by image hash, model and prompt version.
+
+    Entries are small JSON files sharded by key prefix. Eviction is LRU (file mtime is
+    bumped on every hit) bounded by ``max_entries``, plus a TTL on entry age.
+
+    Writes keep a running entry count instead of rescanning the directory; the scan runs
+    when the count passes ``max_entries`` (trimming to ``LOW_WATER`` of it, so scans are
+    spread over many writes), on the first write of the process and every
+    ``SWEEP_INTERVAL`` seconds, which also corrects the count for other processes' writes.
+    """
+
+    LOW_WATER = 0.9
+    SWEEP_INTERVAL = 3600
+
+    def __init__(self, cache_dir: str, max_entries: int = 1000, ttl_seconds: int = 30 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._entries = None  # estimated entry count, recounted by every scan
+        self._last_sweep = 0.0
+        self._evict_lock = threading.Lock()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def hash_file(image_path: str) -> str:
+        """SHA-256 of the image bytes, read in chunks"""
+        digest = hashlib.sha256()
+        with open(image_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(image_hash: str, model: str, prompt_version: str) -> str:
+        return hashlib.sha256(f"{image_hash}:{model}:{prompt_version}".encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached analysis for ``key`` or None on miss/expiry"""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._count('misses')
+            return None
+
+        if self.ttl_seconds and time.time() - entry.get('stored_at', 0) > self.ttl_seconds:
+            self._remove(path)
+            self._count('misses')
+            return None
+
+        try:
+            os.utime(path, None)  # LRU touch
+        except OSError:
+            pass
+
+        self._count('hits')
+        return entry.get('value')
+
+    def set(self, key: str, value: Dict[str, Any], metadata: Optional[Dict[str, Any]] = None):
+        """Store an analysis result atomically and enforce the size bound"""
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        is_new = not os.path.exists(path)
+
+        entry = {
+            'key': key,
+            'stored_at': time.time(),
+            'metadata': metadata or {},
+            'value': value
+        }
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, separators=(',', ':'), ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self.writes += 1
+            if is_new and self._entries is not None:
+                self._entries += 1
+            due = (self._entries is None or self._entries > self.max_entries
+                   or time.monotonic() - self._last_sweep > self.SWEEP_INTERVAL)
+        if due:
+            self._evict()
+
+    def _evict(self):
+        """Drop expired entries, then least recently used ones down to LOW_WATER of max_entries"""
+        if not self._evict_lock.acquire(blocking=False):
+            return  # another thread is already scanning
+        try:
+            self._scan_and_evict()
+        finally:
+            self._evict_lock.release()
+
+    def _scan_and_evict(self):
+        entries = []
+        now = time.time()
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    mtime = os.path.getmtime(path)
+                except OSError:
+                    continue
+                entries.append((mtime, path))
+
+        if self.ttl_seconds:
+            # mtime is refreshed on hits, so only entries untouched for the full TTL go here;
+            # stored_at is still enforced on read
+            expired = [path for mtime, path in entries if now - mtime > self.ttl_seconds]
+            for path in expired:
+                self._remove(path)
+            entries = [(mtime, path) for mtime, path in entries if now - mtime <= self.ttl_seconds]
+
+        if len(entries) > self.max_entries:
+            overflow = len(entries) - int(self.max_entries * self.LOW_WATER)
+            entries.sort()
+            for _, path in entries[:overflow]:
+                self._remove(path)
+            entries = entries[overflow:]
+
+        with self._lock:
+            self._entries = len(entries)
+            self._last_sweep = time.monotonic()
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self.evictions += 1
+            if self._entries:
+                self._entries -= 1
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'writes': self.writes,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'entries_estimate': self._entries,
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'cache_dir': self.cache_dir
+            }
+
+
+def get_analysis_cache(app=None) -> Optional[AnalysisCache]:
+    """Return the process-wide analysis cache for the app, or None when disabled"""
+    app = app or current_app._get_current_object()
+    if not app.config.get('ANALYSIS_CACHE_ENABLED', True):
+        return None
+
+    cache = app.extensions.get('analysis_cache')
+    if cache is None:
+        cache = AnalysisCache(
+            cache_dir=app.config['ANALYSIS_CACHE_DIR'],
+            max_entries=app.config.get('ANALYSIS_CACHE_MAX_ENTRIES', 1000),
+            ttl_seconds=app.config.get('ANALYSIS_CACHE_TTL_SECONDS', 30 * 24 * 3600)
+        )
+        app.extensions['analysis_cache'] = cache
+    return cache
@@ -0,0 +1,673 @@
+# services/analysis_jobs.py - Background floor plan analysis jobs
+import os
+import copy
+import json
+import time
+import shutil
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db
+from models.analysis_job import AnalysisJob
+from models.project import Project
+from services.pdf_rasterizer import expand_floor_plan_pages
+from services.analysis_scheduler import (
+    FairScheduler, AdmissionRejected, TIER_PRIORITY, DEFAULT_TIER_CONCURRENCY, company_plan, parse_tier_map
+)
+
+logger = logging.getLogger(__name__)
+
+STALE_JOB_ERROR = 'The analysis worker stopped before this job finished; please start the analysis again'
+
+
+class AnalysisJobQueue:
+    """Dispatches floor plan analysis jobs to a background backend.
+
+    Backends (``ANALYSIS_JOB_BACKEND``):
+      - ``thread``: in-process workers fed by a ``FairScheduler`` (weighted fair queueing
+        across companies by plan tier, with per-company concurrency caps)
+      - ``celery``: Celery workers started with ``celery -A celery_worker.celery worker``;
+        messages carry a plan tier priority and a task re-queues itself while its company
+        is at its concurrency cap
+
+    Both backends refuse new jobs from a company that already has
+    ``ANALYSIS_MAX_QUEUED_PER_COMPANY`` jobs waiting.
+
+    A job only lives in the process holding it (the web worker that queued it, or the
+    Celery worker running it), which refreshes its ``updated_at`` every
+    ``ANALYSIS_JOB_HEARTBEAT_SECONDS``. Jobs whose heartbeat stops are failed by
+    ``reclaim_stale_jobs``, at startup and whenever a project or company is checked.
+    """
+
+    CELERY_TASK_NAME = 'analysis.run_job'
+
+    def __init__(self, app=None):
+        self.app = None
+        self.backend = 'thread'
+        self.scheduler = None
+        self._celery = None
+        self._held = set()
+        self._held_lock = threading.Lock()
+        self._heartbeat = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.backend = app.config.get('ANALYSIS_JOB_BACKEND', 'thread')
+        if self.backend == 'thread':
+            self.scheduler = FairScheduler(
+                run_job=self._run_in_app_context,
+                workers=app.config.get('ANALYSIS_JOB_WORKERS', 2),
+                weights=app.config.get('ANALYSIS_TIER_WEIGHTS'),
+                concurrency=app.config.get('ANALYSIS_TIER_CONCURRENCY')
+            )
+        app.extensions['analysis_jobs'] = self
+
+        # Fail the jobs of processes that died before a restart (the tables may not exist yet)
+        with app.app_context():
+            try:
+                reclaim_stale_jobs()
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                logger.debug(f"Skipped stale analysis job check at startup: {e}")
+
+    @property
+    def celery(self):
+        if self._celery is None:
+            self._celery = make_celery(self.app)
+        return self._celery
+
+    def admit(self, company_id: int):
+        """Raise AdmissionRejected if the company cannot queue another job right now"""
+        limit = self.app.config.get('ANALYSIS_MAX_QUEUED_PER_COMPANY', 100)
+        if not limit:
+            return
+        reclaim_stale_jobs(company_id=company_id)
+        queued = AnalysisJob.query.filter_by(company_id=company_id, status='queued').count()
+        if queued >= limit:
+            raise AdmissionRejected(
+                f'Your company already has {queued} analysis job(s) waiting (limit {limit}); try again when some have finished',
+                queued=queued, limit=limit
+            )
+
+    def enqueue(self, job: AnalysisJob, plan: str = None):
+        """Hand a committed job over to the configured backend"""
+        plan = plan or company_plan(job.company_id)
+        if self.backend == 'celery':
+            self.celery.send_task(self.CELERY_TASK_NAME, args=[job.id],
+                                  kwargs={'company_id': job.company_id, 'plan': plan},
+                                  priority=TIER_PRIORITY.get(plan, TIER_PRIORITY['trial']))
+        else:
+            # Whole-plan jobs cost one vision call per uploaded image, room jobs a single crop
+            cost = 1 if job.kind == 'room' else max(len(job.project.uploaded_images or []), 1)
+            self._hold(job.id)
+            self.scheduler.submit(job.id, job.company_id, plan=plan, cost=cost)
+        logger.info(f"📥 Queued analysis job {job.id} for project {job.project_id} "
+                    f"({self.backend} backend, {plan} plan)")
+
+    def has_capacity(self, company_id: int, plan: str) -> bool:
+        """True while fewer of the company's jobs are running than its plan allows"""
+        limits = parse_tier_map(self.app.config.get('ANALYSIS_TIER_CONCURRENCY'), DEFAULT_TIER_CONCURRENCY, cast=int)
+        running = AnalysisJob.query.filter_by(company_id=company_id, status='running').count()
+        return running < limits.get(plan, limits['trial'])
+
+    def stats(self):
+        """In-process scheduler state (thread backend only)"""
+        return self.scheduler.stats() if self.scheduler else None
+
+    def _run_in_app_context(self, job_id: str):
+        with self.app.app_context():
+            try:
+                run_analysis_job(job_id)
+            except Exception as e:
+                logger.error(f"❌ Analysis job {job_id} crashed: {e}\n{traceback.format_exc()}")
+            finally:
+                self._release(job_id)
+
+    def _hold(self, job_id: str):
+        """Keep a job's heartbeat going while this process owns it"""
+        with self._held_lock:
+            self._held.add(job_id)
+            if self._heartbeat is None or not self._heartbeat.is_alive():
+                self._heartbeat = threading.Thread(target=self._heartbeat_loop, name='analysis-job-heartbeat', daemon=True)
+                self._heartbeat.start()
+
+    def _release(self, job_id: str):
+        with self._held_lock:
+            self._held.discard(job_id)
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(self.app.config.get('ANALYSIS_JOB_HEARTBEAT_SECONDS', 30))
+            with self._held_lock:
+                job_ids = list(self._held)
+            if not job_ids:
+                continue
+            with self.app.app_context():
+                try:
+                    AnalysisJob.query.filter(
+                        AnalysisJob.id.in_(job_ids),
+                        AnalysisJob.status.in_(AnalysisJob.ACTIVE_STATUSES)
+                    ).update({AnalysisJob.updated_at: datetime.utcnow()}, synchronize_session=False)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.warning(f"⚠️ Analysis job heartbeat failed for {len(job_ids)} job(s): {e}")
+
+
+analysis_queue = AnalysisJobQueue()
+
+
+def make_celery(app):
+    """Create a Celery app bound to the Flask app with the analysis task registered"""
+    from celery import Celery
+
+    celery = Celery(
+        app.import_name,
+        broker=app.config['CELERY_BROKER_URL'],
+        backend=app.config['CELERY_RESULT_BACKEND']
+    )
+    # Serve higher plan tiers first (message priority 0-9, lower first)
+    celery.conf.broker_transport_options = {'priority_steps': list(range(10)), 'queue_order_strategy': 'priority'}
+
+    @celery.task(name=AnalysisJobQueue.CELERY_TASK_NAME, bind=True, max_retries=None)
+    def run_job(self, job_id, company_id=None, plan='trial'):
+        with app.app_context():
+            # A company at its concurrency cap waits in the broker instead of taking a worker
+            if company_id is not None and not analysis_queue.has_capacity(company_id, plan):
+                raise self.retry(countdown=app.config.get('ANALYSIS_CAPACITY_RETRY_SECONDS', 5))
+            analysis_queue._hold(job_id)
+            try:
+                run_analysis_job(job_id)
+            finally:
+                analysis_queue._release(job_id)
+
+    return celery
+
+
+def create_analysis_job(project, user, params=None, kind='floor_plan') -> AnalysisJob:
+    """Persist a queued job for a project"""
+    job = AnalysisJob(
+        kind=kind,
+        status='queued',
+        progress=0,
+        stage='queued',
+        params=params or {},
+        project_id=project.id,
+        company_id=project.company_id,
+        created_by=user.id if user else None
+    )
+    db.session.add(job)
+    return job
+
+
+def reclaim_stale_jobs(**filters) -> int:
+    """Fail active jobs whose process stopped sending heartbeats (crash, deploy, recycled worker)
+
+    ``filters`` (``project_id``, ``company_id``) narrow the check. Celery keeps queued
+    messages in the broker across restarts, so there only running jobs can go stale.
+    """
+    config = current_app.config
+    stale_seconds = config.get('ANALYSIS_JOB_STALE_SECONDS', 180)
+    if not stale_seconds:
+        return 0
+    statuses = ('running',) if config.get('ANALYSIS_JOB_BACKEND', 'thread') == 'celery' else AnalysisJob.ACTIVE_STATUSES
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_seconds)
+
+    stale = AnalysisJob.query.filter_by(**filters).filter(
+        AnalysisJob.status.in_(statuses),
+        db.or_(AnalysisJob.updated_at < cutoff, AnalysisJob.updated_at.is_(None))
+    ).all()
+    for job in stale:
+        logger.warning(f"⚠️ Failing {job.status} analysis job {job.id} of project {job.project_id}: "
+                       f"no heartbeat since {job.updated_at}")
+        job.mark_failed(STALE_JOB_ERROR)
+        if job.kind != 'room' and job.project and job.project.status == 'analyzing':
+            job.project.status = 'draft'
+    if stale:
+        db.session.commit()
+    return len(stale)
+
+
+def get_active_job(project_id: int):
+    """Return the queued/running job for a project, if any (stale ones are failed first)"""
+    reclaim_stale_jobs(project_id=project_id)
+    return AnalysisJob.query.filter(
+        AnalysisJob.project_id == project_id,
+        AnalysisJob.status.in_(AnalysisJob.ACTIVE_STATUSES)
+    ).order_by(AnalysisJob.created_at.desc()).first()
+
+
+def _clear_previous_analysis(project: Project):
+    """Remove stored analysis data and generated files before a fresh run"""
+    logger.info(f"🧹 Cleaning up existing analysis data for project {project.id}")
+
+    project.floor_plan_analysis = None
+    project.manual_measurements = None
+
+    if project.generated_files:
+        for file_path in project.generated_files:
+            try:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                    logger.info(f"🗑️ Deleted existing file: {file_path}")
+            except Exception as e:
+                logger.warning(f"⚠️ Could not delete file {file_path}: {e}")
+
+    base_results_dir = os.path.join(
+        current_app.config['RESULTS_FOLDER'],
+        str(project.company_id),
+        str(project.id)
+    )
+    if os.path.exists(base_results_dir):
+        try:
+            shutil.rmtree(base_results_dir)
+            logger.info(f"🗑️ Deleted existing analysis directory: {base_results_dir}")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not delete directory {base_results_dir}: {e}")
+
+    project.generated_files = []
+
+
+def _apply_analysis_results(project: Project, analysis_results, results_dir: str):
+    """Store successful analysis results on the project"""
+    project.floor_plan_analysis = analysis_results
+
+    if analysis_results.get('unverified'):
+        # Fallback geometry rooms (often on an estimated scale) are kept for review in the
+        # analysis, but never become the measurements quotes are priced from
+        logger.warning(f"⚠️ Analysis of project {project.id} is unverified (geometry fallback); "
+                       f"not copying its rooms into the project's measurements")
+    elif 'structured_measurements' in analysis_results:
+        measurements = analysis_results['structured_measurements']
+        project.manual_measurements = measurements
+        logger.info(f"💾 Saving {len(measurements.get('rooms', []))} rooms to database")
+
+    # Per-floor subdirectories stay on disk; only the merged top-level files are downloadable
+    generated_files = []
+    for filename in os.listdir(results_dir):
+        file_path = os.path.join(results_dir, filename)
+        if os.path.isfile(file_path):
+            generated_files.append(file_path)
+
+    project.generated_files = generated_files
+    project.status = 'ready'
+    project.updated_at = datetime.utcnow()
+
+
+def _floor_labels(params, count: int):
+    """Floor labels from the job params, falling back to 'Floor 1', 'Floor 2', ..."""
+    labels = params.get('floor_labels')
+    if isinstance(labels, list) and len(labels) == count and all(labels):
+        return [str(label) for label in labels]
+    return [f"Floor {index + 1}" for index in range(count)]
+
+
+def _analyze_images(analyzer, image_paths, results_dir: str, analysis_id: str, params,
+                    report_progress, report_rooms):
+    """Analyze every uploaded image concurrently and merge them into one result
+
+    Each image runs ``process_floor_plan`` on a bounded thread pool, so wall-clock time
+    tracks the slowest floor rather than the sum. Worker threads never touch the DB
+    session; per-floor progress and streamed rooms are collected under a lock and
+    committed from here.
+    """
+    force_refresh = bool(params.get('force_refresh'))
+    streaming = current_app.config.get('ANALYSIS_STREAMING', True)
+    engine_options = {
+        'engine': params.get('engine'),
+        'pixels_per_metre': params.get('pixels_per_metre')
+    }
+
+    if len(image_paths) == 1:
+        return analyzer.process_floor_plan(
+            image_path=image_paths[0],
+            results_dir=results_dir,
+            analysis_id=analysis_id,
+            progress_callback=report_progress,
+            force_refresh=force_refresh,
+            room_callback=(lambda room: report_rooms([room])) if streaming else None,
+            **engine_options
+        )
+
+    floor_labels = _floor_labels(params, len(image_paths))
+    floor_progress = [0] * len(image_paths)
+    streamed_rooms = []
+    lock = threading.Lock()
+
+    def make_callback(index):
+        def callback(progress, stage):
+            with lock:
+                floor_progress[index] = progress
+        return callback
+
+    def make_room_callback(index):
+        def callback(room):
+            with lock:
+                streamed_rooms.append(dict(room, floor=floor_labels[index], floor_index=index))
+        return callback
+
+    def analyze_floor(index, image_path):
+        try:
+            return analyzer.process_floor_plan(
+                image_path=image_path,
+                results_dir=os.path.join(results_dir, f"floor_{index + 1}"),
+                analysis_id=f"{analysis_id}_floor_{index + 1}",
+                progress_callback=make_callback(index),
+                force_refresh=force_refresh,
+                room_callback=make_room_callback(index) if streaming else None,
+                **engine_options
+            )
+        except Exception as e:
+            return {'status': 'error', 'message': str(e), 'analysis_id': f"{analysis_id}_floor_{index + 1}"}
+
+    max_workers = min(len(image_paths), current_app.config.get('ANALYSIS_IMAGE_WORKERS', 4))
+    floor_results = [None] * len(image_paths)
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis-floor') as executor:
+        futures = {
+            executor.submit(analyze_floor, index, image_path): index
+            for index, image_path in enumerate(image_paths)
+        }
+        pending = set(futures)
+        last_progress = None
+
+        while pending:
+            done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = futures[future]
+                floor_results[index] = future.result()
+                with lock:
+                    floor_progress[index] = 100
+
+            with lock:
+                overall = int(sum(floor_progress) / len(floor_progress) * 0.9)
+                new_rooms, streamed_rooms[:] = list(streamed_rooms), []
+            if new_rooms:
+                report_rooms(new_rooms)
+            if overall != last_progress:
+                finished = len(image_paths) - len(pending)
+                report_progress(overall, 'vision_analysis', f'{finished}/{len(image_paths)} floor plans analyzed')
+                last_progress = overall
+
+    report_progress(95, 'merging_floors')
+    return analyzer.merge_floor_results(floor_results, floor_labels, results_dir, analysis_id)
+
+
+def find_room(measurements, room_id: int):
+    """The room with ``room_id`` in a structured/manual measurements dict, if any"""
+    for room in (measurements or {}).get('rooms', []):
+        if room.get('id') == room_id:
+            return room
+    return None
+
+
+def _merge_room_measurement(measurements, room_id: int, expected_name: str, result):
+    """A copy of ``measurements`` with the re-measured room's areas replaced
+
+    The user's name, type, floor and treatment selections are kept. Returns ``None`` when
+    the room is no longer there (or the id now belongs to a different room), so JSON
+    columns are only reassigned when something changed.
+    """
+    measurements = copy.deepcopy(measurements or {})
+    room = find_room(measurements, room_id)
+    if not room or room.get('name') != expected_name:
+        return None
+
+    remeasured = result['room']
+    room['walls_surface_m2'] = remeasured['walls_surface_m2']
+    room['area_m2'] = remeasured['area_m2']
+    room['reanalyzed_at'] = result['timestamp']
+    room['region'] = result['region']['room_bbox']
+    return measurements
+
+
+def _run_room_job(job: AnalysisJob, project: Project, analyzer):
+    """Re-measure one room from a crop of its floor plan and merge it into the project
+
+    Unlike a full analysis nothing is cleared: only the room's wall and ceiling areas
+    change, in both the manual measurements and the stored analysis.
+    """
+    params = job.params or {}
+    room_id = params['room_id']
+    room = find_room(project.manual_measurements, room_id)
+    if not room:
+        job.mark_failed(f'Room {room_id} not found in project measurements')
+        db.session.commit()
+        return
+
+    image_paths = expand_floor_plan_pages(project.uploaded_images)
+    image_index = params.get('image_index', 0)
+    if not 0 <= image_index < len(image_paths):
+        job.mark_failed(f'Floor plan image {image_index} not found; image_index must be between 0 and {len(image_paths) - 1}')
+        db.session.commit()
+        return
+
+    job.mark_running()
+    job.update_progress(20, 'vision_analysis', f"Re-analyzing {room.get('name')}")
+    db.session.commit()
+
+    results_dir = os.path.join(
+        current_app.config['RESULTS_FOLDER'],
+        str(project.company_id),
+        str(project.id),
+        f"room_{room_id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+    )
+    started = time.perf_counter()
+    result = analyzer.analyze_room_region(
+        image_path=image_paths[image_index],
+        bbox=params['bbox'],
+        results_dir=results_dir,
+        room_name=room.get('name'),
+        padding=current_app.config.get('ANALYSIS_ROOM_CROP_PADDING', 0.15),
+        pixels_per_metre=params.get('pixels_per_metre')
+    )
+    if result.get('status') != 'success':
+        job.mark_failed(result.get('message', 'Unknown error'))
+        db.session.commit()
+        return
+
+    # The user may have edited the project during the vision call; merge into what is stored now
+    db.session.refresh(project)
+    before = {'walls_surface_m2': room.get('walls_surface_m2'), 'area_m2': room.get('area_m2')}
+    measurements = _merge_room_measurement(project.manual_measurements, room_id, room.get('name'), result)
+    if measurements is None:
+        job.mark_failed('Room was changed or removed while it was being re-analyzed')
+        db.session.commit()
+        return
+    project.manual_measurements = measurements
+
+    if project.floor_plan_analysis:
+        analysis = dict(project.floor_plan_analysis)
+        structured = _merge_room_measurement(analysis.get('structured_measurements'), room_id, room.get('name'), result)
+        if structured:
+            analysis['structured_measurements'] = structured
+            project.floor_plan_analysis = analysis
+    project.updated_at = datetime.utcnow()
+
+    merged = find_room(measurements, room_id)
+    job.add_partial_rooms([merged])
+    timings = dict(result['timings'])
+    timings['wall_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    job.mark_completed(
+        result_summary={
+            'room_id': room_id,
+            'room': merged,
+            'before': before,
+            'after': {'walls_surface_m2': merged['walls_surface_m2'], 'area_m2': merged['area_m2']},
+            'detected_name': result['room']['name'],
+            'region': result['region'],
+            'image_preprocessing': result.get('image_preprocessing'),
+            'timings': timings
+        },
+        message=f"{merged.get('name')} re-analyzed: {before['walls_surface_m2']} -> {merged['walls_surface_m2']} m² walls"
+    )
+    db.session.commit()
+    logger.info(f"✅ Room job {job.id} re-measured room {room_id} of project {project.id} "
+                f"({result['region']['area_fraction']:.1%} of the plan sent)")
+
+
+def run_analysis_job(job_id: str):
+    """Execute a queued floor plan analysis or room re-analysis job (runs inside an app context)"""
+    from services.analyzer_registry import analyzer_registry
+
+    job = db.session.get(AnalysisJob, job_id)
+    if not job:
+        logger.warning(f"⚠️ Analysis job {job_id} not found")
+        return
+    if job.status != 'queued':
+        logger.warning(f"⚠️ Analysis job {job_id} is already {job.status}, skipping")
+        return
+
+    project = db.session.get(Project, job.project_id)
+    if not project or not project.uploaded_images:
+        job.mark_failed('Project not found or no images uploaded for analysis')
+        db.session.commit()
+        return
+
+    try:
+        if job.kind == 'room':
+            _run_room_job(job, project, analyzer_registry.get_analyzer())
+            return
+
+        job.mark_running()
+        project.status = 'analyzing'
+        _clear_previous_analysis(project)
+        db.session.commit()
+
+        results_dir = os.path.join(
+            current_app.config['RESULTS_FOLDER'],
+            str(project.company_id),
+            str(project.id),
+            f"analysis_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+        )
+        os.makedirs(results_dir, exist_ok=True)
+
+        # PDF uploads are analyzed page by page from cached rasters
+        image_paths = expand_floor_plan_pages(project.uploaded_images)
+
+        def report_progress(progress, stage, message=None):
+            job.update_progress(progress, stage, message)
+            db.session.commit()
+
+        def report_rooms(rooms):
+            job.add_partial_rooms(rooms)
+            db.session.commit()
+
+        # One analyzer (and pooled OpenAI client) is shared by every job in this worker
+        analyzer = analyzer_registry.get_analyzer()
+
+        logger.info(f"🚀 Starting fresh AI analysis of {len(image_paths)} image(s) for project {project.id} (job {job.id})")
+        started = time.perf_counter()
+        analysis_results = _analyze_images(
+            analyzer,
+            image_paths=image_paths,
+            results_dir=results_dir,
+            analysis_id=f"project_{project.id}",
+            params=job.params or {},
+            report_progress=report_progress,
+            report_rooms=report_rooms
+        )
+
+        if analysis_results.get('status') == 'success':
+            _apply_analysis_results(project, analysis_results, results_dir)
+            rooms_detected = len(analysis_results.get('structured_measurements', {}).get('rooms', []))
+            timings = dict(analysis_results.get('timings') or {})
+            timings['wall_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            job.mark_completed(
+                result_summary={
+                    'rooms_detected': rooms_detected,
+                    'analysis_id': analysis_results.get('analysis_id'),
+                    'results_dir': results_dir,
+                    'cache_hit': analysis_results.get('cache', {}).get('hit', False) or all(
+                        floor.get('cache_hit') for floor in analysis_results.get('floors', [{}])
+                    ),
+                    'floors': len(analysis_results.get('floors', [])) or 1,
+                    'measurement_engine': analysis_results.get('measurement_engine'),
+                    'image_preprocessing': analysis_results.get('image_preprocessing'),
+                    'timings': timings
+                },
+                message=f'Floor plan analysis completed successfully - {rooms_detected} rooms detected'
+            )
+            logger.info(f"✅ Analysis job {job.id} completed - {rooms_detected} rooms detected")
+        else:
+            error_details = analysis_results.get('message', 'Unknown error')
+            project.status = 'draft'
+            job.mark_failed(error_details)
+            logger.error(f'Floor plan analysis failed: {error_details}')
+
+        db.session.commit()
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f'Analysis job {job_id} error: {str(e)}\n{traceback.format_exc()}')
+        job = db.session.get(AnalysisJob, job_id)
+        project = db.session.get(Project, job.project_id) if job else None
+        # A failed room re-analysis leaves the rest of the project's measurements usable
+        if project and job.kind != 'room':
+            project.status = 'draft'
+        if job:
+            job.mark_failed(str(e))
+        db.session.commit()
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def stream_job_events(job_id: str, poll_interval: float = 0.5, timeout: int = 900, heartbeat: int = 15):
+    """Yield server-sent events for a job: ``room`` per streamed room, ``progress`` on changes,
+    then a final ``completed`` or ``failed`` event.
+
+    The job row is the source of truth, so this works with both the thread and celery
+    backends; each poll ends the read transaction to see the worker's latest commit.
+    """
+    sent_rooms = 0
+    last_state = None
+    started = time.monotonic()
+    last_event = started
+
+    yield f"retry: {int(poll_interval * 4000)}\n\n"
+
+    while True:
+        db.session.rollback()
+        job = db.session.get(AnalysisJob, job_id)
+        if not job:
+            yield _sse('failed', {'error': 'Analysis job not found'})
+            return
+
+        rooms = job.partial_rooms or []
+        for room in rooms[sent_rooms:]:
+            yield _sse('room', room)
+            last_event = time.monotonic()
+        sent_rooms = max(sent_rooms, len(rooms))
+
+        state = (job.status, job.progress, job.stage, job.message)
+        if state != last_state:
+            yield _sse('progress', job.to_dict())
+            last_state = state
+            last_event = time.monotonic()
+
+        if job.status == 'completed':
+            yield _sse('completed', job.to_dict())
+            return
+        if job.status == 'failed':
+            yield _sse('failed', job.to_dict())
+            return
+
+        now = time.monotonic()
+        if now - started > timeout:
+            yield _sse('timeout', {'job_id': job_id, 'message': 'Event stream timed out; poll the job status instead'})
+            return
+        if now - last_event > heartbeat:
+            yield ": keep-alive\n\n"
+            last_event = now
+
+        time.sleep(poll_interval)
@@ -0,0 +1,174 @@
+# services/analysis_metrics.py - Stage timings, token usage and per-company histograms
+import time
+import bisect
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+# Upper bounds (inclusive) of the histogram buckets; the last bucket is open-ended
+DURATION_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 20000, 30000, 60000, 120000)
+TOKEN_BUCKETS = (250, 500, 1000, 1500, 2000, 3000, 5000, 10000)
+
+
+class StageTimer:
+    """Monotonic wall-clock timer for the named stages of one analysis"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - started) * 1000)
+
+    def add(self, name: str, elapsed_ms: float):
+        self.stages[name] = round(self.stages.get(name, 0.0) + elapsed_ms, 2)
+
+    @property
+    def total_ms(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000, 2)
+
+
+def usage_to_dict(usage) -> Optional[Dict[str, int]]:
+    """Token counts from an OpenAI ``usage`` object (or dict)"""
+    if usage is None:
+        return None
+    get = usage.get if isinstance(usage, dict) else lambda key: getattr(usage, key, None)
+    return {
+        'prompt_tokens': get('prompt_tokens') or 0,
+        'completion_tokens': get('completion_tokens') or 0,
+        'total_tokens': get('total_tokens') or 0
+    }
+
+
+def build_timings(timer: StageTimer, gpt_analysis: Dict[str, Any], preprocessing: Optional[Dict[str, Any]],
+                  cache_info: Dict[str, Any]) -> Dict[str, Any]:
+    """The ``timings`` block stored with an analysis result"""
+    # A cached result replays the original call's usage and API timings; this run had neither
+    cache_hit = bool(cache_info.get('hit'))
+    stages = dict(timer.stages)
+    usage = None
+    if not cache_hit:
+        stages.update(gpt_analysis.get('api_timings') or {})
+        usage = gpt_analysis.get('usage')
+
+    return {
+        'total_ms': timer.total_ms,
+        'stages_ms': stages,
+        'image_bytes': {
+            'original': (preprocessing or {}).get('original_bytes'),
+            'sent': (preprocessing or {}).get('processed_bytes')
+        },
+        'tokens': usage or {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+        'cache_hit': cache_hit
+    }
+
+
+def merge_timings(timings: List[Dict[str, Any]], wall_ms: Optional[float] = None) -> Dict[str, Any]:
+    """Sum per-floor timing blocks; ``total_ms`` is the wall clock when floors ran concurrently"""
+    timings = [t for t in timings if t]
+    stages: Dict[str, float] = {}
+    tokens = {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+    image_bytes = {'original': 0, 'sent': 0}
+
+    for block in timings:
+        for name, value in (block.get('stages_ms') or {}).items():
+            stages[name] = round(stages.get(name, 0.0) + value, 2)
+        for key in tokens:
+            tokens[key] += (block.get('tokens') or {}).get(key) or 0
+        for key in image_bytes:
+            image_bytes[key] += (block.get('image_bytes') or {}).get(key) or 0
+
+    return {
+        'total_ms': wall_ms if wall_ms is not None else round(sum(t.get('total_ms', 0) for t in timings), 2),
+        'stages_ms': stages,
+        'image_bytes': image_bytes,
+        'tokens': tokens,
+        'cache_hit': bool(timings) and all(t.get('cache_hit') for t in timings)
+    }
+
+
+class Histogram:
+    """Fixed-bucket histogram with count, sum and approximate percentiles"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.values: List[float] = []
+
+    def observe(self, value):
+        if value is None:
+            return
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.values.append(value)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.values:
+            return None
+        ordered = sorted(self.values)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return round(ordered[index], 2)
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f'<={bound}' for bound in self.buckets] + [f'>{self.buckets[-1]}']
+        return {
+            'count': len(self.values),
+            'sum': round(sum(self.values), 2),
+            'mean': round(sum(self.values) / len(self.values), 2) if self.values else None,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'max': round(max(self.values), 2) if self.values else None,
+            'buckets': dict(zip(labels, self.counts))
+        }
+
+
+def aggregate_job_timings(jobs, key=lambda job: job.company_id) -> Dict[Any, Dict[str, Any]]:
+    """Histograms of total/stage durations and token usage for completed jobs, grouped by ``key``
+    (per company by default)"""
+    companies: Dict[Any, Dict[str, Any]] = {}
+
+    for job in jobs:
+        timings = (job.result_summary or {}).get('timings')
+        if not timings:
+            continue
+
+        company = companies.setdefault(key(job), {
+            'jobs': 0,
+            'cache_hits': 0,
+            'total_ms': Histogram(DURATION_BUCKETS_MS),
+            'stages_ms': {},
+            'total_tokens': Histogram(TOKEN_BUCKETS),
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'image_bytes_sent': 0
+        })
+        company['jobs'] += 1
+        company['cache_hits'] += 1 if timings.get('cache_hit') else 0
+        # Multi-floor jobs analyse floors concurrently; the job's wall clock is what users wait
+        company['total_ms'].observe(timings.get('wall_ms', timings.get('total_ms')))
+        for name, value in (timings.get('stages_ms') or {}).items():
+            company['stages_ms'].setdefault(name, Histogram(DURATION_BUCKETS_MS)).observe(value)
+
+        tokens = timings.get('tokens') or {}
+        if not timings.get('cache_hit'):
+            company['total_tokens'].observe(tokens.get('total_tokens'))
+        company['prompt_tokens'] += tokens.get('prompt_tokens') or 0
+        company['completion_tokens'] += tokens.get('completion_tokens') or 0
+        company['image_bytes_sent'] += (timings.get('image_bytes') or {}).get('sent') or 0
+
+    return {
+        company_id: {
+            'jobs': data['jobs'],
+            'cache_hits': data['cache_hits'],
+            'total_ms': data['total_ms'].to_dict(),
+            'stages_ms': {name: histogram.to_dict() for name, histogram in sorted(data['stages_ms'].items())},
+            'total_tokens': data['total_tokens'].to_dict(),
+            'prompt_tokens': data['prompt_tokens'],
+            'completion_tokens': data['completion_tokens'],
+            'image_bytes_sent': data['image_bytes_sent']
+        }
+        for company_id, data in companies.items()
+    }
@@ -0,0 +1,254 @@
+# services/analysis_scheduler.py - Per-company concurrency caps and weighted fair queueing for analysis jobs
+import time
+import logging
+import threading
+import traceback
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Share of the workers each plan tier gets while several companies are waiting, and how
+# many of its jobs may run at once (Subscription.plan_name; unknown plans count as trial)
+DEFAULT_TIER_WEIGHTS = {'enterprise': 8, 'professional': 4, 'starter': 2, 'trial': 1}
+DEFAULT_TIER_CONCURRENCY = {'enterprise': 4, 'professional': 2, 'starter': 1, 'trial': 1}
+
+# Celery message priority per tier (Redis transport: 0 is served first)
+TIER_PRIORITY = {'enterprise': 0, 'professional': 3, 'starter': 6, 'trial': 9}
+
+
+class AdmissionRejected(Exception):
+    """A company already has as many analyses waiting as it is allowed to queue"""
+
+    def __init__(self, message: str, queued: int, limit: int):
+        super().__init__(message)
+        self.queued = queued
+        self.limit = limit
+
+
+def parse_tier_map(value: Union[str, Dict[str, Any], None], defaults: Dict[str, float], cast=float) -> Dict[str, Any]:
+    """``'enterprise:8,professional:4'`` (or a dict) merged over the defaults"""
+    tiers = dict(defaults)
+    if isinstance(value, dict):
+        items = value.items()
+    else:
+        items = (part.split(':', 1) for part in (value or '').split(',') if ':' in part)
+    for plan, amount in items:
+        tiers[str(plan).strip().lower()] = cast(amount)
+    return tiers
+
+
+def company_plan(company_id: int) -> str:
+    """The company's plan tier as recorded on its subscription"""
+    from models.subscription import Subscription
+
+    subscription = Subscription.query.filter_by(company_id=company_id).first()
+    return (subscription.plan_name or 'trial') if subscription else 'trial'
+
+
+class _Entry:
+    __slots__ = ('job_id', 'seq', 'start', 'finish', 'enqueued_at')
+
+    def __init__(self, job_id, seq, start, finish):
+        self.job_id = job_id
+        self.seq = seq
+        self.start = start
+        self.finish = finish
+        self.enqueued_at = time.monotonic()
+
+
+class _Tenant:
+    __slots__ = ('company_id', 'plan', 'weight', 'max_running', 'queue', 'running', 'last_finish',
+                 'dispatched', 'completed', 'total_wait', 'recent_waits')
+
+    def __init__(self, company_id, plan, weight, max_running):
+        self.company_id = company_id
+        self.plan = plan
+        self.weight = weight
+        self.max_running = max_running
+        self.queue = deque()
+        self.running = 0
+        self.last_finish = 0.0
+        self.dispatched = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.recent_waits = deque(maxlen=100)
+
+
+class FairScheduler:
+    """Runs analysis jobs on a fixed set of worker threads, fairly across companies.
+
+    Each company has its own FIFO queue. Jobs are tagged with start-time fair queueing
+    virtual times: a job's finish tag is ``max(virtual time, company's last finish tag) +
+    cost / weight``, and a free worker takes the queued job with the smallest finish tag
+    among companies below their concurrency cap. A company that queues 50 projects only
+    gets its weighted share while others are waiting, and never more than its cap of the
+    workers; an idle company does not bank credit because its tags restart from the
+    current virtual time.
+
+    The scheduler is per process; with several web workers the caps apply per worker.
+    """
+
+    def __init__(self, run_job: Callable[[str], None], workers: int = 2,
+                 weights: Optional[Dict[str, float]] = None, concurrency: Optional[Dict[str, int]] = None):
+        self.run_job = run_job
+        self.workers = max(1, int(workers))
+        self.weights = parse_tier_map(weights, DEFAULT_TIER_WEIGHTS)
+        self.concurrency = parse_tier_map(concurrency, DEFAULT_TIER_CONCURRENCY, cast=int)
+
+        self._cond = threading.Condition()
+        self._tenants: Dict[int, _Tenant] = {}
+        self._virtual_time = 0.0
+        self._seq = 0
+        self._threads = []
+
+    def _start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'analysis-job_{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _tenant(self, company_id: int, plan: str) -> _Tenant:
+        plan = plan if plan in self.weights else 'trial'
+        tenant = self._tenants.get(company_id)
+        if tenant is None:
+            tenant = self._tenants[company_id] = _Tenant(
+                company_id, plan, self.weights[plan], self.concurrency.get(plan, 1)
+            )
+        elif tenant.plan != plan:
+            # Upgrades and downgrades apply to the company's next jobs
+            tenant.plan, tenant.weight, tenant.max_running = plan, self.weights[plan], self.concurrency.get(plan, 1)
+        return tenant
+
+    def submit(self, job_id: str, company_id: int, plan: str = 'trial', cost: float = 1.0):
+        """Queue a job for a company; ``cost`` is its expected work (e.g. floor plan images)"""
+        with self._cond:
+            if not self._threads:
+                self._start()
+            tenant = self._tenant(company_id, plan)
+            start = max(self._virtual_time, tenant.last_finish)
+            tenant.last_finish = start + max(float(cost), 0.1) / max(tenant.weight, 0.01)
+            self._seq += 1
+            tenant.queue.append(_Entry(job_id, self._seq, start, tenant.last_finish))
+            self._cond.notify()
+            return len(tenant.queue)
+
+    def _next(self):
+        """The queued job with the smallest finish tag among companies with a free slot"""
+        best = None
+        for tenant in self._tenants.values():
+            if tenant.queue and tenant.running < tenant.max_running:
+                head = tenant.queue[0]
+                if best is None or (head.finish, head.seq) < (best[1].finish, best[1].seq):
+                    best = (tenant, head)
+        if best is None:
+            return None
+
+        tenant, entry = best
+        tenant.queue.popleft()
+        tenant.running += 1
+        self._virtual_time = max(self._virtual_time, entry.start)
+
+        waited = time.monotonic() - entry.enqueued_at
+        tenant.dispatched += 1
+        tenant.total_wait += waited
+        tenant.recent_waits.append(waited)
+        return tenant, entry, waited
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                picked = self._next()
+                while picked is None:
+                    self._cond.wait()
+                    picked = self._next()
+
+            tenant, entry, waited = picked
+            logger.info(f"🎬 Running analysis job {entry.job_id} for company {tenant.company_id} "
+                        f"({tenant.plan}) after {waited:.1f}s in queue")
+            try:
+                self.run_job(entry.job_id)
+            except Exception as e:
+                logger.error(f"❌ Analysis job {entry.job_id} crashed: {e}\n{traceback.format_exc()}")
+            finally:
+                with self._cond:
+                    tenant.running -= 1
+                    tenant.completed += 1
+                    # The freed slot may unblock this company's next job on another worker
+                    self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, running jobs and queue wait per company in this process"""
+        now = time.monotonic()
+        with self._cond:
+            tenants = {}
+            for company_id, tenant in self._tenants.items():
+                recent = list(tenant.recent_waits)
+                tenants[str(company_id)] = {
+                    'plan': tenant.plan,
+                    'weight': tenant.weight,
+                    'max_running': tenant.max_running,
+                    'queued': len(tenant.queue),
+                    'running': tenant.running,
+                    'dispatched': tenant.dispatched,
+                    'completed': tenant.completed,
+                    'oldest_queued_s': round(now - tenant.queue[0].enqueued_at, 2) if tenant.queue else 0.0,
+                    'avg_wait_s': round(tenant.total_wait / tenant.dispatched, 2) if tenant.dispatched else 0.0,
+                    'recent_max_wait_s': round(max(recent), 2) if recent else 0.0
+                }
+            return {
+                'workers': self.workers,
+                'running': sum(tenant.running for tenant in self._tenants.values()),
+                'queued': sum(len(tenant.queue) for tenant in self._tenants.values()),
+                'virtual_time': round(self._virtual_time, 3),
+                'weights': self.weights,
+                'concurrency': self.concurrency,
+                'tenants': tenants
+            }
+
+
+def tenant_queue_stats(company_id: Optional[int] = None, window_hours: int = 24) -> Dict[str, Dict[str, Any]]:
+    """Queue depth and queue wait per company from the jobs table (all processes and backends).
+
+    Waits are ``started_at - created_at`` of jobs started in the last ``window_hours``.
+    """
+    from models import db
+    from models.analysis_job import AnalysisJob
+
+    now = datetime.utcnow()
+    tenants: Dict[str, Dict[str, Any]] = {}
+
+    def tenant(key):
+        return tenants.setdefault(str(key), {
+            'queued': 0, 'running': 0, 'oldest_queued_s': 0.0, 'started': 0, 'avg_wait_s': 0.0, 'max_wait_s': 0.0
+        })
+
+    active = db.session.query(AnalysisJob.company_id, AnalysisJob.status, db.func.count(AnalysisJob.id),
+                              db.func.min(AnalysisJob.created_at)) \
+        .filter(AnalysisJob.status.in_(AnalysisJob.ACTIVE_STATUSES))
+    if company_id is not None:
+        active = active.filter(AnalysisJob.company_id == company_id)
+    for key, status, count, oldest in active.group_by(AnalysisJob.company_id, AnalysisJob.status):
+        entry = tenant(key)
+        entry[status] = count
+        if status == 'queued' and oldest:
+            entry['oldest_queued_s'] = round((now - oldest).total_seconds(), 2)
+
+    started = db.session.query(AnalysisJob.company_id, AnalysisJob.created_at, AnalysisJob.started_at) \
+        .filter(AnalysisJob.started_at >= now - timedelta(hours=window_hours))
+    if company_id is not None:
+        started = started.filter(AnalysisJob.company_id == company_id)
+    for key, created_at, started_at in started:
+        if not created_at:
+            continue
+        entry = tenant(key)
+        waited = max((started_at - created_at).total_seconds(), 0.0)
+        entry['avg_wait_s'] += waited  # summed here, divided below
+        entry['max_wait_s'] = round(max(entry['max_wait_s'], waited), 2)
+        entry['started'] += 1
+
+    for entry in tenants.values():
+        if entry['started']:
+            entry['avg_wait_s'] = round(entry['avg_wait_s'] / entry['started'], 2)
+    return tenants
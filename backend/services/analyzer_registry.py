@@ -0,0 +1,223 @@
+# services/analyzer_registry.py - Process-wide pooled OpenAI client and analyzer
+import os
+import logging
+import threading
+from contextlib import contextmanager
+from functools import partial
+from typing import Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# Modules behind the analysis path (OpenAI SDK, OpenCV/NumPy, Pillow). Web workers import
+# them on the first analysis; dedicated analysis workers can load them up front.
+ANALYSIS_MODULES = (
+    'httpx',
+    'openai',
+    'services.floor_plan_analyzer',
+    'services.image_preprocessor',
+    'services.geometry_engine'
+)
+
+
+def preload_analysis_modules():
+    """Import the analysis dependencies now instead of on the first job"""
+    import importlib
+
+    for name in ANALYSIS_MODULES:
+        importlib.import_module(name)
+    logger.info(f"📦 Preloaded {len(ANALYSIS_MODULES)} analysis modules")
+
+
+class PoolStats:
+    """Thread-safe counters describing HTTP connection reuse"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+        self.vision_calls = 0
+        self.vision_waits = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def incr(self, counter: str, amount: int = 1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+            if counter == 'in_flight':
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            reused = max(self.requests - self.new_connections, 0)
+            return {
+                'requests': self.requests,
+                'new_connections': self.new_connections,
+                'tls_handshakes': self.tls_handshakes,
+                'reused_connections': reused,
+                'reuse_rate': round(reused / self.requests, 4) if self.requests else 0.0,
+                'vision_calls': self.vision_calls,
+                'vision_calls_waited_for_slot': self.vision_waits,
+                'vision_calls_in_flight': self.in_flight,
+                'max_vision_calls_in_flight': self.max_in_flight
+            }
+
+
+def _make_transport(stats: PoolStats, limits):
+    """httpx transport that counts requests and new TCP/TLS connections via httpcore traces"""
+    import httpx
+
+    class CountingTransport(httpx.HTTPTransport):
+        def handle_request(self, request):
+            stats.incr('requests')
+            parent_trace = request.extensions.get('trace')
+
+            def trace(event_name, info):
+                # Only fired when the pool has to open a new connection
+                if event_name == 'connection.connect_tcp.complete':
+                    stats.incr('new_connections')
+                elif event_name == 'connection.start_tls.complete':
+                    stats.incr('tls_handshakes')
+                if parent_trace:
+                    parent_trace(event_name, info)
+
+            request.extensions['trace'] = trace
+            return super().handle_request(request)
+
+        def pool_snapshot(self) -> Dict[str, Any]:
+            connections = list(getattr(getattr(self, '_pool', None), 'connections', []) or [])
+            return {
+                'open': len(connections),
+                'idle': sum(1 for connection in connections if connection.is_idle())
+            }
+
+    return CountingTransport(limits=limits)
+
+
+class AnalyzerRegistry:
+    """Application-scoped ``FloorPlanAnalyzer`` sharing one keep-alive HTTP pool per worker.
+
+    The client is rebuilt after a fork (gunicorn/celery prefork workers), so each worker
+    process owns its own pool. Vision calls are capped with a semaphore.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._pid = None
+        self._http_client = None
+        self._transport = None
+        self._analyzer = None
+        self._slots = None
+        self.stats = PoolStats()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['analyzer_registry'] = self
+
+    def get_analyzer(self):
+        """Return the worker's shared analyzer, creating it on first use"""
+        if self._analyzer is None or self._pid != os.getpid():
+            with self._lock:
+                if self._analyzer is None or self._pid != os.getpid():
+                    self._build()
+        return self._analyzer
+
+    def _build(self):
+        import httpx
+        from openai import OpenAI
+        from services.floor_plan_analyzer import FloorPlanAnalyzer
+        from services.analysis_cache import get_analysis_cache
+        from services.image_preprocessor import get_image_preprocessor
+        from services.geometry_engine import GeometryEngine, get_geometry_engine
+        from services.vision_backends import create_vision_backend
+        from services.tiled_image import tiling_options
+
+        if self.app is None:
+            from flask import current_app
+            self.app = current_app._get_current_object()
+        config = self.app.config
+        limits = httpx.Limits(
+            max_connections=config.get('OPENAI_MAX_CONNECTIONS', 20),
+            max_keepalive_connections=config.get('OPENAI_MAX_KEEPALIVE_CONNECTIONS', 10),
+            keepalive_expiry=config.get('OPENAI_KEEPALIVE_EXPIRY', 60)
+        )
+        timeout = httpx.Timeout(
+            connect=config.get('OPENAI_CONNECT_TIMEOUT', 10),
+            read=config.get('OPENAI_READ_TIMEOUT', 120),
+            write=config.get('OPENAI_WRITE_TIMEOUT', 30),
+            pool=config.get('OPENAI_POOL_TIMEOUT', 30)
+        )
+
+        if self._pid == os.getpid() and self._http_client is not None:
+            self._http_client.close()
+
+        self.stats = PoolStats()
+        self._transport = _make_transport(self.stats, limits)
+        self._http_client = httpx.Client(transport=self._transport, timeout=timeout, limits=limits)
+        self._slots = threading.BoundedSemaphore(config.get('ANALYSIS_MAX_CONCURRENT_VISION_CALLS', 4))
+
+        # Replay serves recorded responses offline, so it needs no API key or client
+        client = None
+        if config.get('VISION_BACKEND', 'openai') != 'replay':
+            # The resilient backend retries within its deadline, so the SDK must not retry as well
+            client = OpenAI(
+                api_key=config['OPENAI_API_KEY'],
+                base_url=config.get('OPENAI_BASE_URL') or None,
+                http_client=self._http_client,
+                max_retries=0 if config.get('VISION_RESILIENCE_ENABLED', True) else config.get('OPENAI_MAX_RETRIES', 2)
+            )
+        # A hedged request needs a free slot of its own, so hedging never exceeds the cap
+        vision_backend = create_vision_backend(config, client, hedge_slots=self._slots)
+
+        with self.app.app_context():
+            self._analyzer = FloorPlanAnalyzer(
+                openai_api_key=config['OPENAI_API_KEY'],
+                model=config.get('OPENAI_MODEL', 'gpt-4o'),
+                cache=get_analysis_cache(self.app),
+                preprocessor=get_image_preprocessor(self.app),
+                geometry_engine=get_geometry_engine(self.app),
+                geometry_fallback=config.get('ANALYSIS_GEOMETRY_FALLBACK', False),
+                geometry_engine_factory=partial(GeometryEngine.from_config, config),
+                measurement_engine=config.get('ANALYSIS_MEASUREMENT_ENGINE', 'vision'),
+                client=client,
+                concurrency_limiter=self.vision_slot,
+                vision_backend=vision_backend,
+                tiling=tiling_options(config)
+            )
+        self._pid = os.getpid()
+        logger.info(f"🔌 Created {vision_backend.name} vision backend for worker {self._pid} "
+                    f"(max {limits.max_connections} connections, {config.get('ANALYSIS_MAX_CONCURRENT_VISION_CALLS', 4)} concurrent vision calls)")
+
+    @contextmanager
+    def vision_slot(self):
+        """Hold one of the concurrent vision call slots for the duration of a call"""
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            self.stats.incr('vision_waits')
+            slots.acquire()
+        self.stats.incr('vision_calls')
+        self.stats.incr('in_flight')
+        try:
+            yield
+        finally:
+            self.stats.incr('in_flight', -1)
+            slots.release()
+
+    def pool_stats(self) -> Dict[str, Any]:
+        stats = {
+            'pid': os.getpid(),
+            'initialized': self._analyzer is not None and self._pid == os.getpid(),
+            'max_concurrent_vision_calls': self.app.config.get('ANALYSIS_MAX_CONCURRENT_VISION_CALLS', 4) if self.app else None
+        }
+        stats.update(self.stats.snapshot())
+        if stats['initialized'] and self._transport is not None:
+            stats['pool'] = self._transport.pool_snapshot()
+        if stats['initialized'] and hasattr(self._analyzer.vision_backend, 'snapshot'):
+            stats['vision_resilience'] = self._analyzer.vision_backend.snapshot()
+        return stats
+
+
+analyzer_registry = AnalyzerRegistry()
@@ -1,27 +1,107 @@
 import os
-import json
 import shutil
 import logging
 import traceback
+from contextlib import nullcontext
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Callable
 import time
-import math
-import colorsys
-import requests
-import cv2
-import numpy as np
-import matplotlib.pyplot as plt
-from PIL import Image, ImageDraw, ImageFont
-from openai import OpenAI
-from gradio_client import Client, handle_file
+
+from services.room_parser import StreamingRoomParser, parse_rooms
+from services.analysis_artifacts import write_analysis_artifact, report_paths
+from services.analysis_metrics import StageTimer, build_timings, merge_timings
+from services.pdf_rasterizer import is_pdf
+
+# Heavy dependencies (openai, OpenCV via the geometry engine) are imported on first use
+# so web workers that never run an analysis don't pay for them at boot
+
+# Bump PROMPT_VERSION whenever the prompt or response parsing changes so cached
+# analyses produced by the old prompt are no longer reused
+PROMPT_VERSION = 'total-wall-area-v2'
+
+TOTAL_WALL_AREA_PROMPT = """
+        Analyze this floor plan image and provide TOTAL WALL AREA and CEILING AREA for each room.
+
+        For each room you identify, provide ONLY the following format:
+
+        Room: [Room Name] ([Room Type])
+        - walls_surface_m2: [total_wall_area_number]
+        - area_m2: [ceiling_floor_area_number]
+
+        EXAMPLE FORMAT:
+        Room: Entree (entrance)
+        - walls_surface_m2: 17.93
+        - area_m2: 7.78
+
+        Room: Eetkamer (dining room)
+        - walls_surface_m2: 17.34
+        - area_m2: 6.41
+
+        Room: Woonkamer (living room)
+        - walls_surface_m2: 51.19
+        - area_m2: 48.29
+
+        CALCULATION METHOD:
+        1. For walls_surface_m2: Calculate room perimeter × wall height (assume 2.4m height)
+        2. For area_m2: Calculate room length × width (ceiling/floor area)
+
+        REQUIREMENTS:
+        - Provide ONLY the final room measurements in the exact format shown
+        - Do NOT include intermediate calculations or explanations
+        - Do NOT repeat room names or create duplicates
+        - Do NOT suggest any treatments or work recommendations
+        - Each room should appear ONLY ONCE in your response
+        - Use clear room names (Entree, Eetkamer, Woonkamer, etc.)
+
+        Analyze the floor plan and provide measurements for each distinct room you can identify.
+        """
+
+# Used when a single room is re-analyzed from a crop of the plan (see analyze_room_region)
+ROOM_REGION_PROMPT = """
+        This image is a crop of a floor plan centred on ONE room{name_hint}.
+        Neighbouring rooms may be partly visible at the edges - ignore them.{scale_hint}
+
+        Provide TOTAL WALL AREA and CEILING AREA for the central room only, in exactly this format:
+
+        Room: [Room Name] ([Room Type])
+        - walls_surface_m2: [total_wall_area_number]
+        - area_m2: [ceiling_floor_area_number]
+
+        CALCULATION METHOD:
+        1. For walls_surface_m2: Calculate room perimeter × wall height (assume 2.4m height)
+        2. For area_m2: Calculate room length × width (ceiling/floor area)
+
+        Provide ONLY that one room in the exact format shown, with no explanations.
+        """
+
 
 class FloorPlanAnalyzer:
     """Enhanced floor plan analyzer with total wall area per room"""
     
-    def __init__(self, openai_api_key: str):
+    def __init__(self, openai_api_key: str, model: str = "gpt-4o", cache=None, preprocessor=None,
+                 geometry_engine=None, measurement_engine: str = 'vision', client=None,
+                 concurrency_limiter=None, vision_backend=None, tiling=None, geometry_fallback: bool = False,
+                 geometry_engine_factory: Optional[Callable[[], Any]] = None):
         self.openai_api_key = openai_api_key
-        self.client = OpenAI(api_key=openai_api_key)
+        # A shared, pooled client can be injected (see services.analyzer_registry), or a
+        # recording/replay backend from services.vision_backends in place of live OpenAI
+        if vision_backend is None:
+            from services.vision_backends import OpenAIVisionBackend
+            if client is None:
+                from openai import OpenAI
+                client = OpenAI(api_key=openai_api_key)
+            vision_backend = OpenAIVisionBackend(client)
+        self.client = client
+        self.vision_backend = vision_backend
+        self.concurrency_limiter = concurrency_limiter  # optional context manager capping vision calls
+        self.model = model
+        self.cache = cache  # optional AnalysisCache for GPT results
+        self.preprocessor = preprocessor  # optional ImagePreprocessor run before upload
+        self.geometry_engine = geometry_engine  # optional GeometryEngine (offline fast path / fallback)
+        self.geometry_engine_factory = geometry_engine_factory  # builds one when a job asks for engine='geometry'
+        self.measurement_engine = measurement_engine  # 'vision' or 'geometry'
+        self.geometry_fallback = geometry_fallback  # measure with geometry_engine when vision fails (unverified)
+        self.tiling = tiling or {}  # TiledImageReader options for very large scans
         self.logger = logging.getLogger(__name__)
         
         # Business constants
@@ -39,9 +119,27 @@ class FloorPlanAnalyzer:
             'hallway', 'corridor', 'foyer', 'entrance', 'family room'
         ]
     
-    def process_floor_plan(self, image_path: str, results_dir: str, analysis_id: str) -> Dict[str, Any]:
-        """Process floor plan with total wall area approach"""
+    def process_floor_plan(self, image_path: str, results_dir: str, analysis_id: str,
+                           progress_callback: Optional[Callable[[int, str], None]] = None,
+                           force_refresh: bool = False,
+                           room_callback: Optional[Callable[[Dict], None]] = None,
+                           engine: Optional[str] = None,
+                           pixels_per_metre: Optional[float] = None) -> Dict[str, Any]:
+        """Process floor plan with total wall area approach
+
+        ``progress_callback(progress, stage)`` is invoked between steps so background
+        jobs can expose progress while the analysis runs. GPT results are served from
+        the analysis cache for identical images unless ``force_refresh`` is set.
+        When ``room_callback`` is given the completion is streamed and each room is
+        passed to it as soon as its measurements have been generated.
+
+        ``engine='geometry'`` measures rooms locally with the OpenCV geometry engine and
+        never calls the vision API (the engine is built on first use when it isn't
+        configured); with the default vision engine the geometry engine is the fallback
+        if the vision call fails or finds no rooms, when that fallback is enabled.
+        """
         self.logger.info(f"🏠 Starting floor plan analysis with total wall area approach: {analysis_id}")
+        timer = StageTimer()
         
         try:
             # Validate input
@@ -51,30 +149,77 @@ class FloorPlanAnalyzer:
             # Create results directory
             os.makedirs(results_dir, exist_ok=True)
             
-            # Step 1: Upload image for analysis
-            self.logger.info("📤 Step 1: Preparing image for analysis...")
-            original_image_link = self._upload_image_with_fallbacks(image_path)
-            self.logger.info(f"✅ Image prepared: {original_image_link}")
+            engine = engine or self.measurement_engine
             
-            # Step 2: Enhanced GPT-4 Vision analysis with total wall area
-            self.logger.info("🤖 Step 2: GPT-4 Vision analysis for total wall areas...")
-            gpt_analysis = self._analyze_with_total_wall_area_gpt4_vision(original_image_link)
+            if engine == 'geometry':
+                if not self._ensure_geometry_engine():
+                    # Never silently swap a requested offline measurement for a paid vision call
+                    raise RuntimeError("Geometry engine requested but not available")
+                
+                # Offline fast path: no upload, no API call
+                self._report_progress(progress_callback, 20, 'geometry_analysis')
+                self.logger.info("📐 Step 1-2: Measuring rooms with the geometry engine...")
+                original_image_link, preprocessing = None, None
+                cache_info = {'enabled': False, 'hit': False}
+                with timer.stage('geometry_analysis'):
+                    gpt_analysis = self._analyze_with_geometry(image_path, pixels_per_metre, room_callback)
+            else:
+                # Look the image up first: a cache hit needs neither pre-processing nor an API call
+                with timer.stage('cache_lookup'):
+                    gpt_analysis, cache_info = self._lookup_cached_analysis(image_path, force_refresh, room_callback)
+                original_image_link, preprocessing = None, None
+                
+                if gpt_analysis is None:
+                    # Step 1: Upload image for analysis
+                    self._report_progress(progress_callback, 10, 'preparing_image')
+                    self.logger.info("📤 Step 1: Preparing image for analysis...")
+                    with timer.stage('prepare_image'):
+                        original_image_link, preprocessing = self._prepare_image(image_path)
+                    self.logger.info(f"✅ Image prepared: {preprocessing['original_bytes']} -> {preprocessing['processed_bytes']} bytes")
+                    
+                    # Step 2: Enhanced GPT-4 Vision analysis with total wall area
+                    self._report_progress(progress_callback, 20, 'vision_analysis')
+                    self.logger.info("🤖 Step 2: GPT-4 Vision analysis for total wall areas...")
+                    with timer.stage('vision_analysis'):
+                        gpt_analysis = self._analyze_and_cache(original_image_link, cache_info, room_callback)
+                
+                if (self.geometry_fallback and self.geometry_engine
+                        and ('error' in gpt_analysis or not gpt_analysis.get('room_details'))):
+                    reason = gpt_analysis.get('error') or 'no rooms detected'
+                    self.logger.warning(f"⚠️ Vision analysis unusable ({reason}) - falling back to geometry engine")
+                    with timer.stage('geometry_analysis'):
+                        gpt_analysis = self._analyze_with_geometry(image_path, pixels_per_metre, room_callback)
+                    gpt_analysis['fallback_reason'] = reason
+                    # Nobody asked for these rooms; they need checking before anything is priced from them
+                    gpt_analysis['unverified'] = True
+                
+                if 'error' in gpt_analysis:
+                    # Fail the analysis rather than store an empty room list for a failed call
+                    raise RuntimeError(f"Vision analysis failed: {gpt_analysis['error']}")
             
             # Step 3: Generate structured measurements with total wall area approach
+            self._report_progress(progress_callback, 70, 'structuring_measurements')
             self.logger.info("📋 Step 3: Generating structured measurements with total wall areas...")
-            structured_measurements = self._generate_total_wall_area_structured_measurements(gpt_analysis)
+            with timer.stage('structuring'):
+                structured_measurements = self._generate_total_wall_area_structured_measurements(gpt_analysis)
 
             # Ensure fresh data by adding timestamp
             structured_measurements['analysis_timestamp'] = datetime.utcnow().isoformat()
             structured_measurements['fresh_analysis'] = True
                 
             # Step 4: Validate and ensure consistency
+            self._report_progress(progress_callback, 80, 'validating')
             self.logger.info("✅ Step 4: Validating total wall area measurements...")
-            validated_measurements = self._validate_and_normalize_total_wall_area_measurements(structured_measurements)
+            with timer.stage('validation'):
+                validated_measurements = self._validate_and_normalize_total_wall_area_measurements(structured_measurements)
             
             # Step 5: Generate reports
+            self._report_progress(progress_callback, 90, 'generating_reports')
             self.logger.info("📋 Step 5: Generating reports...")
-            reports = self._generate_reports(gpt_analysis, validated_measurements, results_dir)
+            with timer.stage('reports'):
+                reports = self._generate_reports(gpt_analysis, validated_measurements, results_dir)
+            
+            timings = build_timings(timer, gpt_analysis, preprocessing, cache_info)
             
             # Compile final results
             results = {
@@ -84,15 +229,22 @@ class FloorPlanAnalyzer:
                 "gpt_analysis": gpt_analysis,
                 "structured_measurements": validated_measurements,
                 "reports": reports,
-                "original_image_link": original_image_link
+                "original_image_link": original_image_link,
+                "image_preprocessing": preprocessing,
+                "cache": cache_info,
+                "measurement_engine": gpt_analysis.get('engine', 'vision'),
+                "unverified": bool(gpt_analysis.get('unverified')),
+                "timings": timings
             }
             
-            # Save complete results
-            results_file = os.path.join(results_dir, "analysis_results.json")
-            with open(results_file, "w", encoding="utf-8") as f:
-                json.dump(results, f, indent=4, ensure_ascii=False)
+            # Save complete results (the only file written; reports are rendered on download)
+            write_analysis_artifact(results, results_dir)
             
-            self.logger.info(f"🎉 Total wall area analysis {analysis_id} completed successfully!")
+            self.logger.info(
+                f"🎉 Total wall area analysis {analysis_id} completed successfully in {timings['total_ms']:.0f}ms "
+                f"(stages: {', '.join(f'{name}={ms:.0f}ms' for name, ms in timings['stages_ms'].items())}; "
+                f"tokens: {timings['tokens']['total_tokens']})"
+            )
             return results
             
         except Exception as e:
@@ -105,48 +257,344 @@ class FloorPlanAnalyzer:
                 "timestamp": datetime.utcnow().isoformat()
             }
     
-    def _analyze_with_total_wall_area_gpt4_vision(self, image_url: str) -> Dict[str, Any]:
-        """GPT-4 Vision analysis with total wall area per room - IMPROVED PROMPT"""
-        prompt = """
-        Analyze this floor plan image and provide TOTAL WALL AREA and CEILING AREA for each room.
+    def merge_floor_results(self, floor_results: List[Dict[str, Any]], floor_labels: List[str],
+                            results_dir: str, analysis_id: str) -> Dict[str, Any]:
+        """Merge per-image analyses of a multi-storey house into one result
 
-        For each room you identify, provide ONLY the following format:
+        Rooms are tagged with their floor label and renumbered so ids stay unique.
+        Floors whose analysis failed are listed in ``floors`` but contribute no rooms.
+        """
+        timer = StageTimer()
+        merged_rooms = []
+        room_details = []
+        analysis_sections = []
+        floors = []
+        floor_timings = []
+        original_bytes = 0
+        processed_bytes = 0
+        
+        for floor_index, (label, result) in enumerate(zip(floor_labels, floor_results)):
+            floor_info = {
+                'floor': label,
+                'floor_index': floor_index,
+                'status': result.get('status'),
+                'analysis_id': result.get('analysis_id'),
+                'cache_hit': (result.get('cache') or {}).get('hit', False),
+                'measurement_engine': result.get('measurement_engine'),
+                'unverified': bool(result.get('unverified'))
+            }
+            
+            if result.get('status') != 'success':
+                floor_info['message'] = result.get('message', 'Unknown error')
+                floors.append(floor_info)
+                continue
+            
+            rooms = result.get('structured_measurements', {}).get('rooms', [])
+            for room in rooms:
+                room = dict(room)
+                room['id'] = len(merged_rooms) + 1
+                room['floor'] = label
+                room['floor_index'] = floor_index
+                merged_rooms.append(room)
+            
+            for detail in result.get('gpt_analysis', {}).get('room_details', []):
+                detail = dict(detail)
+                detail['id'] = len(room_details) + 1
+                detail['floor'] = label
+                room_details.append(detail)
+            
+            analysis_sections.append(f"=== {label} ===\n{result.get('gpt_analysis', {}).get('full_analysis', '')}")
+            
+            preprocessing = result.get('image_preprocessing') or {}
+            original_bytes += preprocessing.get('original_bytes', 0)
+            processed_bytes += preprocessing.get('processed_bytes', 0)
+            
+            if result.get('timings'):
+                floor_timings.append(result['timings'])
+                floor_info['total_ms'] = result['timings'].get('total_ms')
+            
+            floor_info['rooms_detected'] = len(rooms)
+            floors.append(floor_info)
+        
+        successful = [floor for floor in floors if floor['status'] == 'success']
+        if not successful:
+            return {
+                "status": "error",
+                "message": "; ".join(f"{floor['floor']}: {floor.get('message')}" for floor in floors),
+                "analysis_id": analysis_id,
+                "floors": floors,
+                "timestamp": datetime.utcnow().isoformat()
+            }
+        
+        gpt_analysis = {
+            "full_analysis": "\n\n".join(analysis_sections),
+            "room_details": room_details,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        structured_measurements = {
+            'rooms': merged_rooms,
+            'notes': f'Generated from AI analysis of {len(successful)} floor plans with total wall area per room',
+            'floors': [floor['floor'] for floor in successful],
+            'analysis_timestamp': datetime.utcnow().isoformat(),
+            'fresh_analysis': True
+        }
+        validated_measurements = self._validate_and_normalize_total_wall_area_measurements(structured_measurements)
+        reports = self._generate_reports(gpt_analysis, validated_measurements, results_dir)
+        
+        # Per-floor stages and tokens are summed; the floors ran concurrently so the job
+        # records the wall-clock total separately
+        timings = merge_timings(floor_timings)
+        timings['stages_ms']['merge'] = timer.total_ms
+        
+        results = {
+            "status": "success",
+            "analysis_id": analysis_id,
+            "timestamp": datetime.utcnow().isoformat(),
+            "gpt_analysis": gpt_analysis,
+            "structured_measurements": validated_measurements,
+            "reports": reports,
+            "floors": floors,
+            "unverified": any(floor['unverified'] for floor in successful),
+            "image_preprocessing": {
+                'original_bytes': original_bytes,
+                'processed_bytes': processed_bytes,
+                'reduction_percent': round((1 - processed_bytes / original_bytes) * 100, 1) if original_bytes else 0.0
+            },
+            "timings": timings
+        }
+        
+        write_analysis_artifact(results, results_dir)
+        
+        self.logger.info(f"🏢 Merged {len(successful)}/{len(floors)} floors into {len(merged_rooms)} rooms for {analysis_id}")
+        return results
+    
+    def analyze_room_region(self, image_path: str, bbox: List[float], results_dir: str,
+                            room_name: Optional[str] = None, padding: float = 0.15,
+                            pixels_per_metre: Optional[float] = None) -> Dict[str, Any]:
+        """Re-measure one room from a crop of the plan instead of the whole image
 
-        Room: [Room Name] ([Room Type])
-        - walls_surface_m2: [total_wall_area_number]
-        - area_m2: [ceiling_floor_area_number]
+        ``bbox`` is ``[x, y, width, height]`` in pixels of the uploaded image; it is grown by
+        ``padding`` (a fraction of its size) so the walls and dimension labels around the
+        room stay in view, clamped to the image and saved under ``results_dir``. Only the
+        crop is sent, so upload size and image tokens scale with the room, not the plan.
+        Returns the best-matching room (by name) or an error result.
+        """
+        timer = StageTimer()
+        self.logger.info(f"🔍 Re-analyzing room region {bbox} of {os.path.basename(image_path)}")
+        
+        try:
+            if not os.path.exists(image_path):
+                raise FileNotFoundError(f"Input image not found: {image_path}")
+            os.makedirs(results_dir, exist_ok=True)
+            
+            with timer.stage('crop'):
+                crop_path = os.path.join(results_dir, 'room_crop.png')
+                region, image_size = self._crop_region(image_path, bbox, padding, crop_path)
+            
+            crop_width, crop_height = region[2] - region[0], region[3] - region[1]
+            scale_hint = ''
+            if pixels_per_metre:
+                scale_hint = (f"\n        The crop covers about {crop_width / pixels_per_metre:.1f}m × "
+                              f"{crop_height / pixels_per_metre:.1f}m ({pixels_per_metre:.1f} pixels per metre).")
+            prompt = ROOM_REGION_PROMPT.format(
+                name_hint=f' (labelled "{room_name}" on the full plan)' if room_name else '',
+                scale_hint=scale_hint
+            )
+            
+            with timer.stage('prepare_image'):
+                image_url, preprocessing = self._prepare_image(crop_path)
+            with timer.stage('vision_analysis'):
+                gpt_analysis = self._analyze_with_total_wall_area_gpt4_vision(image_url, prompt=prompt, max_tokens=300)
+            if 'error' in gpt_analysis:
+                raise RuntimeError(f"Vision analysis failed: {gpt_analysis['error']}")
+            
+            room = self._pick_region_room(gpt_analysis.get('room_details') or [], room_name)
+            if not room:
+                raise ValueError('No room measurements found in the cropped region')
+            
+            timings = build_timings(timer, gpt_analysis, preprocessing, {'enabled': False, 'hit': False})
+            self.logger.info(
+                f"✅ Room region re-analyzed in {timings['total_ms']:.0f}ms: {room['name']} "
+                f"{room['walls_surface_m2']}m² walls, {room['area_m2']}m² ceiling "
+                f"(crop {crop_width}x{crop_height} of {image_size[0]}x{image_size[1]}; "
+                f"tokens: {timings['tokens']['total_tokens']})"
+            )
+            return {
+                "status": "success",
+                "room": room,
+                "region": {
+                    'room_bbox': [float(value) for value in bbox],
+                    'bbox': [region[0], region[1], crop_width, crop_height],
+                    'image_size': list(image_size),
+                    'area_fraction': round(crop_width * crop_height / (image_size[0] * image_size[1]), 4),
+                    'crop_path': crop_path
+                },
+                "full_analysis": gpt_analysis.get('full_analysis'),
+                "image_preprocessing": preprocessing,
+                "timings": timings,
+                "timestamp": datetime.utcnow().isoformat()
+            }
+        
+        except Exception as e:
+            self.logger.error(f"❌ Room region analysis failed: {e}")
+            return {
+                "status": "error",
+                "message": str(e),
+                "timestamp": datetime.utcnow().isoformat()
+            }
+    
+    def _crop_region(self, image_path: str, bbox: List[float], padding: float, output_path: str):
+        """Save the padded, clamped ``[x, y, w, h]`` region as PNG; returns (box, image size)"""
+        from PIL import Image, ImageOps
+        from services.tiled_image import TiledImageReader, is_large_image, DEFAULT_LARGE_IMAGE_PIXELS
+        
+        x, y, width, height = (float(value) for value in bbox)
+        if width <= 0 or height <= 0:
+            raise ValueError('Room region must have a positive width and height')
+        
+        def padded_box(image_width, image_height):
+            pad_x, pad_y = width * padding, height * padding
+            box = (
+                max(0, int(x - pad_x)),
+                max(0, int(y - pad_y)),
+                min(image_width, int(round(x + width + pad_x))),
+                min(image_height, int(round(y + height + pad_y)))
+            )
+            if box[2] <= box[0] or box[3] <= box[1]:
+                raise ValueError(f'Room region {bbox} is outside the {image_width}x{image_height} image')
+            return box
+        
+        if is_large_image(image_path, self.tiling.get('large_image_pixels', DEFAULT_LARGE_IMAGE_PIXELS)):
+            reader = TiledImageReader(image_path, **self.tiling)
+            if reader.orientation in (None, 1):
+                # Read just the region from a huge scan instead of decoding all of it
+                box = padded_box(reader.width, reader.height)
+                reader.read_region(box).save(output_path, format='PNG', optimize=True)
+                return box, (reader.width, reader.height)
+        
+        with Image.open(image_path) as image:
+            # Coordinates come from the plan as displayed, i.e. after EXIF rotation
+            image = ImageOps.exif_transpose(image)
+            box = padded_box(image.width, image.height)
+            
+            crop = image.crop(box)
+            if crop.mode not in ('RGB', 'L'):
+                crop = crop.convert('RGB')
+            crop.save(output_path, format='PNG', optimize=True)
+            return box, image.size
+    
+    def _pick_region_room(self, rooms: List[Dict], room_name: Optional[str]) -> Optional[Dict]:
+        """The parsed room matching the expected name, else the largest (the centred room)"""
+        if not rooms:
+            return None
+        if room_name:
+            wanted = room_name.strip().lower()
+            for room in rooms:
+                if room['name'].strip().lower() == wanted:
+                    return room
+        return max(rooms, key=lambda room: room.get('area_m2') or 0)
+    
+    def _report_progress(self, progress_callback, progress: int, stage: str):
+        """Forward progress to the caller without letting callback errors abort the analysis"""
+        if not progress_callback:
+            return
+        try:
+            progress_callback(progress, stage)
+        except Exception as e:
+            self.logger.warning(f"⚠️ Progress callback failed at stage {stage}: {e}")
+    
+    def _ensure_geometry_engine(self):
+        """Return the geometry engine, building it on first use when only vision is configured"""
+        if self.geometry_engine is None and self.geometry_engine_factory is not None:
+            self.geometry_engine = self.geometry_engine_factory()
+            self.logger.info("📐 Geometry engine built on demand")
+        return self.geometry_engine
+    
+    def _analyze_with_geometry(self, image_path: str, pixels_per_metre: Optional[float] = None,
+                               room_callback: Optional[Callable[[Dict], None]] = None) -> Dict[str, Any]:
+        """Measure rooms with the local geometry engine, in the same shape as the GPT result"""
+        from services.geometry_engine import rooms_to_analysis_text
+        
+        try:
+            geometry = self.geometry_engine.measure(image_path, pixels_per_metre=pixels_per_metre)
+            for room in geometry['rooms']:
+                self._emit_room(room_callback, room)
+            
+            return {
+                "full_analysis": rooms_to_analysis_text(geometry['rooms']),
+                "room_details": geometry['rooms'],
+                "timestamp": datetime.utcnow().isoformat(),
+                "engine": "geometry",
+                "geometry": {key: value for key, value in geometry.items() if key != 'rooms'}
+            }
+        except Exception as e:
+            self.logger.error(f"Geometry engine analysis failed: {e}")
+            return {
+                "error": str(e),
+                "engine": "geometry",
+                "timestamp": datetime.utcnow().isoformat()
+            }
+    
+    def _lookup_cached_analysis(self, image_path: str, force_refresh: bool = False,
+                                room_callback: Optional[Callable[[Dict], None]] = None):
+        """Return (cached analysis or None, cache_info) for the original image file"""
+        if not self.cache:
+            return None, {'enabled': False, 'hit': False}
 
-        EXAMPLE FORMAT:
-        Room: Entree (entrance)
-        - walls_surface_m2: 17.93
-        - area_m2: 7.78
+        image_hash = self.cache.hash_file(image_path)
+        # Pre-processing settings change what the model sees, so they are part of the key
+        prompt_version = PROMPT_VERSION
+        if self.preprocessor:
+            prompt_version = f"{PROMPT_VERSION}:{self.preprocessor.signature}"
+        cache_key = self.cache.make_key(image_hash, self.model, prompt_version)
+        cache_info = {
+            'enabled': True,
+            'hit': False,
+            'key': cache_key,
+            'image_sha256': image_hash,
+            'model': self.model,
+            'prompt_version': prompt_version,
+            'force_refresh': force_refresh
+        }
 
-        Room: Eetkamer (dining room)
-        - walls_surface_m2: 17.34
-        - area_m2: 6.41
+        if not force_refresh:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.logger.info(f"⚡ Analysis cache hit for image {image_hash[:12]} - skipping pre-processing and GPT-4 Vision call")
+                cache_info['hit'] = True
+                for room in cached.get('room_details', []):
+                    self._emit_room(room_callback, room)
+                return cached, cache_info
 
-        Room: Woonkamer (living room)
-        - walls_surface_m2: 51.19
-        - area_m2: 48.29
+        return None, cache_info
 
-        CALCULATION METHOD:
-        1. For walls_surface_m2: Calculate room perimeter × wall height (assume 2.4m height)
-        2. For area_m2: Calculate room length × width (ceiling/floor area)
+    def _analyze_and_cache(self, image_url: str, cache_info: Dict[str, Any],
+                           room_callback: Optional[Callable[[Dict], None]] = None) -> Dict[str, Any]:
+        """Analyse a prepared image and store a usable result under the key from ``_lookup_cached_analysis``"""
+        gpt_analysis = self._analyze_with_total_wall_area_gpt4_vision(image_url, room_callback)
 
-        REQUIREMENTS:
-        - Provide ONLY the final room measurements in the exact format shown
-        - Do NOT include intermediate calculations or explanations
-        - Do NOT repeat room names or create duplicates
-        - Do NOT suggest any treatments or work recommendations
-        - Each room should appear ONLY ONCE in your response
-        - Use clear room names (Entree, Eetkamer, Woonkamer, etc.)
+        # Only cache usable results so a transient failure is retried next time
+        if cache_info.get('enabled') and 'error' not in gpt_analysis and gpt_analysis.get('room_details'):
+            try:
+                self.cache.set(cache_info['key'], gpt_analysis, metadata={
+                    'image_sha256': cache_info['image_sha256'],
+                    'model': cache_info['model'],
+                    'prompt_version': cache_info['prompt_version']
+                })
+            except Exception as e:
+                self.logger.warning(f"⚠️ Could not store analysis in cache: {e}")
 
-        Analyze the floor plan and provide measurements for each distinct room you can identify.
-        """
+        return gpt_analysis
+
+    def _analyze_with_total_wall_area_gpt4_vision(self, image_url: str,
+                                                  room_callback: Optional[Callable[[Dict], None]] = None,
+                                                  prompt: str = TOTAL_WALL_AREA_PROMPT,
+                                                  max_tokens: int = 1000) -> Dict[str, Any]:
+        """GPT-4 Vision analysis with total wall area per room - IMPROVED PROMPT"""
         
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
+            request_kwargs = dict(
+                model=self.model,
                 messages=[{
                     "role": "user",
                     "content": [
@@ -154,17 +602,39 @@ class FloorPlanAnalyzer:
                         {"type": "image_url", "image_url": {"url": image_url}}
                     ]
                 }],
-                max_tokens=1000,  # Reduced to encourage concise responses
+                max_tokens=max_tokens,  # Kept low to encourage concise responses
                 temperature=0.1
             )
             
-            analysis_text = response.choices[0].message.content
+            api_timings = {}
+            waiting_since = time.perf_counter()
+            with (self.concurrency_limiter() if self.concurrency_limiter else nullcontext()):
+                started = time.perf_counter()
+                api_timings['vision_slot_wait'] = round((started - waiting_since) * 1000, 2)
+                if room_callback:
+                    analysis_text, usage, first_token_ms = self._stream_completion(request_kwargs, room_callback)
+                    api_timings['vision_first_token'] = first_token_ms
+                else:
+                    response = self.vision_backend.complete(request_kwargs)
+                    analysis_text, usage = response.text, response.usage
+                api_timings['vision_api_call'] = round((time.perf_counter() - started) * 1000, 2)
+            
+            # The full-text parse stays authoritative; streamed rooms are an early preview
+            started = time.perf_counter()
             room_details = self._extract_total_wall_area_room_data(analysis_text)
+            api_timings['parse'] = round((time.perf_counter() - started) * 1000, 2)
+            
+            self.logger.info(
+                f"⏱️ Vision call took {api_timings['vision_api_call']:.0f}ms, "
+                f"{(usage or {}).get('prompt_tokens', '?')} prompt + {(usage or {}).get('completion_tokens', '?')} completion tokens"
+            )
             
             return {
                 "full_analysis": analysis_text,
                 "room_details": room_details,
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": datetime.utcnow().isoformat(),
+                "usage": usage,
+                "api_timings": api_timings
             }
         except Exception as e:
             self.logger.error(f"Total wall area GPT-4 Vision analysis failed: {e}")
@@ -173,169 +643,44 @@ class FloorPlanAnalyzer:
                 "timestamp": datetime.utcnow().isoformat()
             }  
 
-    def _extract_total_wall_area_room_data(self, analysis_text: str) -> List[Dict]:
-        """Extract total wall area room data from GPT analysis - FIXED to avoid duplicates"""
-        import re
-        
-        rooms = []
-        lines = analysis_text.split('\n')
-        
-        print(f"🔍 Parsing total wall area analysis text with {len(lines)} lines")
-        
-        # First, let's find all the properly formatted room data blocks
-        room_blocks = []
-        current_block = []
-        in_room_block = False
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            
-            # Look for the final room format: "Room: Name (type)"
-            if line.startswith('Room:') and '(' in line and ')' in line:
-                # Save previous block if it exists
-                if current_block:
-                    room_blocks.append('\n'.join(current_block))
-                
-                # Start new block
-                current_block = [line]
-                in_room_block = True
-                print(f"📍 Found room block start: {line}")
-                
-            elif in_room_block and ('walls_surface_m2:' in line or 'area_m2:' in line):
-                current_block.append(line)
-                print(f"📐 Added measurement: {line}")
-                
-            elif in_room_block and line.startswith('Room:'):
-                # New room started, save previous block
-                if current_block:
-                    room_blocks.append('\n'.join(current_block))
-                
-                # Start new block
-                current_block = [line]
-                print(f"📍 Found new room block: {line}")
-        
-        # Don't forget the last block
-        if current_block:
-            room_blocks.append('\n'.join(current_block))
-        
-        print(f"🎯 Found {len(room_blocks)} room blocks to process")
-        
-        # Now process each room block
-        for i, block in enumerate(room_blocks):
-            print(f"\n🔄 Processing room block {i+1}:")
-            print(f"Block content: {block}")
-            
-            room_data = {
-                'id': i + 1,
-                'name': '',
-                'type': 'general',
-                'walls_surface_m2': 0,
-                'area_m2': 0
-            }
-            
-            # Extract room name and type from the first line
-            first_line = block.split('\n')[0]
-            room_match = re.match(r'Room:\s*(.+?)\s*\((.+?)\)', first_line, re.IGNORECASE)
-            if room_match:
-                room_data['name'] = room_match.group(1).strip()
-                room_data['type'] = room_match.group(2).strip().lower()
-                print(f"✅ Extracted: name='{room_data['name']}', type='{room_data['type']}'")
-            
-            # Extract measurements from the block
-            walls_match = re.search(r'walls_surface_m2:\s*(\d+(?:\.\d+)?)', block, re.IGNORECASE)
-            if walls_match:
-                room_data['walls_surface_m2'] = float(walls_match.group(1))
-                print(f"📐 Walls: {room_data['walls_surface_m2']}m²")
-            
-            area_match = re.search(r'area_m2:\s*(\d+(?:\.\d+)?)', block, re.IGNORECASE)
-            if area_match:
-                room_data['area_m2'] = float(area_match.group(1))
-                print(f"📐 Ceiling: {room_data['area_m2']}m²")
-            
-            # Only add rooms that have valid data (name and at least one measurement > 0)
-            if room_data['name'] and (room_data['walls_surface_m2'] > 0 or room_data['area_m2'] > 0):
-                rooms.append(room_data)
-                print(f"✅ Added room: {room_data['name']} - Walls: {room_data['walls_surface_m2']}m², Ceiling: {room_data['area_m2']}m²")
-            else:
-                print(f"❌ Skipped invalid room data: {room_data}")
-        
-        # If the block-based approach didn't work, fall back to line-by-line parsing
-        if not rooms:
-            print("🔄 Block parsing failed, trying alternative approach...")
-            
-            # Alternative: Look for standalone room entries with measurements
-            for line in lines:
-                line = line.strip()
-                
-                # Look for pattern: "### Room: Name (type)" or "Room: Name (type)"
-                room_match = re.match(r'#{0,3}\s*Room:\s*(.+?)\s*\((.+?)\)', line, re.IGNORECASE)
-                if room_match:
-                    room_name = room_match.group(1).strip()
-                    room_type = room_match.group(2).strip().lower()
-                    
-                    print(f"🔍 Found room: {room_name} ({room_type})")
-                    
-                    # Look for measurements in the next few lines
-                    line_index = lines.index(line.strip())
-                    walls_area = 0
-                    ceiling_area = 0
-                    
-                    # Check next 10 lines for measurements
-                    for j in range(line_index + 1, min(line_index + 11, len(lines))):
-                        check_line = lines[j].strip()
-                        
-                        walls_match = re.search(r'walls_surface_m2:\s*(\d+(?:\.\d+)?)', check_line, re.IGNORECASE)
-                        if walls_match:
-                            walls_area = float(walls_match.group(1))
-                            print(f"📐 Found walls: {walls_area}m²")
-                        
-                        area_match = re.search(r'area_m2:\s*(\d+(?:\.\d+)?)', check_line, re.IGNORECASE)
-                        if area_match:
-                            ceiling_area = float(area_match.group(1))
-                            print(f"📐 Found ceiling: {ceiling_area}m²")
-                        
-                        # Stop if we hit another room
-                        if 'Room:' in check_line and check_line != line:
-                            break
-                    
-                    # Only add if we have valid measurements
-                    if walls_area > 0 or ceiling_area > 0:
-                        room_data = {
-                            'id': len(rooms) + 1,
-                            'name': room_name,
-                            'type': room_type,
-                            'walls_surface_m2': walls_area,
-                            'area_m2': ceiling_area
-                        }
-                        rooms.append(room_data)
-                        print(f"✅ Added room: {room_name} - Walls: {walls_area}m², Ceiling: {ceiling_area}m²")
-        
-        # Final validation: Remove any duplicates and empty rooms
-        validated_rooms = []
-        seen_names = set()
-        
-        for room in rooms:
-            # Skip rooms with empty names or no measurements
-            if not room['name'] or (room['walls_surface_m2'] == 0 and room['area_m2'] == 0):
-                print(f"❌ Skipping invalid room: {room}")
-                continue
-            
-            # Skip duplicate room names
-            if room['name'] in seen_names:
-                print(f"❌ Skipping duplicate room: {room['name']}")
-                continue
-            
-            seen_names.add(room['name'])
-            validated_rooms.append(room)
-            print(f"✅ Validated room: {room['name']}")
+    def _stream_completion(self, request_kwargs: Dict[str, Any], room_callback: Callable[[Dict], None]):
+        """Stream the completion, handing each finished room block to ``room_callback``
+
+        Returns ``(text, usage, first_token_ms)``; usage arrives in the final chunk.
+        """
+        parser = StreamingRoomParser(on_room=lambda room: self._emit_room(room_callback, room))
+        parts = []
+        usage = None
+        first_token_ms = None
+        started = time.perf_counter()
         
-        print(f"🎉 Successfully extracted {len(validated_rooms)} unique valid rooms")
-        for room in validated_rooms:
-            print(f"  - {room['name']} ({room['type']}): walls={room['walls_surface_m2']}m², ceiling={room['area_m2']}m²")
+        for chunk in self.vision_backend.stream(request_kwargs):
+            if chunk.usage:
+                usage = chunk.usage
+            if chunk.text:
+                if first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - started) * 1000, 2)
+                parts.append(chunk.text)
+                parser.feed(chunk.text)
+        parser.close()
         
-        return validated_rooms
+        self.logger.info(f"📡 Streamed completion: {len(parser.rooms)} rooms emitted incrementally")
+        return ''.join(parts), usage, first_token_ms
+    
+    def _emit_room(self, room_callback, room: Dict):
+        """Forward a parsed room without letting callback errors abort the analysis"""
+        if not room_callback:
+            return
+        try:
+            room_callback(room)
+        except Exception as e:
+            self.logger.warning(f"⚠️ Room callback failed for {room.get('name')}: {e}")
+    
+    def _extract_total_wall_area_room_data(self, analysis_text: str) -> List[Dict]:
+        """Extract total wall area room data from GPT analysis (single pass, duplicates dropped)"""
+        rooms = parse_rooms(analysis_text)
+        self.logger.info(f"🎉 Extracted {len(rooms)} unique valid rooms from GPT analysis")
+        return rooms
 
     def _generate_total_wall_area_structured_measurements(self, gpt_analysis: Dict) -> Dict[str, Any]:
         """Generate structured measurements with total wall area approach"""
@@ -407,56 +752,53 @@ class FloorPlanAnalyzer:
         return validated
     
     def _generate_reports(self, gpt_analysis: Dict, structured_measurements: Dict, results_dir: str) -> Dict[str, str]:
-        """Generate detailed reports for total wall area approach"""
-        reports = {}
-        
-        # Generate summary report
-        total_rooms = len(structured_measurements.get('rooms', []))
-        total_wall_area = sum(
-            room['walls_surface_m2']
-            for room in structured_measurements.get('rooms', [])
-        )
-        total_ceiling_area = sum(
-            room['area_m2']
-            for room in structured_measurements.get('rooms', [])
-        )
-        
-        summary_report = {
-            "analysis_summary": {
-                "timestamp": datetime.utcnow().isoformat(),
-                "analysis_method": "GPT-4 Vision with Total Wall Area",
-                "rooms_detected": total_rooms,
-                "total_wall_area_m2": round(total_wall_area, 2),
-                "total_ceiling_area_m2": round(total_ceiling_area, 2),
-                "total_paintable_area_m2": round(total_wall_area + total_ceiling_area, 2)
-            },
-            "room_breakdown": [
-                {
-                    "name": room['name'],
-                    "type": room['type'],
-                    "walls_surface_m2": room['walls_surface_m2'],
-                    "ceiling_area_m2": room['area_m2']
-                }
-                for room in structured_measurements.get('rooms', [])
-            ],
-            "notes": "Total wall area analysis - treatments to be selected by user"
-        }
-        
-        summary_file = os.path.join(results_dir, "summary_report.json")
-        with open(summary_file, "w", encoding="utf-8") as f:
-            json.dump(summary_report, f, indent=4, ensure_ascii=False)
+        """Report download paths; the summary and measurements files are rendered from the
+        stored analysis when requested (see ``services.analysis_artifacts``)"""
+        return report_paths(results_dir)
+    
+    def _prepare_image(self, image_path: str):
+        """Return (data_url, preprocessing_stats), shrinking the image first when a preprocessor is set"""
+        if not os.path.isfile(image_path):
+            raise FileNotFoundError(f"File not found: '{image_path}'.")
+        if is_pdf(image_path):
+            # Never send raw PDF bytes; jobs render pages first (services.pdf_rasterizer)
+            raise ValueError(f"PDF floor plans must be rasterized before analysis: '{image_path}'")
         
-        reports["summary_report"] = summary_file
+        from services.tiled_image import is_large_image, DEFAULT_LARGE_IMAGE_PIXELS
         
-        # Generate structured measurements report
-        measurements_file = os.path.join(results_dir, "structured_measurements.json")
-        with open(measurements_file, "w", encoding="utf-8") as f:
-            json.dump(structured_measurements, f, indent=4, ensure_ascii=False)
+        original_bytes = os.path.getsize(image_path)
+        preprocessor = self.preprocessor
+        large = is_large_image(image_path, self.tiling.get('large_image_pixels', DEFAULT_LARGE_IMAGE_PIXELS))
+        if large and not preprocessor:
+            # Huge scans are always shrunk (read window by window); the raw file is never sent
+            from services.image_preprocessor import ImagePreprocessor
+            preprocessor = ImagePreprocessor(grayscale=False, crop_whitespace=False, tiling=self.tiling)
         
-        reports["structured_measurements"] = measurements_file
+        if preprocessor:
+            try:
+                import base64
+                
+                data, mime_type, stats = preprocessor.process(image_path)
+                data_url = f"data:{mime_type};base64,{base64.b64encode(data).decode('utf-8')}"
+                stats['applied'] = True
+                self.logger.info(
+                    f"🗜️ Pre-processed image: {stats['original_bytes']} -> {stats['processed_bytes']} bytes "
+                    f"({stats['reduction_percent']}% smaller, steps: {', '.join(stats['steps']) or 'none'})"
+                )
+                return data_url, stats
+            except Exception as e:
+                if large:
+                    raise
+                self.logger.warning(f"⚠️ Image pre-processing failed, sending original image: {e}")
         
-        return reports
-    
+        data_url = self._upload_image_with_fallbacks(image_path)
+        return data_url, {
+            'applied': False,
+            'original_bytes': original_bytes,
+            'processed_bytes': original_bytes,
+            'reduction_percent': 0.0
+        }
+
     def _upload_image_with_fallbacks(self, image_path: str) -> str:
         """Upload image with multiple fallback methods"""
         if not os.path.isfile(image_path):
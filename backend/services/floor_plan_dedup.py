@@ -0,0 +1,149 @@
+# services/floor_plan_dedup.py - Find and reuse analyses of near-duplicate floor plans
+import os
+import copy
+import shutil
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from flask import current_app
+from sqlalchemy import or_
+
+from models import db
+from models.project import Project
+from models.floor_plan_image import FloorPlanImage
+from services.image_hashing import dhash, hamming_distance, hash_bands, hash_to_hex
+
+logger = logging.getLogger(__name__)
+
+
+def register_floor_plan(project: Project, image_path: str) -> Optional[FloorPlanImage]:
+    """Hash an uploaded image and store it for duplicate lookups (None for non-images such as PDFs)"""
+    from services.tiled_image import tiling_options  # numpy/Pillow stay out of worker boot
+
+    value = dhash(image_path, tiling=tiling_options(current_app.config))
+    if value is None:
+        return None
+
+    bands = hash_bands(value)
+    image = FloorPlanImage(
+        project_id=project.id,
+        company_id=project.company_id,
+        image_path=image_path,
+        dhash=hash_to_hex(value),
+        band_0=bands[0],
+        band_1=bands[1],
+        band_2=bands[2],
+        band_3=bands[3]
+    )
+    db.session.add(image)
+    return image
+
+
+def prune_floor_plan_hashes(project: Project) -> int:
+    """Drop hashes of images the project no longer has (replaced, or deleted from disk)"""
+    current = set(project.uploaded_images or [])
+    stale = [image for image in FloorPlanImage.query.filter_by(project_id=project.id)
+             if image.image_path not in current or not os.path.exists(image.image_path)]
+    for image in stale:
+        db.session.delete(image)
+    if stale:
+        logger.info(f"🧹 Dropped {len(stale)} stale floor plan hashes of project {project.id}")
+    return len(stale)
+
+
+def find_reusable_analyses(company_id: int, images: List[FloorPlanImage], exclude_project_id: int,
+                           max_distance: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Other analysed projects in the company with a near-duplicate of any of ``images``
+
+    Candidates come from indexed band equality; the exact Hamming distance is then checked
+    in Python. Returns one entry per project, closest match first.
+    """
+    if max_distance is None:
+        max_distance = current_app.config.get('ANALYSIS_DEDUP_MAX_DISTANCE', 3)
+
+    matches: Dict[int, Dict[str, Any]] = {}
+    for image in images:
+        value = image.hash_value
+        bands = hash_bands(value)
+        candidates = FloorPlanImage.query.filter(
+            FloorPlanImage.company_id == company_id,
+            FloorPlanImage.project_id != exclude_project_id,
+            or_(
+                FloorPlanImage.band_0 == bands[0],
+                FloorPlanImage.band_1 == bands[1],
+                FloorPlanImage.band_2 == bands[2],
+                FloorPlanImage.band_3 == bands[3]
+            )
+        ).all()
+
+        for candidate in candidates:
+            distance = hamming_distance(value, candidate.hash_value)
+            # A hash whose file is gone describes a plan the project no longer has
+            if distance > max_distance or not os.path.exists(candidate.image_path):
+                continue
+            best = matches.get(candidate.project_id)
+            if best is None or distance < best['distance']:
+                matches[candidate.project_id] = {
+                    'distance': distance,
+                    'uploaded_image': os.path.basename(image.image_path),
+                    'matched_image': os.path.basename(candidate.image_path)
+                }
+
+    if not matches:
+        return []
+
+    results = []
+    for project in Project.query.filter(Project.id.in_(list(matches))).all():
+        measurements = (project.floor_plan_analysis or {}).get('structured_measurements')
+        if not measurements or not measurements.get('rooms'):
+            continue
+        results.append({
+            'project_id': project.id,
+            'project_name': project.name,
+            'property_address': project.property_address,
+            'rooms_detected': len(measurements['rooms']),
+            'analyzed_at': (project.floor_plan_analysis or {}).get('timestamp'),
+            **matches[project.id]
+        })
+
+    results.sort(key=lambda match: (match['distance'], -(match['project_id'])))
+    return results
+
+
+def reuse_analysis(target: Project, source: Project):
+    """Copy the source project's analysis (and its report files) onto the target project"""
+    analysis = copy.deepcopy(source.floor_plan_analysis)
+
+    results_dir = os.path.join(
+        current_app.config['RESULTS_FOLDER'],
+        str(target.company_id),
+        str(target.id),
+        f"analysis_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_reused"
+    )
+    os.makedirs(results_dir, exist_ok=True)
+
+    copied = {}
+    for file_path in source.generated_files or []:
+        if os.path.isfile(file_path):
+            destination = os.path.join(results_dir, os.path.basename(file_path))
+            shutil.copy2(file_path, destination)
+            copied[file_path] = destination
+
+    analysis['reports'] = {
+        name: copied.get(path, path) for name, path in (analysis.get('reports') or {}).items()
+    }
+    analysis['reused_from'] = {
+        'project_id': source.id,
+        'analysis_id': analysis.get('analysis_id'),
+        'reused_at': datetime.utcnow().isoformat()
+    }
+
+    target.floor_plan_analysis = analysis
+    target.manual_measurements = copy.deepcopy(analysis.get('structured_measurements'))
+    target.generated_files = list(copied.values())
+    target.status = 'ready'
+    target.updated_at = datetime.utcnow()
+
+    logger.info(f"♻️ Reused analysis of project {source.id} for project {target.id} "
+                f"({len((target.manual_measurements or {}).get('rooms', []))} rooms, {len(copied)} files)")
@@ -0,0 +1,193 @@
+# services/geometry_engine.py - Deterministic OpenCV room measurement (no vision API)
+import time
+import logging
+from typing import Dict, Any, Optional
+
+import cv2
+import numpy as np
+
+from services.tiled_image import TiledImageReader, is_large_image, tiling_options, DEFAULT_LARGE_IMAGE_PIXELS
+
+
+class GeometryEngine:
+    """Measure rooms directly from the floor plan raster.
+
+    Pipeline: grayscale -> Otsu binarisation (walls = ink) -> morphological opening to drop
+    thin text/furniture strokes -> closing to seal door openings -> connected components of
+    the free space. Components touching the image border are the exterior. Areas and
+    perimeters for every room are computed in one vectorised pass over the label image.
+
+    Perimeters are counted along the pixel grid, which is exact for the axis-aligned walls
+    typical of floor plans and overestimates diagonal walls.
+    """
+
+    def __init__(self, pixels_per_metre: Optional[float] = None, wall_height: float = 2.4,
+                 min_room_area_m2: float = 1.0, max_edge: int = 2000,
+                 door_width_m: float = 0.9, assumed_wall_thickness_m: float = 0.15,
+                 tiling: Optional[Dict[str, int]] = None):
+        self.pixels_per_metre = pixels_per_metre
+        self.wall_height = wall_height
+        self.min_room_area_m2 = min_room_area_m2
+        self.max_edge = max_edge
+        self.door_width_m = door_width_m
+        self.assumed_wall_thickness_m = assumed_wall_thickness_m
+        self.tiling = tiling or {}  # TiledImageReader options for very large scans
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_config(cls, config, pixels_per_metre: Optional[float] = None) -> 'GeometryEngine':
+        return cls(
+            pixels_per_metre=pixels_per_metre or config.get('ANALYSIS_PIXELS_PER_METRE'),
+            wall_height=config.get('WALL_HEIGHT', 2.4),
+            min_room_area_m2=config.get('ANALYSIS_GEOMETRY_MIN_ROOM_M2', 1.0),
+            max_edge=config.get('ANALYSIS_GEOMETRY_MAX_EDGE', 2000),
+            assumed_wall_thickness_m=config.get('ANALYSIS_ASSUMED_WALL_THICKNESS_M', 0.15),
+            tiling=tiling_options(config)
+        )
+
+    def measure(self, image_path: str, pixels_per_metre: Optional[float] = None) -> Dict[str, Any]:
+        """Return rooms (``walls_surface_m2``, ``area_m2``) and scale/timing metadata"""
+        started = time.perf_counter()
+
+        # Work on a bounded raster; the scale is adjusted by the same factor
+        resize_factor = 1.0
+        tiled = None
+        if is_large_image(image_path, self.tiling.get('large_image_pixels', DEFAULT_LARGE_IMAGE_PIXELS)):
+            # Huge scans are downscaled window by window instead of being decoded whole
+            scan = TiledImageReader(image_path, **self.tiling).scan(self.max_edge)
+            gray, resize_factor, tiled = scan.image, scan.scale, scan.describe()
+        else:
+            gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            raise ValueError(f"Could not read image for geometry analysis: {image_path}")
+
+        if max(gray.shape) > self.max_edge:
+            extra = self.max_edge / max(gray.shape)
+            gray = cv2.resize(gray, None, fx=extra, fy=extra, interpolation=cv2.INTER_AREA)
+            resize_factor *= extra  # compounds with the tiled scan's scale
+
+        walls = self._wall_mask(gray)
+
+        scale_source = 'configured'
+        ppm = pixels_per_metre or self.pixels_per_metre
+        if ppm:
+            ppm = float(ppm) * resize_factor
+        else:
+            ppm = self._estimate_pixels_per_metre(walls)
+            scale_source = 'wall_thickness_estimate'
+
+        # Seal door openings so each room is one closed component
+        door_px = max(3, int(round(self.door_width_m * ppm)) | 1)
+        sealed = cv2.morphologyEx(
+            walls, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (door_px, door_px))
+        )
+
+        free = (sealed == 0).astype(np.uint8)
+        count, labels, stats, centroids = cv2.connectedComponentsWithStats(free, connectivity=4)
+
+        areas_px = stats[:, cv2.CC_STAT_AREA].astype(np.float64)
+        perimeters_px = self._perimeters(labels, count)
+
+        # Exterior = anything touching the border; label 0 is wall
+        border_labels = np.unique(np.concatenate([labels[0, :], labels[-1, :], labels[:, 0], labels[:, -1]]))
+        keep = np.ones(count, dtype=bool)
+        keep[0] = False
+        keep[border_labels] = False
+
+        px_area = 1.0 / (ppm * ppm)
+        areas_m2 = areas_px * px_area
+        perimeters_m = perimeters_px / ppm
+        keep &= areas_m2 >= self.min_room_area_m2
+
+        room_labels = np.flatnonzero(keep)
+        # Largest rooms first, like a reader scanning the plan
+        room_labels = room_labels[np.argsort(-areas_m2[room_labels], kind='stable')]
+
+        walls_m2 = perimeters_m * self.wall_height
+        rooms = []
+        for index, label in enumerate(room_labels, start=1):
+            x, y, w, h = stats[label, :4] / resize_factor
+            rooms.append({
+                'id': index,
+                'name': f'Room {index}',
+                'type': 'general',
+                'walls_surface_m2': round(float(walls_m2[label]), 2),
+                'area_m2': round(float(areas_m2[label]), 2),
+                'perimeter_m': round(float(perimeters_m[label]), 2),
+                'bbox': [int(x), int(y), int(w), int(h)],
+                'centroid': [round(float(c) / resize_factor, 1) for c in centroids[label]]
+            })
+
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.logger.info(f"📐 Geometry engine measured {len(rooms)} rooms in {elapsed_ms}ms ({scale_source} scale)")
+
+        result = {
+            'rooms': rooms,
+            'scale': {
+                'pixels_per_metre': round(ppm / resize_factor, 3),
+                'source': scale_source
+            },
+            'wall_height': self.wall_height,
+            'image_size': [int(gray.shape[1] / resize_factor), int(gray.shape[0] / resize_factor)],
+            'elapsed_ms': elapsed_ms
+        }
+        if tiled:
+            result['tiled'] = tiled
+        return result
+
+    def _wall_mask(self, gray: np.ndarray) -> np.ndarray:
+        """Binary mask (255 = wall) with thin strokes such as text and hatching removed"""
+        blurred = cv2.GaussianBlur(gray, (3, 3), 0)
+        _, ink = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+
+        # Walls are the thickest strokes on a plan; open with a kernel just below their width
+        thickness = self._stroke_thickness(ink)
+        kernel_px = max(2, int(thickness * 0.6))
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_px, kernel_px))
+        return cv2.morphologyEx(ink, cv2.MORPH_OPEN, kernel)
+
+    @staticmethod
+    def _stroke_thickness(ink: np.ndarray) -> float:
+        """Typical thickness (px) of the thickest strokes, from the distance transform"""
+        distances = cv2.distanceTransform(ink, cv2.DIST_L2, 3)
+        values = distances[distances > 0]
+        if values.size == 0:
+            return 2.0
+        return float(np.percentile(values, 95)) * 2
+
+    def _estimate_pixels_per_metre(self, walls: np.ndarray) -> float:
+        """Fallback scale when none is configured: assume a typical wall thickness"""
+        return max(self._stroke_thickness(walls), 1.0) / self.assumed_wall_thickness_m
+
+    @staticmethod
+    def _perimeters(labels: np.ndarray, count: int) -> np.ndarray:
+        """Boundary length (px) of every label, counting grid edges between differing labels"""
+        perimeters = np.zeros(count, dtype=np.float64)
+
+        for a, b in ((labels[:, 1:], labels[:, :-1]), (labels[1:, :], labels[:-1, :])):
+            boundary = a != b
+            perimeters += np.bincount(a[boundary], minlength=count)
+            perimeters += np.bincount(b[boundary], minlength=count)
+
+        return perimeters
+
+
+def rooms_to_analysis_text(rooms) -> str:
+    """Render rooms in the same text format the vision prompt asks for"""
+    return '\n\n'.join(
+        f"Room: {room['name']} ({room['type']})\n"
+        f"- walls_surface_m2: {room['walls_surface_m2']:.2f}\n"
+        f"- area_m2: {room['area_m2']:.2f}"
+        for room in rooms
+    )
+
+
+def get_geometry_engine(app=None):
+    """Return a geometry engine when it is enabled as engine or fallback, else None"""
+    from flask import current_app
+
+    app = app or current_app._get_current_object()
+    if (app.config.get('ANALYSIS_MEASUREMENT_ENGINE', 'vision') != 'geometry'
+            and not app.config.get('ANALYSIS_GEOMETRY_FALLBACK', False)):
+        return None
+    return GeometryEngine.from_config(app.config)
@@ -0,0 +1,64 @@
+# services/image_hashing.py - Perceptual hashes for near-duplicate floor plan detection
+import logging
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+BAND_BITS = 16
+BAND_COUNT = HASH_BITS // BAND_BITS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+
+def dhash(image_path: str, ink_threshold: int = 200, tiling: Optional[dict] = None) -> Optional[int]:
+    """64-bit difference hash of the drawing, or None if the file is not a readable image.
+
+    The drawing is cropped to its ink bounding box first, so the same plan exported with
+    different margins or a looser crop hashes the same; re-compression and rescaling only
+    flip a few bits. Very large scans are hashed from a windowed read (see
+    ``services.tiled_image``) instead of being decoded whole.
+    """
+    # Imported here so the upload route doesn't load numpy/Pillow at worker boot
+    import numpy as np
+    from PIL import Image, ImageOps
+    from services.tiled_image import TiledImageReader, is_large_image, DEFAULT_LARGE_IMAGE_PIXELS
+
+    tiling = tiling or {}
+    try:
+        if is_large_image(image_path, tiling.get('large_image_pixels', DEFAULT_LARGE_IMAGE_PIXELS)):
+            scan = TiledImageReader(image_path, **tiling).scan(1024, orient=False)
+            img = Image.fromarray(scan.image)
+            # The ink box is exact at full resolution; map it onto the reduced raster
+            bbox = scan.ink_bbox(ink_threshold - 1)
+            if bbox:
+                bbox = tuple(int(round(value * scan.scale)) for value in bbox)
+        else:
+            with Image.open(image_path) as img:
+                img = ImageOps.exif_transpose(img).convert('L')
+            # Crop to the ink (anything darker than near-white)
+            bbox = img.point(lambda value: 255 if value < ink_threshold else 0).getbbox()
+    except Exception as e:
+        logger.info(f"Skipping perceptual hash for {image_path}: {e}")
+        return None
+
+    if bbox:
+        img = img.crop(bbox)
+
+    # 9x8 thumbnail -> 8 comparisons per row between horizontal neighbours = 64 bits
+    pixels = np.asarray(img.resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def hash_bands(value: int) -> Tuple[int, ...]:
+    """Split the hash into 16-bit bands. Two hashes within 3 bits of each other always
+    share at least one identical band, so indexed band equality finds every such pair."""
+    return tuple((value >> (BAND_BITS * index)) & BAND_MASK for index in range(BAND_COUNT))
+
+
+def hash_to_hex(value: int) -> str:
+    return f'{value:016x}'
@@ -0,0 +1,190 @@
+# services/image_preprocessor.py - Shrink floor plan images before the vision call
+import io
+import os
+import math
+import logging
+from typing import Dict, Any, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+from services.tiled_image import (
+    TiledImageReader, is_large_image, tiling_options, DEFAULT_LARGE_IMAGE_PIXELS, ORIENTATION_TRANSPOSE
+)
+
+
+class ImagePreprocessor:
+    """Auto-orient, grayscale, crop whitespace, downscale and re-encode floor plans.
+
+    The Otsu threshold is only used to locate the drawing; the image sent to the model
+    stays grayscale so thin lines and room labels are not lost to binarisation.
+    """
+
+    SUPPORTED_FORMATS = {'PNG': 'image/png', 'JPEG': 'image/jpeg'}
+
+    def __init__(self, max_edge: int = 2048, output_format: str = 'PNG', jpeg_quality: int = 85,
+                 grayscale: bool = True, crop_whitespace: bool = True, crop_margin: int = 16,
+                 tiling: Optional[Dict[str, int]] = None):
+        output_format = output_format.upper().replace('JPG', 'JPEG')
+        if output_format not in self.SUPPORTED_FORMATS:
+            raise ValueError(f"Unsupported output format: {output_format}")
+
+        self.max_edge = max_edge
+        self.output_format = output_format
+        self.jpeg_quality = jpeg_quality
+        self.grayscale = grayscale
+        self.crop_whitespace = crop_whitespace
+        self.crop_margin = crop_margin
+        self.tiling = tiling or {}  # TiledImageReader options for very large scans
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_config(cls, config) -> 'ImagePreprocessor':
+        return cls(
+            max_edge=config.get('ANALYSIS_IMAGE_MAX_EDGE', 2048),
+            output_format=config.get('ANALYSIS_IMAGE_FORMAT', 'PNG'),
+            jpeg_quality=config.get('ANALYSIS_IMAGE_JPEG_QUALITY', 85),
+            tiling=tiling_options(config)
+        )
+
+    @property
+    def signature(self) -> str:
+        """Identifies the settings that change what the model sees (used in cache keys)"""
+        return (f"pre:{self.max_edge}:{self.output_format}:{self.jpeg_quality}:"
+                f"{int(self.grayscale)}:{int(self.crop_whitespace)}:{self.crop_margin}")
+
+    def process(self, image_path: str) -> Tuple[bytes, str, Dict[str, Any]]:
+        """Return (encoded_bytes, mime_type, stats) for the image at ``image_path``"""
+        original_bytes = os.path.getsize(image_path)
+        if is_large_image(image_path, self.tiling.get('large_image_pixels', DEFAULT_LARGE_IMAGE_PIXELS)):
+            return self._process_tiled(image_path, original_bytes)
+
+        with Image.open(image_path) as img:
+            img.load()
+            original_size = img.size
+            steps = []
+
+            if img.getexif().get(0x0112, 1) != 1:  # EXIF orientation tag
+                img = ImageOps.exif_transpose(img)
+                steps.append('auto_orient')
+
+            if self.grayscale:
+                img = img.convert('L')
+                steps.append('grayscale')
+            elif img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+
+            if self.crop_whitespace:
+                bbox = self._content_bbox(img)
+                if bbox and bbox != (0, 0, img.width, img.height):
+                    img = img.crop(bbox)
+                    steps.append('crop_whitespace')
+
+            if max(img.size) > self.max_edge:
+                img.thumbnail((self.max_edge, self.max_edge), Image.LANCZOS)
+                steps.append('downscale')
+
+            buffer = io.BytesIO()
+            if self.output_format == 'JPEG':
+                img.save(buffer, format='JPEG', quality=self.jpeg_quality, optimize=True)
+            else:
+                img.save(buffer, format='PNG', optimize=True)
+            data = buffer.getvalue()
+            processed_size = img.size
+
+        stats = self._stats(original_bytes, data, original_size, processed_size, steps)
+        return data, self.SUPPORTED_FORMATS[self.output_format], stats
+
+    def _process_tiled(self, image_path: str, original_bytes: int) -> Tuple[bytes, str, Dict[str, Any]]:
+        """Same steps for scans too large to decode whole, read window by window.
+
+        One pass yields a raster at about twice ``max_edge`` and the full-resolution ink
+        bounding box, so whitespace is cropped before the final downscale as above.
+        """
+        reader = TiledImageReader(image_path, **self.tiling)
+        scan = reader.scan(self.max_edge * 2, color=not self.grayscale, orient=False)
+        img = Image.fromarray(scan.image)
+        steps = ['tiled', 'grayscale'] if self.grayscale else ['tiled']
+
+        if self.crop_whitespace:
+            bbox = scan.ink_bbox()
+            if bbox:
+                margin = self.crop_margin / scan.scale
+                box = (
+                    max(0, int((bbox[0] - margin) * scan.scale)),
+                    max(0, int((bbox[1] - margin) * scan.scale)),
+                    min(img.width, int(math.ceil((bbox[2] + margin) * scan.scale))),
+                    min(img.height, int(math.ceil((bbox[3] + margin) * scan.scale)))
+                )
+                if box != (0, 0, img.width, img.height):
+                    img = img.crop(box)
+                    steps.append('crop_whitespace')
+
+        # Cropping uses stored coordinates, so orientation is applied afterwards
+        if reader.orientation in ORIENTATION_TRANSPOSE:
+            img = img.transpose(ORIENTATION_TRANSPOSE[reader.orientation])
+            steps.insert(1, 'auto_orient')
+
+        # The block-averaged scan is already a downscale; the thumbnail may shrink it further
+        resize_factor = scan.scale
+        if max(img.size) > self.max_edge:
+            long_edge = max(img.size)
+            img.thumbnail((self.max_edge, self.max_edge), Image.LANCZOS)
+            resize_factor *= max(img.size) / long_edge
+        if resize_factor < 1:
+            steps.append('downscale')
+
+        buffer = io.BytesIO()
+        if self.output_format == 'JPEG':
+            img.save(buffer, format='JPEG', quality=self.jpeg_quality, optimize=True)
+        else:
+            img.save(buffer, format='PNG', optimize=True)
+        data = buffer.getvalue()
+
+        stats = self._stats(original_bytes, data, (reader.width, reader.height), img.size, steps)
+        stats['resize_factor'] = round(resize_factor, 6)
+        stats['tiled'] = scan.describe()
+        self.logger.info(f"🧩 Read {reader.width}x{reader.height} scan in windows ({reader.strategy})")
+        return data, self.SUPPORTED_FORMATS[self.output_format], stats
+
+    def _stats(self, original_bytes: int, data: bytes, original_size, processed_size, steps) -> Dict[str, Any]:
+        stats = {
+            'original_bytes': original_bytes,
+            'processed_bytes': len(data),
+            'reduction_percent': round((1 - len(data) / original_bytes) * 100, 1) if original_bytes else 0.0,
+            'original_size': list(original_size),
+            'processed_size': list(processed_size),
+            'format': self.output_format,
+            'steps': steps
+        }
+        return stats
+
+    def _content_bbox(self, img: Image.Image):
+        """Bounding box (left, top, right, bottom) of the drawing, with a small margin"""
+        gray = np.asarray(img if img.mode == 'L' else img.convert('L'))
+
+        # Otsu picks the ink/paper split; invert so the drawing is foreground
+        _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        points = cv2.findNonZero(mask)
+        if points is None:
+            return None
+
+        x, y, w, h = cv2.boundingRect(points)
+        margin = self.crop_margin
+        return (
+            max(0, x - margin),
+            max(0, y - margin),
+            min(gray.shape[1], x + w + margin),
+            min(gray.shape[0], y + h + margin)
+        )
+
+
+def get_image_preprocessor(app=None):
+    """Return the configured preprocessor, or None when pre-processing is disabled"""
+    from flask import current_app
+
+    app = app or current_app._get_current_object()
+    if not app.config.get('ANALYSIS_IMAGE_PREPROCESS', True):
+        return None
+    return ImagePreprocessor.from_config(app.config)
@@ -0,0 +1,227 @@
+# services/pdf_rasterizer.py - Render PDF floor plans to cached page images
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+from typing import Dict, Any, List, Optional
+
+from flask import current_app
+
+from services.analysis_cache import AnalysisCache
+
+logger = logging.getLogger(__name__)
+
+PDF_MAGIC = b'%PDF-'
+
+
+def is_pdf(path: str) -> bool:
+    """True for PDF files, judged by content rather than the (user supplied) extension"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(1024).lstrip().startswith(PDF_MAGIC)
+    except OSError:
+        return False
+
+
+class PdfRasterizer:
+    """Renders each page of a PDF floor plan to a PNG once and caches the rasters.
+
+    Pages are rendered with pypdfium2 (an optional dependency, imported on first use) at
+    ``dpi``, scaled down further so the long edge never exceeds ``max_edge`` pixels.
+    Entries live under ``<cache_dir>/<hash[:2]>/<file hash>-<settings>/page_NNNN.png``
+    with a ``manifest.json`` written last, so a half-rendered entry is never served and a
+    re-analysis of the same PDF (in any project) reuses the pages without re-rendering.
+    """
+
+    def __init__(self, cache_dir: str, dpi: int = 200, max_edge: int = 4096, max_pages: int = 20,
+                 max_entries: int = 500):
+        self.cache_dir = cache_dir
+        self.dpi = dpi
+        self.max_edge = max_edge
+        self.max_pages = max_pages
+        self.max_entries = max_entries
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.renders = 0
+        self.pages_rendered = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @property
+    def signature(self) -> str:
+        """Identifies the settings that change the rendered pages"""
+        return f"{self.dpi}dpi-{self.max_edge}px"
+
+    def _entry_dir(self, file_hash: str) -> str:
+        return os.path.join(self.cache_dir, file_hash[:2], f"{file_hash}-{self.signature}")
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def rasterize(self, pdf_path: str) -> List[str]:
+        """Paths of the rendered page images, rendering them only on a cache miss"""
+        file_hash = AnalysisCache.hash_file(pdf_path)
+        entry_dir = self._entry_dir(file_hash)
+
+        # Concurrent jobs for the same PDF wait for one render instead of duplicating it
+        with self._key_lock(entry_dir):
+            manifest = self._read_manifest(entry_dir)
+            if manifest:
+                self._count('hits')
+                try:
+                    os.utime(entry_dir, None)  # LRU touch
+                except OSError:
+                    pass
+                return [os.path.join(entry_dir, page['file']) for page in manifest['pages']]
+
+            manifest = self._render(pdf_path, entry_dir, file_hash)
+            self._evict()
+            return [os.path.join(entry_dir, page['file']) for page in manifest['pages']]
+
+    def _read_manifest(self, entry_dir: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(entry_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if not all(os.path.isfile(os.path.join(entry_dir, page['file'])) for page in manifest.get('pages', [])):
+            return None
+        return manifest
+
+    def _render(self, pdf_path: str, entry_dir: str, file_hash: str) -> Dict[str, Any]:
+        try:
+            import pypdfium2 as pdfium
+        except ImportError:
+            raise RuntimeError('PDF floor plans need the pypdfium2 package (pip install pypdfium2)')
+
+        started = time.perf_counter()
+        tmp_dir = f"{entry_dir}.{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        pages = []
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            page_count = len(pdf)
+            if page_count == 0:
+                raise ValueError('PDF has no pages')
+            if page_count > self.max_pages:
+                self.logger.warning(f"⚠️ {os.path.basename(pdf_path)} has {page_count} pages, rendering the first {self.max_pages}")
+
+            for index in range(min(page_count, self.max_pages)):
+                page = pdf[index]
+                try:
+                    # Sizes are in PDF points (1/72 inch); cap the scale so huge sheets stay bounded
+                    width, height = page.get_size()
+                    scale = min(self.dpi / 72, self.max_edge / max(width, height, 1))
+                    image = page.render(scale=scale, grayscale=True).to_pil()
+                finally:
+                    page.close()
+
+                filename = f"page_{index + 1:04d}.png"
+                image.save(os.path.join(tmp_dir, filename), format='PNG', optimize=True)
+                pages.append({'page': index + 1, 'file': filename, 'size': list(image.size)})
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        finally:
+            pdf.close()
+
+        manifest = {
+            'file_hash': file_hash,
+            'source_pages': page_count,
+            'dpi': self.dpi,
+            'max_edge': self.max_edge,
+            'rendered_at': time.time(),
+            'render_ms': round((time.perf_counter() - started) * 1000, 2),
+            'pages': pages
+        }
+        with open(os.path.join(tmp_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+
+        shutil.rmtree(entry_dir, ignore_errors=True)  # a stale, incomplete entry
+        os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+        try:
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            # Another worker process finished the same PDF first; keep its pages
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            existing = self._read_manifest(entry_dir)
+            if not existing:
+                raise
+            return existing
+
+        self._count('renders')
+        self._count('pages_rendered', len(pages))
+        self.logger.info(f"📄 Rendered {len(pages)} PDF page(s) of {os.path.basename(pdf_path)} in {manifest['render_ms']:.0f}ms")
+        return manifest
+
+    def _evict(self):
+        """Drop the least recently used entries above max_entries"""
+        entries = []
+        for shard in os.listdir(self.cache_dir):
+            shard_dir = os.path.join(self.cache_dir, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                path = os.path.join(shard_dir, name)
+                if name.endswith('.tmp') or not os.path.isdir(path):
+                    continue
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except OSError:
+                    continue
+
+        overflow = len(entries) - self.max_entries
+        if overflow > 0:
+            entries.sort()
+            for _, path in entries[:overflow]:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'renders': self.renders,
+                'pages_rendered': self.pages_rendered,
+                'dpi': self.dpi,
+                'max_edge': self.max_edge,
+                'cache_dir': self.cache_dir
+            }
+
+
+def get_pdf_rasterizer(app=None) -> PdfRasterizer:
+    """Return the process-wide PDF rasterizer for the app"""
+    app = app or current_app._get_current_object()
+    rasterizer = app.extensions.get('pdf_rasterizer')
+    if rasterizer is None:
+        rasterizer = PdfRasterizer(
+            cache_dir=app.config['ANALYSIS_PDF_CACHE_DIR'],
+            dpi=app.config.get('ANALYSIS_PDF_DPI', 200),
+            max_edge=app.config.get('ANALYSIS_PDF_MAX_EDGE', 4096),
+            max_pages=app.config.get('ANALYSIS_PDF_MAX_PAGES', 20),
+            max_entries=app.config.get('ANALYSIS_PDF_CACHE_MAX_ENTRIES', 500)
+        )
+        app.extensions['pdf_rasterizer'] = rasterizer
+    return rasterizer
+
+
+def expand_floor_plan_pages(image_paths: List[str], rasterizer: Optional[PdfRasterizer] = None) -> List[str]:
+    """The uploaded floor plans as analyzable images: each PDF becomes its rendered pages"""
+    expanded = []
+    for path in image_paths:
+        if is_pdf(path):
+            rasterizer = rasterizer or get_pdf_rasterizer()
+            expanded.extend(rasterizer.rasterize(path))
+        else:
+            expanded.append(path)
+    return expanded
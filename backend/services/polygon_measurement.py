@@ -0,0 +1,178 @@
+# services/polygon_measurement.py - Measure hand-drawn room polygons in one vectorised pass
+import logging
+from itertools import chain
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TREATMENTS = {
+    'sanding_filling': False,
+    'priming': False,
+    'one_coat': False,
+    'two_coats': False
+}
+
+
+def pixels_per_metre_from_scale(scale: Dict[str, Any]) -> float:
+    """Scale from ``{'points': [[x1, y1], [x2, y2]], 'length_m': L}`` (a reference line of
+    known length drawn on the plan) or an explicit ``{'pixels_per_metre': N}``"""
+    if not isinstance(scale, dict):
+        raise ValueError('scale is required')
+
+    if scale.get('pixels_per_metre') is not None:
+        ppm = float(scale['pixels_per_metre'])
+    else:
+        points = scale.get('points') or []
+        length_m = float(scale.get('length_m') or 0)
+        if len(points) != 2 or length_m <= 0:
+            raise ValueError('scale needs two reference points and a positive length_m')
+        (x1, y1), (x2, y2) = [(float(x), float(y)) for x, y in points]
+        ppm = ((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5 / length_m
+
+    if not ppm > 0:
+        raise ValueError('scale must be a positive number of pixels per metre')
+    return ppm
+
+
+def _opening_area(openings) -> float:
+    """Total m² of doors/windows: a number, or a list of ``{width_m, height_m, count}``"""
+    if not openings:
+        return 0.0
+    if isinstance(openings, (int, float)):
+        return max(float(openings), 0.0)
+    return sum(
+        max(float(opening.get('width_m', 0)), 0.0) * max(float(opening.get('height_m', 0)), 0.0)
+        * max(int(opening.get('count', 1)), 0)
+        for opening in openings
+    )
+
+
+def measure_polygons(polygons: List[List[Tuple[float, float]]], pixels_per_metre: float, wall_height: float,
+                     opening_areas: Optional[List[float]] = None, wall_heights: Optional[List[Optional[float]]] = None):
+    """Areas (m²), perimeters (m) and wall surfaces (m²) for all polygons at once.
+
+    Every vertex of every polygon goes into one flat array tagged with its polygon index;
+    each vertex's successor wraps to its own polygon's first vertex. The shoelace cross
+    products and edge lengths are then summed per polygon with ``bincount``, so the cost
+    is a handful of NumPy passes however many rooms there are.
+    """
+    import numpy as np
+
+    counts = np.fromiter((len(polygon) for polygon in polygons), dtype=np.int64, count=len(polygons))
+    if counts.size and counts.min() < 3:
+        raise ValueError(f'room {int(np.argmin(counts)) + 1} needs at least 3 points')
+
+    # fromiter over the flattened coordinates avoids building an intermediate list of pairs
+    coordinates = chain.from_iterable(chain.from_iterable(polygons))
+    points = np.fromiter(coordinates, dtype=np.float64, count=int(counts.sum()) * 2).reshape(-1, 2)
+    if not np.isfinite(points).all():
+        raise ValueError('polygon points must be finite numbers')
+
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    owner = np.repeat(np.arange(len(polygons)), counts)
+    successor = np.arange(len(points)) + 1
+    successor[starts + counts - 1] = starts
+
+    x, y = points[:, 0], points[:, 1]
+    x_next, y_next = x[successor], y[successor]
+
+    cross = x * y_next - x_next * y
+    areas_px = np.abs(np.bincount(owner, weights=cross, minlength=len(polygons))) / 2
+    perimeters_px = np.bincount(owner, weights=np.hypot(x_next - x, y_next - y), minlength=len(polygons))
+
+    areas_m2 = areas_px / pixels_per_metre ** 2
+    perimeters_m = perimeters_px / pixels_per_metre
+
+    heights = np.full(len(polygons), float(wall_height))
+    if wall_heights is not None:
+        overrides = np.array([np.nan if h is None else float(h) for h in wall_heights], dtype=np.float64)
+        heights = np.where(np.isnan(overrides), heights, overrides)
+
+    openings = np.zeros(len(polygons)) if opening_areas is None else np.asarray(opening_areas, dtype=np.float64)
+    walls_m2 = np.maximum(perimeters_m * heights - openings, 0.0)
+    return areas_m2, perimeters_m, walls_m2, openings
+
+
+def measure_rooms(rooms: List[Dict[str, Any]], scale: Dict[str, Any], wall_height: float) -> Dict[str, Any]:
+    """Measure a batch of room polygons drawn on the plan image.
+
+    Each room is ``{'name', 'type', 'points': [[x, y], ...], 'openings': ..., 'wall_height'?,
+    'floor'?}`` with points in image pixels. Returns rooms in the structured measurement
+    format (with their polygons kept for re-editing) plus totals and the scale used.
+    """
+    if not rooms:
+        raise ValueError('at least one room polygon is required')
+
+    ppm = pixels_per_metre_from_scale(scale)
+    polygons = []
+    for index, room in enumerate(rooms, start=1):
+        points = room.get('points')
+        if not isinstance(points, list) or not all(isinstance(point, (list, tuple)) and len(point) == 2 for point in points):
+            raise ValueError(f'room {index} points must be a list of [x, y] pairs')
+        polygons.append(points)
+
+    areas_m2, perimeters_m, walls_m2, openings_m2 = measure_polygons(
+        polygons, ppm, wall_height,
+        opening_areas=[_opening_area(room.get('openings')) for room in rooms],
+        wall_heights=[room.get('wall_height') for room in rooms]
+    )
+
+    measured = []
+    for index, room in enumerate(rooms):
+        entry = {
+            'id': index + 1,
+            'name': room.get('name') or f'Room {index + 1}',
+            'type': room.get('type') or 'general',
+            'walls_surface_m2': round(float(walls_m2[index]), 2),
+            'area_m2': round(float(areas_m2[index]), 2),
+            'perimeter_m': round(float(perimeters_m[index]), 2),
+            'openings_m2': round(float(openings_m2[index]), 2),
+            'polygon': [[float(x), float(y)] for x, y in room['points']],
+            'wall_treatments': dict(room.get('wall_treatments') or DEFAULT_TREATMENTS),
+            'ceiling_treatments': dict(room.get('ceiling_treatments') or DEFAULT_TREATMENTS)
+        }
+        for key in ('floor', 'floor_index', 'openings', 'wall_height'):
+            if room.get(key) is not None:
+                entry[key] = room[key]
+        measured.append(entry)
+
+    logger.info(f"📏 Measured {len(measured)} room polygons at {ppm:.2f} px/m")
+    return {
+        'rooms': measured,
+        'scale': {'pixels_per_metre': round(ppm, 4), 'source': 'reference_line' if 'points' in scale else 'manual'},
+        'wall_height': wall_height,
+        'totals': {
+            'area_m2': round(float(areas_m2.sum()), 2),
+            'walls_surface_m2': round(float(walls_m2.sum()), 2),
+            'openings_m2': round(float(openings_m2.sum()), 2)
+        }
+    }
+
+
+def merge_into_measurements(existing: Optional[Dict[str, Any]], result: Dict[str, Any], replace: bool) -> Dict[str, Any]:
+    """Manual measurements with the measured rooms added (or replacing all rooms).
+
+    Treatment selections already made for a room with the same name and floor are kept.
+    """
+    measurements = dict(existing or {})
+    previous = {(room.get('floor'), room.get('name')): room for room in measurements.get('rooms', [])}
+
+    measured = {(room.get('floor'), room.get('name')) for room in result['rooms']}
+    rooms = [] if replace else [room for room in measurements.get('rooms', [])
+                                if (room.get('floor'), room.get('name')) not in measured]
+    for room in result['rooms']:
+        room = dict(room)
+        old = previous.get((room.get('floor'), room.get('name')))
+        if old:
+            for key in ('wall_treatments', 'ceiling_treatments'):
+                if old.get(key) and room[key] == DEFAULT_TREATMENTS:
+                    room[key] = old[key]
+        rooms.append(room)
+
+    for index, room in enumerate(rooms, start=1):
+        room['id'] = index
+
+    measurements['rooms'] = rooms
+    measurements['polygon_scale'] = result['scale']
+    measurements.setdefault('notes', 'Measured from room outlines drawn on the floor plan')
+    return measurements
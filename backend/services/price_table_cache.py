@@ -0,0 +1,162 @@
+# services/price_table_cache.py - Compiled, cached per-company price tables
+import time
+import logging
+import threading
+from types import MappingProxyType
+from typing import Dict, Any, NamedTuple
+
+from flask import current_app
+
+from services.pricing_engine import DEFAULT_PRICES, price_vector
+
+logger = logging.getLogger(__name__)
+
+# Quote price keys and the PricingSettings columns they are read from, in order; the
+# first non-empty column wins, as in get_wall_treatment_price/get_ceiling_treatment_price
+PRICE_COLUMNS = {
+    'wall_sanding_price': ('wall_sanding_filling', 'wall_sanding_light'),
+    'wall_priming_price': ('wall_priming', 'wall_priming_one_coat'),
+    'wall_one_coat_price': ('wall_one_coat', 'wall_painting_one_coat'),
+    'wall_two_coats_price': ('wall_two_coats', 'wall_painting_two_coat'),
+    'ceiling_prep_price': ('ceiling_sanding_filling', 'ceiling_preparation_light'),
+    'ceiling_priming_price': ('ceiling_priming', 'ceiling_preparation_light'),
+    'ceiling_one_coat_price': ('ceiling_one_coat', 'ceiling_painting_one_coat'),
+    'ceiling_two_coats_price': ('ceiling_two_coats', 'ceiling_painting_two_coat'),
+    'cleanup_fee': ('cleanup_fee',)
+}
+
+
+class PriceTable(NamedTuple):
+    """A company's prices flattened once; read-only and safe to share between requests"""
+    company_id: int
+    version: str
+    quote_prices: MappingProxyType  # DEFAULT_PRICES keys, what the quote engine consumes
+    columns: MappingProxyType       # every PricingSettings price column
+    vector: Any                     # quote prices aligned with pricing_engine.COLUMNS (read-only)
+    compiled_at: float
+
+
+def settings_version(settings) -> str:
+    """Version stamp of a PricingSettings row (a reset creates a new row, so the id is part of it)"""
+    if settings is None:
+        return 'defaults'
+    updated_at = settings.updated_at.isoformat() if settings.updated_at else ''
+    return f"{settings.id}:{updated_at}"
+
+
+def compile_price_table(company_id: int, settings=None) -> PriceTable:
+    """Flatten a PricingSettings row (or the column defaults when there is none)"""
+    from sqlalchemy import Float
+    from models.pricing import PricingSettings
+
+    columns = {}
+    for column in PricingSettings.__table__.columns:
+        if not isinstance(column.type, Float):
+            continue
+        value = getattr(settings, column.name, None) if settings is not None else None
+        if value is None and column.default is not None and not callable(column.default.arg):
+            value = column.default.arg
+        columns[column.name] = float(value) if value is not None else None
+
+    quote_prices = {}
+    for key, names in PRICE_COLUMNS.items():
+        quote_prices[key] = next((columns[name] for name in names if columns.get(name)), DEFAULT_PRICES[key])
+
+    vector = price_vector(quote_prices)
+    vector.setflags(write=False)
+    return PriceTable(
+        company_id=company_id,
+        version=settings_version(settings),
+        quote_prices=MappingProxyType(quote_prices),
+        columns=MappingProxyType(columns),
+        vector=vector,
+        compiled_at=time.time()
+    )
+
+
+class PriceTableCache:
+    """Per-process cache of compiled price tables keyed by company.
+
+    The settings routes invalidate a company's entry when they commit. Entries are also
+    revalidated against the row's version stamp (id + ``updated_at``, one small query)
+    once they are older than ``revalidate_seconds``, so a change committed by another
+    worker process is picked up; 0 revalidates on every lookup.
+    """
+
+    def __init__(self, revalidate_seconds: float = 0, max_entries: int = 10000):
+        self.revalidate_seconds = revalidate_seconds
+        self.max_entries = max_entries
+        self._tables: Dict[int, list] = {}  # company_id -> [PriceTable, last checked (monotonic)]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.invalidations = 0
+
+    def get(self, company_id: int) -> PriceTable:
+        from models import db
+        from models.pricing import PricingSettings
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._tables.get(company_id)
+            if entry and self.revalidate_seconds and now - entry[1] < self.revalidate_seconds:
+                self.hits += 1
+                return entry[0]
+
+        row = db.session.query(PricingSettings.id, PricingSettings.updated_at) \
+            .filter_by(company_id=company_id).first()
+        version = settings_version(row)
+        if entry and entry[0].version == version:
+            with self._lock:
+                self.hits += 1
+                self.revalidations += 1
+                entry[1] = now
+            return entry[0]
+
+        settings = PricingSettings.query.filter_by(company_id=company_id).first() if row else None
+        table = compile_price_table(company_id, settings)
+        with self._lock:
+            self.misses += 1
+            if len(self._tables) >= self.max_entries and company_id not in self._tables:
+                self._tables.pop(next(iter(self._tables)))
+            self._tables[company_id] = [table, now]
+        logger.info(f"💶 Compiled price table for company {company_id} (version {table.version})")
+        return table
+
+    def invalidate(self, company_id: int):
+        with self._lock:
+            if self._tables.pop(company_id, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._tables),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'revalidations': self.revalidations,
+                'invalidations': self.invalidations,
+                'revalidate_seconds': self.revalidate_seconds
+            }
+
+
+def get_price_table_cache(app=None) -> PriceTableCache:
+    """Return the process-wide price table cache for the app"""
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get('price_tables')
+    if cache is None:
+        cache = PriceTableCache(revalidate_seconds=app.config.get('PRICE_TABLE_REVALIDATE_SECONDS', 0))
+        app.extensions['price_tables'] = cache
+    return cache
+
+
+def company_price_table(company_id: int) -> PriceTable:
+    return get_price_table_cache().get(company_id)
+
+
+def invalidate_company_prices(company_id: int):
+    """Drop a company's compiled prices after its PricingSettings were committed"""
+    get_price_table_cache().invalidate(company_id)
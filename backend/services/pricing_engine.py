@@ -0,0 +1,254 @@
+# services/pricing_engine.py - Price quote line items for rooms x treatments in one vectorised pass
+import math
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TREATMENTS = ('sanding_filling', 'priming', 'one_coat', 'two_coats')
+SURFACES = ('walls', 'ceiling')
+
+# Columns of the treatment mask and price vector: every surface x treatment, walls first
+COLUMNS = tuple((surface, treatment) for surface in SURFACES for treatment in TREATMENTS)
+
+# Request/price table key for each column
+PRICE_KEYS = (
+    'wall_sanding_price', 'wall_priming_price', 'wall_one_coat_price', 'wall_two_coats_price',
+    'ceiling_prep_price', 'ceiling_priming_price', 'ceiling_one_coat_price', 'ceiling_two_coats_price'
+)
+
+DEFAULT_PRICES = {
+    'wall_sanding_price': 5.00,
+    'wall_priming_price': 4.50,
+    'wall_one_coat_price': 6.00,
+    'wall_two_coats_price': 9.50,
+    'ceiling_prep_price': 4.00,
+    'ceiling_priming_price': 5.50,
+    'ceiling_one_coat_price': 5.50,
+    'ceiling_two_coats_price': 8.50,
+    'cleanup_fee': 150.00
+}
+
+SURFACE_LABELS = {'walls': 'Walls', 'ceiling': 'Ceiling'}
+TREATMENT_LABELS = {
+    'sanding_filling': 'Sanding & Filling',
+    'priming': 'Priming',
+    'one_coat': 'Painting (1 Coat)',
+    'two_coats': 'Painting (2 Coats)'
+}
+
+
+def parse_price(value, default: float, key: str = 'price') -> float:
+    """A price from a number, a numeric string or a nested dict like ``{'one_coat': {'price': 6}}``"""
+    try:
+        if isinstance(value, (int, float)):
+            return float(value)
+        if isinstance(value, str):
+            return float(value)
+        if isinstance(value, dict):
+            for price_key in ('price', 'value', 'amount', 'cost'):
+                if price_key in value:
+                    return float(value[price_key])
+            for option in ('one_coat', 'single', 'basic', 'standard', 'default'):
+                if isinstance(value.get(option), dict) and 'price' in value[option]:
+                    return float(value[option]['price'])
+            # Otherwise the first price found
+            for nested in value.values():
+                if isinstance(nested, dict) and 'price' in nested:
+                    return float(nested['price'])
+                if isinstance(nested, (int, float)):
+                    return float(nested)
+            logger.warning(f"⚠️ Price {key} is dict but no price field found: {value}")
+            return float(default)
+        if value is not None:
+            logger.warning(f"⚠️ Price {key} has unexpected type {type(value)}: {value}")
+        return float(default)
+    except (ValueError, TypeError) as e:
+        logger.error(f"❌ Error parsing price {key}: {e}")
+        return float(default)
+
+
+def pricing_from_request(data: Dict[str, Any], defaults: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """The flat price table for a quote request, falling back to ``defaults`` per key"""
+    defaults = defaults or DEFAULT_PRICES
+    return {key: parse_price(data.get(key, defaults[key]), defaults[key], key) for key in DEFAULT_PRICES}
+
+
+def price_vector(pricing: Dict[str, float]):
+    """Prices aligned with COLUMNS"""
+    import numpy as np
+
+    return np.array([pricing[key] for key in PRICE_KEYS], dtype=np.float64)
+
+
+def room_areas(room: Dict[str, Any]) -> Tuple[float, float]:
+    """Wall and ceiling m² of a room, accepting the older total_* field names"""
+    walls = float(room.get('walls_surface_m2', 0) or room.get('total_wall_area', 0))
+    ceiling = float(room.get('area_m2', 0) or room.get('total_ceiling_area', 0))
+    return walls, ceiling
+
+
+def room_mask(room: Dict[str, Any]) -> Tuple[bool, ...]:
+    """Selected treatments aligned with COLUMNS (only a literal True selects one)"""
+    walls = (room.get('wall_treatments') or {}).get
+    ceiling = (room.get('ceiling_treatments') or {}).get
+    # Unrolled: this runs once per room and dominates compiling large quotes
+    return (walls('sanding_filling') is True, walls('priming') is True,
+            walls('one_coat') is True, walls('two_coats') is True,
+            ceiling('sanding_filling') is True, ceiling('priming') is True,
+            ceiling('one_coat') is True, ceiling('two_coats') is True)
+
+
+def compile_rooms(rooms: List[Dict[str, Any]], skip_empty: bool = True):
+    """Names, areas ``(n, 2)`` and treatment mask ``(n, 8)`` of the rooms that have a measured
+    surface (of every room with ``skip_empty=False``; empty ones then price to zero)"""
+    import numpy as np
+
+    names, areas, flags = [], [], []
+    for room in rooms:
+        walls, ceiling = room_areas(room)
+        if skip_empty and walls <= 0 and ceiling <= 0:
+            continue
+        names.append(room.get('name', 'Unknown Room'))
+        areas += (walls, ceiling)
+        flags += room_mask(room)
+
+    areas = np.array(areas, dtype=np.float64).reshape(-1, len(SURFACES))
+    mask = np.array(flags, dtype=bool).reshape(-1, len(COLUMNS))
+    return names, areas, mask
+
+
+def price_rooms(areas, mask, prices):
+    """Quantities and totals ``(n, 8)`` for every room x surface x treatment.
+
+    Each room's wall and ceiling areas are broadcast across their four treatments,
+    masked by the selections (and by the surface having any area), then multiplied by
+    the price vector, so the whole quote is three array operations whatever its size.
+    """
+    import numpy as np
+
+    per_column = np.repeat(areas, len(TREATMENTS), axis=1)
+    selected = mask & (per_column > 0)
+    quantities = np.where(selected, per_column, 0.0)
+    return quantities, quantities * prices, selected
+
+
+def room_line_items(names: List[str], quantities, totals, selected, prices) -> List[Dict[str, Any]]:
+    """Line item dicts for the selected cells, in room order then walls before ceiling"""
+    rows, cols = selected.nonzero()
+    columns = [(f' - {SURFACE_LABELS[surface]} - {TREATMENT_LABELS[treatment]}', surface, treatment, price)
+               for (surface, treatment), price in zip(COLUMNS, prices.tolist())]
+    items = []
+    for row, col, quantity, total in zip(rows.tolist(), cols.tolist(),
+                                         quantities[rows, cols].tolist(), totals[rows, cols].tolist()):
+        suffix, surface, treatment, price = columns[col]
+        name = names[row]
+        items.append({
+            'description': f'{name}{suffix}',
+            'quantity': quantity,
+            'unit': 'm²',
+            'unit_price': price,
+            'total': total,
+            'category': 'room_work',
+            'room': name,
+            'surface': surface,
+            'treatment': treatment
+        })
+    return items
+
+
+def item_line_items(items_by_type: Dict[str, Any], category: str) -> List[Dict[str, Any]]:
+    """Interior or exterior items, each ``{'quantity', 'unit_price', 'description'?, 'location'?, 'notes'?}``"""
+    label = category.title()
+    line_items = []
+    for item_type, items in (items_by_type or {}).items():
+        if not isinstance(items, list):
+            continue
+        for item in items:
+            try:
+                quantity = float(item.get('quantity', 0))
+                unit_price = float(item.get('unit_price', 0))
+            except (ValueError, TypeError) as e:
+                logger.error(f"❌ Error processing {category} item {item_type}: {e}")
+                continue
+            if quantity <= 0 or unit_price <= 0:
+                continue
+
+            unit = 'm' if category == 'exterior' and item_type in ('fasciaBoards', 'rainPipe') else 'piece'
+            line_items.append({
+                'description': f"{label} - {item.get('description', item_type.replace('_', ' ').title())}",
+                'quantity': quantity,
+                'unit': unit,
+                'unit_price': unit_price,
+                'total': quantity * unit_price,
+                'category': category,
+                'item_type': item_type,
+                'specifications': {
+                    'type': item_type,
+                    'location': item.get('location', ''),
+                    'notes': item.get('notes', '')
+                }
+            })
+    return line_items
+
+
+def special_job_line_items(jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    line_items = []
+    for job in jobs or []:
+        try:
+            quantity = float(job.get('quantity', 0))
+            unit_price = float(job.get('unit_price', 0))
+        except (ValueError, TypeError) as e:
+            logger.error(f"❌ Error processing special job: {e}")
+            continue
+        if quantity <= 0 or unit_price <= 0:
+            continue
+
+        name = job.get('name', 'Custom Work')
+        description = job.get('description', '')
+        line_items.append({
+            'description': f"Special Job - {name}" + (f" ({description})" if description else ''),
+            'quantity': quantity,
+            'unit': job.get('unit', 'job'),
+            'unit_price': unit_price,
+            'total': quantity * unit_price,
+            'category': 'special',
+            'specifications': {
+                'job_type': job.get('type', 'custom'),
+                'name': name,
+                'description': description,
+                'notes': job.get('notes', '')
+            }
+        })
+    return line_items
+
+
+def quote_totals(subtotal: float, vat_rate: float) -> Dict[str, float]:
+    vat_amount = subtotal * vat_rate
+    return {'subtotal': subtotal, 'vat_amount': vat_amount, 'total_amount': subtotal + vat_amount}
+
+
+def price_quote(measurement_details: Dict[str, Any], pricing: Dict[str, float], vat_rate: float) -> Dict[str, Any]:
+    """Line items and totals for a quote's measurement details.
+
+    Rooms are priced in one vectorised pass (see ``price_rooms``); interior, exterior and
+    special items carry their own unit prices. Returns ``line_items``, ``subtotal``,
+    ``vat_amount``, ``total_amount`` and ``room_totals`` (per room, in line item order).
+    """
+    measurement_details = measurement_details or {}
+    prices = price_vector(pricing)
+    names, areas, mask = compile_rooms(measurement_details.get('rooms') or [])
+    quantities, totals, selected = price_rooms(areas, mask, prices)
+
+    extras = (item_line_items(measurement_details.get('interior_items'), 'interior')
+              + item_line_items(measurement_details.get('exterior_items'), 'exterior')
+              + special_job_line_items(measurement_details.get('special_jobs')))
+    line_items = room_line_items(names, quantities, totals, selected, prices) + extras
+
+    room_totals = totals.sum(axis=1)
+    result = quote_totals(float(room_totals.sum()) + math.fsum(item['total'] for item in extras), vat_rate)
+    result.update({
+        'line_items': line_items,
+        'room_totals': [{'room': name, 'total': total} for name, total in zip(names, room_totals.tolist())]
+    })
+    return result
@@ -0,0 +1,118 @@
+# services/quote_batch.py - Render batches of quote PDFs in parallel worker processes
+import os
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, List, Optional, Tuple
+
+from flask import current_app
+
+from services.quote_generator import render_quote_pdf
+
+logger = logging.getLogger(__name__)
+
+
+def _timed_render(html_content: str, pdf_path: str) -> Tuple[str, float]:
+    started = time.perf_counter()
+    render_quote_pdf(html_content, pdf_path)
+    return pdf_path, round((time.perf_counter() - started) * 1000, 2)
+
+
+def pdf_workers(app=None) -> int:
+    app = app or current_app._get_current_object()
+    return max(1, int(app.config.get('QUOTE_PDF_WORKERS') or os.cpu_count() or 1))
+
+
+def get_pdf_pool(app=None) -> Optional[ProcessPoolExecutor]:
+    """The process-wide PDF rendering pool, or None when rendering runs in the request process.
+
+    WeasyPrint layout is CPU-bound Python, so threads would serialise on the GIL. Workers
+    are spawned (not forked) so they never inherit the web process's threads, locks or
+    database connections, and are kept for later batches.
+    """
+    app = app or current_app._get_current_object()
+    workers = pdf_workers(app)
+    if workers <= 1:
+        return None
+    pool = app.extensions.get('quote_pdf_pool')
+    if pool is None:
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        app.extensions['quote_pdf_pool'] = pool
+        logger.info(f"🖨️ Started quote PDF pool with {workers} worker processes")
+    return pool
+
+
+def _reset_pool(app, terminate: bool = False):
+    """Drop the pool so the next batch starts a fresh one; ``terminate`` kills its workers too.
+
+    ``shutdown`` alone leaves a worker stuck in a render running (and holding its slot) forever.
+    """
+    pool = app.extensions.pop('quote_pdf_pool', None)
+    if pool is None:
+        return
+    terminate_workers = getattr(pool, 'terminate_workers', None)  # Python 3.14+
+    if terminate and terminate_workers:
+        terminate_workers()
+        return
+    # shutdown() forgets the worker processes, so take them first
+    processes = list((getattr(pool, '_processes', None) or {}).values()) if terminate else []
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+
+
+def render_pdfs(jobs: List[Tuple[Any, str, str]], app=None) -> Dict[Any, Dict[str, Any]]:
+    """Render ``(key, html, pdf_path)`` jobs, in parallel when a pool is configured.
+
+    Returns ``{key: {'pdf_path': path or None, 'error': message or None, 'render_ms'}}``;
+    a failed render never fails the others.
+    """
+    app = app or current_app._get_current_object()
+    timeout = app.config.get('QUOTE_PDF_TIMEOUT', 120)
+    results: Dict[Any, Dict[str, Any]] = {}
+    pending = list(jobs)
+
+    pool = get_pdf_pool(app) if len(jobs) > 1 else None
+    if pool is not None:
+        try:
+            futures = {pool.submit(_timed_render, html, path): key for key, html, path in jobs}
+        except (BrokenProcessPool, RuntimeError) as e:
+            logger.warning(f"⚠️ Quote PDF pool unavailable ({e}), rendering in-process")
+            _reset_pool(app)
+            futures = {}
+
+        done, not_done = wait(futures, timeout=timeout * len(jobs) / pdf_workers(app) + timeout)
+        hung = False
+        for future in not_done:
+            # cancel() only stops renders that have not started; a running one is hung
+            hung = not future.cancel() or hung
+            results[futures[future]] = {'pdf_path': None, 'error': 'PDF rendering timed out', 'render_ms': None}
+        if hung:
+            logger.warning("⚠️ Quote PDF render timed out, replacing the PDF pool")
+            _reset_pool(app, terminate=True)
+        broken = False
+        for future in done:
+            key = futures[future]
+            try:
+                path, render_ms = future.result()
+                results[key] = {'pdf_path': path, 'error': None, 'render_ms': render_ms}
+            except BrokenProcessPool:
+                broken = True
+            except Exception as e:
+                results[key] = {'pdf_path': None, 'error': str(e), 'render_ms': None}
+        if broken:
+            # A worker died (e.g. out of memory); replace the pool and retry what it lost in-process
+            logger.warning("⚠️ Quote PDF pool broke, rendering the remaining PDFs in-process")
+            _reset_pool(app)
+        pending = [job for job in jobs if job[0] not in results]
+
+    for key, html, path in pending:
+        try:
+            path, render_ms = _timed_render(html, path)
+            results[key] = {'pdf_path': path, 'error': None, 'render_ms': render_ms}
+        except Exception as e:
+            results[key] = {'pdf_path': None, 'error': str(e), 'render_ms': None}
+    return results
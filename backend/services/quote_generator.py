@@ -3,7 +3,6 @@ import os
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
 import logging
-from weasyprint import HTML, CSS
 from jinja2 import Template
 import requests
 from io import BytesIO
@@ -13,6 +12,7 @@ class QuoteGenerator:
     
     def __init__(self):
         self.logger = logging.getLogger(__name__)
+        self._logos = {}  # logo URL -> bytes (or None), so a batch downloads each logo once
     
     def _download_company_logo(self, company):
         """Download and cache the company's specific logo image"""
@@ -27,6 +27,17 @@ class QuoteGenerator:
                 self.logger.info("Empty logo URL, proceeding without logo")
                 return None
             
+            if logo_url in self._logos:
+                return self._logos[logo_url]
+            self._logos[logo_url] = self._fetch_logo(logo_url)
+            return self._logos[logo_url]
+            
+        except Exception as e:
+            self.logger.warning(f"Unexpected error downloading company logo: {e}")
+            return None
+    
+    def _fetch_logo(self, logo_url: str):
+        try:
             self.logger.info(f"Downloading company logo from: {logo_url}")
             
             # Download the logo with proper headers and timeout
@@ -47,25 +58,33 @@ class QuoteGenerator:
             return response.content
             
         except requests.exceptions.RequestException as e:
-            self.logger.warning(f"Failed to download company logo from {company.logo_url if company else 'None'}: {e}")
+            self.logger.warning(f"Failed to download company logo from {logo_url}: {e}")
             return None
         except Exception as e:
             self.logger.warning(f"Unexpected error downloading company logo: {e}")
             return None
     
+    def _write_pdf(self, html_content: str, pdf_path: str):
+        """Render HTML to PDF; WeasyPrint (and its Pango bindings) is only loaded when a PDF is built"""
+        from weasyprint import HTML, CSS
+        
+        HTML(string=html_content).write_pdf(
+            pdf_path,
+            stylesheets=[CSS(string=self._get_professional_pdf_styles())]
+        )
+    
+    def prepare_quote_pdf(self, quote, project, company, output_dir: str):
+        """HTML and target path of a quote PDF, for rendering later (e.g. in a worker process)"""
+        os.makedirs(output_dir, exist_ok=True)
+        html_content = self._generate_professional_html_content(quote, project, company)
+        pdf_filename = f"quote_{quote.quote_number}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        return html_content, os.path.join(output_dir, pdf_filename)
+    
     def generate_enhanced_quote_pdf(self, quote, project, company, output_dir: str) -> str:
         """Generate a professional PDF quote with company-specific logo"""
         try:
-            os.makedirs(output_dir, exist_ok=True)
-            
-            html_content = self._generate_professional_html_content(quote, project, company)
-            pdf_filename = f"quote_{quote.quote_number}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-            pdf_path = os.path.join(output_dir, pdf_filename)
-            
-            HTML(string=html_content).write_pdf(
-                pdf_path,
-                stylesheets=[CSS(string=self._get_professional_pdf_styles())]
-            )
+            html_content, pdf_path = self.prepare_quote_pdf(quote, project, company, output_dir)
+            self._write_pdf(html_content, pdf_path)
             
             self.logger.info(f"✅ Professional quote PDF generated: {pdf_path}")
             return pdf_path
@@ -87,10 +106,7 @@ class QuoteGenerator:
             # Generate HTML content with signature info
             html_content = self._generate_signed_html_content(quote, signature, project, company)
             
-            HTML(string=html_content).write_pdf(
-                pdf_path,
-                stylesheets=[CSS(string=self._get_professional_pdf_styles())]
-            )
+            self._write_pdf(html_content, pdf_path)
             
             self.logger.info(f"✅ Signed quote PDF generated: {pdf_path}")
             return pdf_path
@@ -858,4 +874,10 @@ class QuoteGenerator:
                 page-break-inside: avoid;
             }
         }
-        """
\ No newline at end of file
+        """
+
+
+def render_quote_pdf(html_content: str, pdf_path: str) -> str:
+    """Render prepared quote HTML to ``pdf_path``; a plain function so process pools can run it"""
+    QuoteGenerator()._write_pdf(html_content, pdf_path)
+    return pdf_path
@@ -0,0 +1,217 @@
+# services/quote_preview.py - Side-effect-free quote previews with incremental room updates
+import time
+import uuid
+import math
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
+
+from flask import current_app
+
+from services.pricing_engine import (
+    TREATMENTS, SURFACES, compile_rooms, price_rooms, price_vector, room_line_items,
+    item_line_items, special_job_line_items, quote_totals
+)
+
+logger = logging.getLogger(__name__)
+
+ROOM_FIELDS = ('walls_surface_m2', 'area_m2', 'wall_treatments', 'ceiling_treatments')
+
+
+class PreviewExpired(LookupError):
+    """The preview token is unknown here (expired, evicted or issued by another worker)"""
+
+
+class QuotePreview(NamedTuple):
+    """Priced state of one preview; deltas build a new one and leave this one untouched"""
+    company_id: int
+    project_id: int
+    names: List[str]
+    areas: Any          # (n, 2) wall and ceiling m² per room, in request order
+    mask: Any           # (n, 8) selected treatments
+    room_totals: Any    # (n,) priced total per room
+    prices: Any         # price vector aligned with pricing_engine.COLUMNS
+    pricing: Dict[str, float]
+    extras: List[Dict[str, Any]]  # interior, exterior and special job line items
+    extras_total: float
+    vat_rate: float
+
+    def totals(self) -> Dict[str, float]:
+        result = quote_totals(float(self.room_totals.sum()) + self.extras_total, self.vat_rate)
+        return {key: round(value, 2) for key, value in result.items()}
+
+    def line_items(self, rows=None) -> List[Dict[str, Any]]:
+        """Line items of all rooms (then the extras), or only of ``rows``"""
+        import numpy as np
+
+        rows = np.arange(len(self.names)) if rows is None else np.asarray(rows, dtype=np.int64)
+        quantities, totals, selected = price_rooms(self.areas[rows], self.mask[rows], self.prices)
+        names = [self.names[row] for row in rows.tolist()]
+        return room_line_items(names, quantities, totals, selected, self.prices)
+
+
+def build_preview(company_id: int, project_id: int, measurement_details: Dict[str, Any],
+                  pricing: Dict[str, float], vat_rate: float) -> QuotePreview:
+    """Price a full set of measurement details.
+
+    Every room is kept (rooms without a measured surface simply price to zero) so room
+    indexes in later changes match the order the client sent.
+    """
+    measurement_details = measurement_details or {}
+    prices = price_vector(pricing)
+    names, areas, mask = compile_rooms(measurement_details.get('rooms') or [], skip_empty=False)
+    _, totals, _ = price_rooms(areas, mask, prices)
+
+    extras = (item_line_items(measurement_details.get('interior_items'), 'interior')
+              + item_line_items(measurement_details.get('exterior_items'), 'exterior')
+              + special_job_line_items(measurement_details.get('special_jobs')))
+    return QuotePreview(
+        company_id=company_id,
+        project_id=project_id,
+        names=names,
+        areas=areas,
+        mask=mask,
+        room_totals=totals.sum(axis=1),
+        prices=prices,
+        pricing=dict(pricing),
+        extras=extras,
+        extras_total=math.fsum(item['total'] for item in extras),
+        vat_rate=vat_rate
+    )
+
+
+def _room_index(change: Dict[str, Any], count: int) -> int:
+    index = change.get('room')
+    if not isinstance(index, int) or isinstance(index, bool) or not 0 <= index < count:
+        raise ValueError(f'room must be a room index between 0 and {count - 1}')
+    return index
+
+
+def apply_changes(preview: QuotePreview, changes: List[Dict[str, Any]]) -> Tuple[QuotePreview, List[int]]:
+    """A new preview with room changes applied, re-pricing only the changed rooms.
+
+    A change is ``{'room': index}`` plus any of ``surface``/``treatment``/``selected``
+    (toggle one treatment), ``walls_surface_m2``, ``area_m2``, and partial
+    ``wall_treatments``/``ceiling_treatments`` dicts.
+    """
+    if not isinstance(changes, list) or not changes:
+        raise ValueError('changes must be a non-empty list')
+
+    count = len(preview.names)
+    areas, mask = preview.areas, preview.mask.copy()
+    rows = []
+    for change in changes:
+        if not isinstance(change, dict):
+            raise ValueError('each change must be an object')
+        row = _room_index(change, count)
+
+        if 'treatment' in change:
+            surface, treatment = change.get('surface'), change['treatment']
+            if surface not in SURFACES or treatment not in TREATMENTS:
+                raise ValueError(f"surface must be one of {', '.join(SURFACES)} and treatment one of {', '.join(TREATMENTS)}")
+            mask[row, SURFACES.index(surface) * len(TREATMENTS) + TREATMENTS.index(treatment)] = change.get('selected') is True
+
+        for offset, key in ((0, 'wall_treatments'), (len(TREATMENTS), 'ceiling_treatments')):
+            selections = change.get(key)
+            if isinstance(selections, dict):
+                for treatment, selected in selections.items():
+                    if treatment in TREATMENTS:
+                        mask[row, offset + TREATMENTS.index(treatment)] = selected is True
+
+        for column, key in ((0, 'walls_surface_m2'), (1, 'area_m2')):
+            if key in change:
+                if areas is preview.areas:
+                    areas = areas.copy()
+                try:
+                    areas[row, column] = float(change[key] or 0)
+                except (TypeError, ValueError):
+                    raise ValueError(f'{key} must be a number')
+
+        if row not in rows:
+            rows.append(row)
+
+    _, totals, _ = price_rooms(areas[rows], mask[rows], preview.prices)
+    room_totals = preview.room_totals.copy()
+    room_totals[rows] = totals.sum(axis=1)
+    return preview._replace(areas=areas, mask=mask, room_totals=room_totals), rows
+
+
+class PreviewStore:
+    """Recent previews by token, in process memory (LRU, with a TTL)"""
+
+    def __init__(self, ttl_seconds: int = 1800, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._previews: "OrderedDict[str, Tuple[float, QuotePreview]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, preview: QuotePreview) -> str:
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._previews[token] = (time.monotonic(), preview)
+            while len(self._previews) > self.max_entries:
+                self._previews.popitem(last=False)
+        return token
+
+    def get(self, token: str, company_id: int, project_id: int) -> QuotePreview:
+        with self._lock:
+            stored = self._previews.get(token) if isinstance(token, str) else None
+            if stored and time.monotonic() - stored[0] > self.ttl_seconds:
+                del self._previews[token]
+                stored = None
+            if stored:
+                self._previews.move_to_end(token)
+        # Tokens are scoped to the project (and company) they were issued for
+        if not stored or stored[1].company_id != company_id or stored[1].project_id != project_id:
+            raise PreviewExpired('Preview expired; send the full measurement details again')
+        return stored[1]
+
+
+def get_preview_store(app=None) -> PreviewStore:
+    """Return the process-wide quote preview store for the app"""
+    app = app or current_app._get_current_object()
+    store = app.extensions.get('quote_previews')
+    if store is None:
+        store = PreviewStore(
+            ttl_seconds=app.config.get('QUOTE_PREVIEW_TTL_SECONDS', 1800),
+            max_entries=app.config.get('QUOTE_PREVIEW_MAX_ENTRIES', 1000)
+        )
+        app.extensions['quote_previews'] = store
+    return store
+
+
+def preview_quote(company_id: int, project_id: int, data: Dict[str, Any], pricing: Optional[Dict[str, float]],
+                  vat_rate: float) -> Dict[str, Any]:
+    """Full preview, or a delta on ``data['preview_token']`` when ``data['changes']`` is given.
+
+    Full previews return every line item; deltas return only the changed rooms' line items
+    (all of them with ``include_line_items``). Both return the totals and a new token.
+    """
+    started = time.perf_counter()
+    store = get_preview_store()
+
+    if data.get('preview_token'):
+        preview, rows = apply_changes(store.get(data['preview_token'], company_id, project_id), data.get('changes'))
+        result = {
+            'changed_rooms': [
+                {'index': row, 'name': preview.names[row], 'total': float(preview.room_totals[row]),
+                 'line_items': preview.line_items([row])}
+                for row in rows
+            ]
+        }
+        if data.get('include_line_items'):
+            result['line_items'] = preview.line_items() + preview.extras
+    else:
+        preview = build_preview(company_id, project_id, data.get('measurement_details'), pricing, vat_rate)
+        result = {
+            'line_items': preview.line_items() + preview.extras,
+            'room_totals': [{'index': index, 'name': name, 'total': total}
+                            for index, (name, total) in enumerate(zip(preview.names, preview.room_totals.tolist()))],
+            'pricing_used': preview.pricing
+        }
+
+    result.update(preview.totals())
+    result['preview_token'] = store.put(preview)
+    result['server_ms'] = round((time.perf_counter() - started) * 1000, 3)
+    return result
@@ -0,0 +1,83 @@
+# services/quote_summaries.py - Backfill materialized quote summaries and signature info
+import logging
+from typing import Dict, List, Optional
+
+import click
+from flask.cli import with_appcontext
+
+from models import db
+from models.quote import Quote
+
+logger = logging.getLogger(__name__)
+
+# Columns added to the quotes table after deployments created it; db.create_all() only
+# creates missing tables, so these are added to existing ones by add_missing_quote_columns
+MATERIALIZED_COLUMNS = ('summary', 'signature_info')
+
+
+def add_missing_quote_columns() -> List[str]:
+    """Add the materialized columns to an existing quotes table that lacks them (idempotent)"""
+    inspector = db.inspect(db.engine)
+    table = Quote.__tablename__
+    if not inspector.has_table(table):
+        return []  # db.create_all() will create it with every column
+
+    existing = {column['name'] for column in inspector.get_columns(table)}
+    added = []
+    for name in MATERIALIZED_COLUMNS:
+        if name in existing:
+            continue
+        column_type = Quote.__table__.c[name].type.compile(dialect=db.engine.dialect)
+        with db.engine.begin() as connection:
+            connection.execute(db.text(f'ALTER TABLE {table} ADD COLUMN {name} {column_type}'))
+        added.append(name)
+
+    if added:
+        logger.info(f"🧱 Added column(s) {', '.join(added)} to {table}; run `flask backfill-quote-summaries` to fill them")
+    return added
+
+
+
+def backfill_quote_summaries(batch_size: int = 500, limit: Optional[int] = None) -> Dict[str, int]:
+    """Materialize ``summary`` and ``signature_info`` for quotes written before those columns existed.
+
+    Walks the quotes by id in batches, committing each batch, so it can be interrupted and re-run.
+    """
+    counts = {'processed': 0, 'summarized': 0, 'signatures': 0}
+    cursor = 0
+    pending = db.or_(Quote.summary.is_(None), db.and_(Quote.is_signed.is_(True), Quote.signature_info.is_(None)))
+
+    while limit is None or counts['processed'] < limit:
+        size = batch_size if limit is None else min(batch_size, limit - counts['processed'])
+        quotes = Quote.query.filter(Quote.id > cursor, pending).order_by(Quote.id).limit(size).all()
+        if not quotes:
+            break
+
+        for quote in quotes:
+            if quote.summary is None:
+                quote.refresh_summary()
+                counts['summarized'] += 1
+            if quote.is_signed and quote.signature_info is None:
+                signature = quote.latest_signature
+                if signature:
+                    quote.record_signature(signature)
+                    counts['signatures'] += 1
+        counts['processed'] += len(quotes)
+        cursor = quotes[-1].id
+        db.session.commit()
+        logger.info(f"🧾 Quote summaries backfilled up to quote {cursor}: {counts}")
+
+    return counts
+
+
+@click.command('backfill-quote-summaries')
+@click.option('--batch-size', type=int, default=500, help='Quotes per batch/commit.')
+@click.option('--limit', type=int, default=None, help='Stop after this many quotes.')
+@with_appcontext
+def backfill_quote_summaries_command(batch_size, limit):
+    """Materialize summaries and signature info of existing quotes."""
+    added = add_missing_quote_columns()
+    if added:
+        click.echo(f"Added missing quote column(s): {', '.join(added)}")
+    counts = backfill_quote_summaries(batch_size=batch_size, limit=limit)
+    click.echo(f"{counts['summarized']} quote summaries and {counts['signatures']} signatures materialized")
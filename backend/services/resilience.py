@@ -0,0 +1,193 @@
+# services/resilience.py - Deadlines, backoff, hedging thresholds and circuit breaking for upstream calls
+import time
+import random
+import logging
+import threading
+from collections import deque
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class DeadlineExceeded(TimeoutError):
+    """The call's latency budget ran out"""
+
+
+class CircuitOpenError(RuntimeError):
+    """The upstream is failing; calls are rejected until the breaker's cool-down ends"""
+
+
+class Deadline:
+    """A fixed point in time that every attempt, retry and backoff sleep must fit inside"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.started = time.monotonic()
+        self.expires_at = self.started + seconds
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self, what: str = 'call'):
+        if self.expired():
+            raise DeadlineExceeded(f"{what} exceeded its {self.seconds:.0f}s deadline")
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter: uniform(0, min(cap, base * 2**attempt))"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Timeouts, dropped connections, 429s and 5xx are worth another attempt; 4xx request errors are not"""
+    if isinstance(exc, (CircuitOpenError, DeadlineExceeded)):
+        return False
+    status_code = getattr(exc, 'status_code', None)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    try:
+        import httpx
+        import openai
+    except ImportError:
+        return False
+    return isinstance(exc, (openai.APIConnectionError, httpx.TransportError))
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """The server's Retry-After hint (seconds form only), if the error carries a response"""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        return max(float(headers.get('retry-after')), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class LatencyTracker:
+    """Rolling window of recent latencies; the hedging delay is a percentile of it"""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < max(min_samples, 1):
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker over a sliding window of recent outcomes.
+
+    Closed: calls pass and outcomes are recorded. The window holds the last ``window_size``
+    outcomes from the past ``window_seconds``; once it has at least ``min_calls`` and a
+    failure rate of ``failure_rate`` or more the breaker opens
+    and rejects calls for ``open_seconds``. Then it lets a single probe through
+    (half-open): success closes it, failure re-opens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_rate: float = 0.5, min_calls: int = 10, window_size: int = 20,
+                 window_seconds: float = 60.0, open_seconds: float = 30.0, name: str = 'upstream'):
+        self.failure_rate = failure_rate
+        self.min_calls = min(min_calls, window_size)
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.name = name
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window_size)  # (monotonic time, ok)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow(self):
+        """Raise ``CircuitOpenError`` unless a call may go through now"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.rejected += 1
+            retry_in = max(self.open_seconds - (time.monotonic() - self._opened_at), 0.0)
+        raise CircuitOpenError(f"{self.name} circuit is open after repeated failures (retry in {retry_in:.0f}s)")
+
+    def record(self, ok: bool):
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state()
+            if state == self.OPEN:
+                return  # stragglers that started before the breaker opened
+            if state == self.HALF_OPEN:
+                self._probe_in_flight = False
+                if ok:
+                    self._state = self.CLOSED
+                    self._outcomes.clear()
+                    logger.info(f"🟢 {self.name} circuit closed after a successful probe")
+                else:
+                    self._open(now)
+                return
+
+            self._outcomes.append((now, ok))
+            while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+                self._outcomes.popleft()
+
+            if state == self.CLOSED and len(self._outcomes) >= self.min_calls:
+                failures = sum(1 for _, success in self._outcomes if not success)
+                if failures / len(self._outcomes) >= self.failure_rate:
+                    self._open(now)
+
+    def _open(self, now: float):
+        self._state = self.OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self.times_opened += 1
+        logger.warning(f"🔴 {self.name} circuit opened for {self.open_seconds:.0f}s")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state()
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            return {
+                'state': state,
+                'window_calls': len(self._outcomes),
+                'window_failures': failures,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected
+            }
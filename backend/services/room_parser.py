@@ -0,0 +1,169 @@
+# services/room_parser.py - Single-pass parser for GPT room measurement output
+import re
+from typing import Callable, Dict, List, Optional
+
+# "Room: Name (type)", "### Room 2: Name (Type)", "**Room:** Name (type)", "1. Room: ..."
+ROOM_HEADER_RE = re.compile(
+    r'^[#*>\s-]*(?:\d+\.\s*)?\**\s*Room(?:\s+(?P<number>\d+))?\s*:\s*\**\s*'
+    r'(?P<name>[^()*]+?)\s*\((?P<type>[^()]+)\)',
+    re.IGNORECASE
+)
+# Any other "Room...:" line or markdown heading ends the open block
+BLOCK_END_RE = re.compile(r'^[#*\s-]*(?:Room\b[^:]*:|#{1,6}\s)', re.IGNORECASE)
+
+# "walls_surface_m2: 17.93", "- **Total Wall Area:** 28m x 2.4m = 67.2m²", "Ceiling Area: 12 m²"
+MEASUREMENT_RE = re.compile(
+    r'(?:(?P<walls>walls?_surface_m2|total\s+wall\s+area|walls?\s+surface|wall\s+area)'
+    r'|(?P<ceiling>area_m2|ceiling\s*/\s*floor\s+area|ceiling\s+area)'
+    r'|(?P<floor>floor\s+area))'
+    r'\s*\**\s*:\s*\**\s*(?P<value>[^;|\n]*?)(?=,\s*\**[a-z]|[;|]|$)',
+    re.IGNORECASE
+)
+NUMBER_RE = re.compile(r'\d+(?:[.,]\d+)?')
+
+
+def _parse_value(value: str) -> Optional[float]:
+    """Number in a measurement value; for 'a x b = c' expressions the result after '='"""
+    if '=' in value:
+        value = value.rsplit('=', 1)[1]
+    match = NUMBER_RE.search(value)
+    if not match:
+        return None
+    return float(match.group(0).replace(',', '.'))
+
+
+class StreamingRoomParser:
+    """Single-pass state machine over GPT room output.
+
+    Handles the current ``Room: Name (type)`` / ``walls_surface_m2`` / ``area_m2`` blocks
+    as well as the markdown and ``Room N:`` / ``Total Wall Area`` / ``Ceiling Area``
+    layouts produced by earlier prompts. Text can be fed in arbitrary chunks; a room is
+    emitted through ``on_room`` as soon as its wall and ceiling areas are known, or when
+    its block ends.
+    """
+
+    def __init__(self, on_room: Optional[Callable[[Dict], None]] = None):
+        self.on_room = on_room
+        self.rooms: List[Dict] = []
+        self._buffer = ''
+        self._current: Optional[Dict] = None
+        self._seen = set()
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """Consume a chunk of text and return the rooms completed by it"""
+        if not chunk:
+            return []
+
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split('\n')
+
+        emitted = []
+        for line in lines:
+            emitted.extend(self._parse_line(line))
+        return emitted
+
+    def close(self) -> List[Dict]:
+        """Flush the trailing partial line and the last open block"""
+        emitted = self._parse_line(self._buffer)
+        self._buffer = ''
+
+        room = self._finish_current()
+        if room:
+            emitted.append(room)
+        return emitted
+
+    def _parse_line(self, line: str) -> List[Dict]:
+        line = line.strip()
+        if not line:
+            return []
+
+        lowered = line.lower()
+        header = ROOM_HEADER_RE.match(line) if 'room' in lowered else None
+        if header:
+            emitted = self._finish_current()
+            self._current = {
+                'number': header.group('number'),
+                'name': header.group('name').strip().rstrip(':').strip(),
+                'type': header.group('type').strip().lower(),
+                'walls': None,
+                'ceiling': None,
+                'floor': None
+            }
+            # Single-line answers carry the measurements after the header
+            self._read_measurements(line[header.end():], lowered[header.end():])
+            return [room for room in (emitted, self._emit_if_complete()) if room]
+
+        if (line[0] == '#' or 'room' in lowered) and BLOCK_END_RE.match(line):
+            room = self._finish_current()
+            return [room] if room else []
+
+        if self._current is None:
+            return []
+
+        self._read_measurements(line, lowered)
+        room = self._emit_if_complete()
+        return [room] if room else []
+
+    def _read_measurements(self, text: str, lowered: str):
+        # Cheap substring test first: most lines (wall segments, notes) carry no measurement
+        if self._current is None or ('area' not in lowered and 'surface' not in lowered):
+            return
+        for match in MEASUREMENT_RE.finditer(text):
+            value = _parse_value(match.group('value'))
+            if value is None:
+                continue
+
+            if match.group('walls'):
+                key = 'walls'
+            elif match.group('ceiling'):
+                key = 'ceiling'
+            else:
+                key = 'floor'
+
+            # First value wins, matching how GPT lists the final figure once per room
+            if self._current[key] is None:
+                self._current[key] = value
+
+    def _emit_if_complete(self) -> Optional[Dict]:
+        if self._current and self._current['walls'] is not None and self._current['ceiling'] is not None:
+            return self._finish_current()
+        return None
+
+    def _finish_current(self) -> Optional[Dict]:
+        """Close the open block, emitting it if it is a new room with a measurement"""
+        block, self._current = self._current, None
+        if not block or not block['name']:
+            return None
+
+        walls = block['walls'] or 0
+        # Floor area stands in for the ceiling when only that was given
+        area = block['ceiling'] if block['ceiling'] is not None else (block['floor'] or 0)
+        if walls <= 0 and area <= 0:
+            return None
+
+        # Numbered layouts may reuse a name ("Room 1: Bedroom", "Room 2: Bedroom")
+        key = (block['number'], block['name'])
+        if key in self._seen:
+            return None
+        self._seen.add(key)
+
+        room = {
+            'id': len(self.rooms) + 1,
+            'name': block['name'],
+            'type': block['type'],
+            'walls_surface_m2': walls,
+            'area_m2': area
+        }
+        self.rooms.append(room)
+
+        if self.on_room:
+            self.on_room(room)
+        return room
+
+
+def parse_rooms(text: str) -> List[Dict]:
+    """Parse a complete GPT response into room dicts in one pass"""
+    parser = StreamingRoomParser()
+    parser.feed(text or '')
+    parser.close()
+    return parser.rooms
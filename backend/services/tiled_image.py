@@ -0,0 +1,377 @@
+# services/tiled_image.py - Memory-bounded reading of very large floor plan scans
+import os
+import math
+import mmap
+import struct
+import logging
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# Images above this many pixels are read through TiledImageReader instead of being decoded whole
+DEFAULT_LARGE_IMAGE_PIXELS = 40_000_000
+DEFAULT_WINDOW_BYTES = 16 * 1024 * 1024
+DEFAULT_MEMORY_LIMIT_BYTES = 512 * 1024 * 1024
+
+# Uncompressed layouts that can be memory-mapped: rawmode -> (bytes per pixel, RGB channel order)
+RAW_LAYOUTS = {
+    'L': (1, None),
+    'RGB': (3, (0, 1, 2)),
+    'BGR': (3, (2, 1, 0)),
+    'RGBA': (4, (0, 1, 2)),
+    'RGBX': (4, (0, 1, 2)),
+    'BGRA': (4, (2, 1, 0)),
+    'BGRX': (4, (2, 1, 0)),
+}
+
+# EXIF orientation -> transpose that undoes it (as in ImageOps.exif_transpose)
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+class MemoryBudgetExceeded(ValueError):
+    """The image can only be decoded whole and that would exceed the memory limit"""
+
+
+def tiling_options(config) -> Dict[str, int]:
+    """Reader settings from the app config"""
+    return {
+        'large_image_pixels': config.get('ANALYSIS_LARGE_IMAGE_PIXELS', DEFAULT_LARGE_IMAGE_PIXELS),
+        'window_bytes': config.get('ANALYSIS_TILE_WINDOW_MB', 16) * 1024 * 1024,
+        'memory_limit_bytes': config.get('ANALYSIS_IMAGE_MEMORY_LIMIT_MB', 512) * 1024 * 1024
+    }
+
+
+def _open_header(path: str):
+    """Open an image for its header only.
+
+    ``Image.open`` refuses anything over twice ``MAX_IMAGE_PIXELS`` as a decompression
+    bomb. Nothing is decoded here without a memory check, so the format plugins are
+    tried directly, as ``Image.open`` does, and the process-wide limit that guards
+    every other ``Image.open`` call is left alone.
+    """
+    with open(path, 'rb') as f:
+        prefix = f.read(16)
+    Image.init()
+    for format_id in Image.ID:
+        factory, accept = Image.OPEN[format_id]
+        result = not accept or accept(prefix)
+        if not result or isinstance(result, str):
+            continue
+        try:
+            return factory(path)  # opened from the path, so closing the image closes the file
+        except (SyntaxError, IndexError, TypeError, struct.error):
+            continue
+    raise UnidentifiedImageError(f"cannot identify image file {path!r}")
+
+
+def image_pixels(path: str) -> int:
+    """Pixel count from the header (0 if the file is not a readable image)"""
+    try:
+        with _open_header(path) as img:
+            return img.width * img.height
+    except Exception:
+        return 0
+
+
+def is_large_image(path: str, large_image_pixels: int = DEFAULT_LARGE_IMAGE_PIXELS) -> bool:
+    return image_pixels(path) > large_image_pixels
+
+
+def otsu_threshold(histogram: np.ndarray) -> int:
+    """Otsu's threshold for a 256-bin histogram (same split as cv2.THRESH_OTSU)"""
+    histogram = histogram.astype(np.float64)
+    total = histogram.sum()
+    if not total:
+        return 128
+    levels = np.arange(256, dtype=np.float64)
+    weight_bg = np.cumsum(histogram)
+    weight_fg = total - weight_bg
+    mean_bg = np.cumsum(histogram * levels)
+    mean_total = mean_bg[-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = (mean_total * weight_bg / total - mean_bg) ** 2 / (weight_bg * weight_fg)
+    between[~np.isfinite(between)] = 0
+    return int(np.argmax(between))
+
+
+class TiledScan:
+    """Result of one pass over an image: the downscaled raster plus full-resolution features.
+
+    ``scale`` maps source pixels to ``image`` pixels. The histogram and per-row/column
+    minimum gray levels cover every source pixel, so the Otsu threshold and the ink
+    bounding box for any threshold are exact without a second pass. Features are in
+    stored (un-rotated) source coordinates; ``image`` is rotated when requested.
+    """
+
+    def __init__(self, image: np.ndarray, scale: float, histogram: np.ndarray, row_min: np.ndarray,
+                 col_min: np.ndarray, source_size: Tuple[int, int], strategy: str, orientation: int = 1):
+        self.image = image
+        self.scale = scale
+        self.histogram = histogram
+        self.row_min = row_min
+        self.col_min = col_min
+        self.source_size = source_size
+        self.strategy = strategy
+        self.orientation = orientation
+
+    @property
+    def threshold(self) -> int:
+        return otsu_threshold(self.histogram)
+
+    def ink_bbox(self, threshold: Optional[int] = None) -> Optional[Tuple[int, int, int, int]]:
+        """(left, top, right, bottom) of pixels darker than ``threshold`` (default Otsu)"""
+        threshold = self.threshold if threshold is None else threshold
+        rows = np.flatnonzero(self.row_min <= threshold)
+        cols = np.flatnonzero(self.col_min <= threshold)
+        if not rows.size or not cols.size:
+            return None
+        # row/col minima come from a (possibly reduced) raster; map back to source pixels
+        row_scale = self.source_size[1] / len(self.row_min)
+        col_scale = self.source_size[0] / len(self.col_min)
+        return (int(cols[0] * col_scale), int(rows[0] * row_scale),
+                int(math.ceil((cols[-1] + 1) * col_scale)), int(math.ceil((rows[-1] + 1) * row_scale)))
+
+    @property
+    def ink_fraction(self) -> float:
+        total = self.histogram.sum()
+        return float(self.histogram[:self.threshold + 1].sum() / total) if total else 0.0
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'strategy': self.strategy,
+            'source_size': list(self.source_size),
+            'scale': round(self.scale, 6),
+            'threshold': self.threshold,
+            'ink_bbox': list(self.ink_bbox() or []),
+            'ink_fraction': round(self.ink_fraction, 4)
+        }
+
+
+class TiledImageReader:
+    """Reads huge rasters in fixed-size windows with a hard cap on decoded memory.
+
+    - ``memmap``: uncompressed TIFF (contiguous strips), BMP and PPM/PGM are mapped with
+      ``mmap`` and read as NumPy views one band of rows at a time; pages are dropped from
+      the process after each window, so resident memory stays near ``window_bytes``.
+    - ``draft``: JPEG is decoded directly at 1/2, 1/4 or 1/8 scale.
+    - ``decode``: anything else (PNG, compressed TIFF) must be decoded whole, which is
+      only allowed while the estimate stays under ``memory_limit_bytes``.
+    """
+
+    def __init__(self, path: str, window_bytes: int = DEFAULT_WINDOW_BYTES,
+                 memory_limit_bytes: int = DEFAULT_MEMORY_LIMIT_BYTES, **_):
+        self.path = path
+        self.window_bytes = window_bytes
+        self.memory_limit_bytes = memory_limit_bytes
+
+        with _open_header(path) as img:
+            self.width, self.height = img.size
+            self.mode = img.mode
+            self.format = img.format
+            self.orientation = img.getexif().get(0x0112, 1)
+            self.layout = self._raw_layout(img)
+
+        if self.layout:
+            self.strategy = 'memmap'
+        elif self.format == 'JPEG':
+            self.strategy = 'draft'
+        else:
+            self.strategy = 'decode'
+
+    def _raw_layout(self, img) -> Optional[Dict[str, Any]]:
+        """Byte layout when the pixels are stored uncompressed and contiguously"""
+        tiles = sorted(img.tile, key=lambda tile: tile[1][1])
+        if not tiles or any(tile[0] != 'raw' for tile in tiles):
+            return None
+
+        args = [tile[3] if isinstance(tile[3], tuple) else (tile[3],) for tile in tiles]
+        rawmode = args[0][0]
+        if rawmode not in RAW_LAYOUTS or any(arg[0] != rawmode for arg in args):
+            return None
+
+        bytes_per_pixel, channel_order = RAW_LAYOUTS[rawmode]
+        stride = args[0][1] if len(args[0]) > 1 and args[0][1] else self.width * bytes_per_pixel
+        direction = args[0][2] if len(args[0]) > 2 else 1
+        if direction not in (1, -1) or (direction == -1 and len(tiles) > 1):
+            return None
+
+        offset = tiles[0][2]
+        for tile in tiles:
+            x0, y0, x1, _ = tile[1]
+            if (x0, x1) != (0, self.width) or tile[2] != offset + y0 * stride:
+                return None
+        if os.path.getsize(self.path) < offset + self.height * stride:
+            return None
+
+        return {
+            'offset': offset,
+            'stride': stride,
+            'bytes_per_pixel': bytes_per_pixel,
+            'channel_order': channel_order,
+            'bottom_up': direction == -1
+        }
+
+    def _window_rows(self, block: int, bytes_per_pixel: int) -> int:
+        # raw bytes + uint32 luma intermediates + the window's share of the output
+        per_row = self.width * (bytes_per_pixel + 12)
+        rows = max(block, (self.window_bytes // per_row) // block * block)
+        return min(rows, max(block, self.height // block * block))
+
+    def scan(self, max_edge: int, color: bool = False, orient: bool = True) -> TiledScan:
+        """Downscale so the long edge fits ``max_edge`` and collect features in one pass"""
+        block = max(1, math.ceil(max(self.width, self.height) / max_edge))
+        if self.strategy == 'memmap':
+            scan = self._scan_mapped(block, color)
+        else:
+            scan = self._scan_decoded(block, color)
+
+        if orient and self.orientation in ORIENTATION_TRANSPOSE:
+            image = Image.fromarray(scan.image).transpose(ORIENTATION_TRANSPOSE[self.orientation])
+            scan.image = np.asarray(image)
+            scan.orientation = self.orientation
+        return scan
+
+    def _scan_mapped(self, block: int, color: bool) -> TiledScan:
+        layout = self.layout
+        bpp, order = layout['bytes_per_pixel'], layout['channel_order']
+        out_h, out_w = self.height // block, self.width // block
+        out = np.zeros((out_h, out_w, 3) if color and order else (out_h, out_w), dtype=np.uint8)
+        histogram = np.zeros(256, dtype=np.int64)
+        row_min = np.full(self.height, 255, dtype=np.uint8)
+        col_min = np.full(self.width, 255, dtype=np.uint8)
+
+        window = self._window_rows(block, bpp)
+        page = mmap.PAGESIZE
+        with open(self.path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            rows = np.frombuffer(mapped, dtype=np.uint8, count=self.height * layout['stride'],
+                                 offset=layout['offset']).reshape(self.height, layout['stride'])
+            for y0 in range(0, self.height, window):
+                y1 = min(self.height, y0 + window)
+                if layout['bottom_up']:
+                    file_rows = (self.height - y1, self.height - y0)
+                    pixels = rows[file_rows[0]:file_rows[1]][::-1, :self.width * bpp]
+                else:
+                    file_rows = (y0, y1)
+                    pixels = rows[y0:y1, :self.width * bpp]
+
+                gray = self._luma(pixels.reshape(y1 - y0, self.width, bpp), order)
+                histogram += np.bincount(gray.ravel(), minlength=256)
+                row_min[y0:y1] = gray.min(axis=1)
+                np.minimum(col_min, gray.min(axis=0), out=col_min)
+
+                # Box-filter whole blocks; the < block leftover rows/columns at the edge are dropped
+                block_rows = (y1 - y0) // block
+                if block_rows and y0 // block < out_h:
+                    if out.ndim == 3:
+                        source = np.stack([pixels.reshape(y1 - y0, self.width, bpp)[..., c] for c in order], axis=-1)
+                    else:
+                        source = gray
+                    out[y0 // block:y0 // block + block_rows] = self._block_mean(source, block, block_rows, out_w)
+                    source = None
+                pixels = gray = None
+
+                # Drop the window's pages from this process; they stay in the page cache
+                if hasattr(mmap, 'MADV_DONTNEED'):
+                    start = layout['offset'] + file_rows[0] * layout['stride']
+                    end = layout['offset'] + file_rows[1] * layout['stride']
+                    aligned = start // page * page
+                    mapped.madvise(mmap.MADV_DONTNEED, aligned, end - aligned)
+        finally:
+            rows = pixels = gray = source = None
+            self._close_mapping(mapped)
+
+        return TiledScan(out, 1.0 / block, histogram, row_min, col_min, (self.width, self.height), 'memmap')
+
+    @staticmethod
+    def _close_mapping(mapped):
+        try:
+            mapped.close()
+        except BufferError:
+            pass  # a view is still held by an in-flight exception; unmapped when it is collected
+
+    @staticmethod
+    def _luma(pixels: np.ndarray, order) -> np.ndarray:
+        """ITU-R 601-2 luma with Pillow's integer rounding, so 'L' matches Image.convert('L')"""
+        if order is None:
+            return np.ascontiguousarray(pixels[..., 0])
+        r, g, b = (pixels[..., c].astype(np.uint32) for c in order)
+        return ((r * 19595 + g * 38470 + b * 7471 + 0x8000) >> 16).astype(np.uint8)
+
+    @staticmethod
+    def _block_mean(source: np.ndarray, block: int, block_rows: int, out_w: int) -> np.ndarray:
+        trimmed = source[:block_rows * block, :out_w * block]
+        shape = (block_rows, block, out_w, block) + trimmed.shape[2:]
+        return np.rint(trimmed.reshape(shape).mean(axis=(1, 3), dtype=np.float32)).astype(np.uint8)
+
+    def _scan_decoded(self, block: int, color: bool) -> TiledScan:
+        bands = 3 if color else 1
+        with _open_header(self.path) as img:
+            if self.strategy == 'draft':
+                # JPEG decodes at up to 1/8 scale, so only the reduced raster is ever allocated
+                img.draft('RGB' if color else 'L', (max(1, self.width // block), max(1, self.height // block)))
+            decoded_pixels = img.size[0] * img.size[1]
+            estimate = decoded_pixels * (len(img.getbands()) + bands + 1)
+            if estimate > self.memory_limit_bytes:
+                raise MemoryBudgetExceeded(
+                    f"{self.format} image of {self.width}x{self.height} px needs ~{estimate // (1024 * 1024)} MB to decode "
+                    f"(limit {self.memory_limit_bytes // (1024 * 1024)} MB); upload it as an uncompressed TIFF, JPEG or PDF"
+                )
+            img = img.convert('RGB' if color else 'L')
+
+        gray = np.asarray(img if not color else img.convert('L'))
+        histogram = np.bincount(gray.ravel(), minlength=256).astype(np.int64)
+        row_min, col_min = gray.min(axis=1), gray.min(axis=0)
+
+        # Same output size as the memmap path; BOX is the area average the block mean computes
+        target = (max(1, self.width // block), max(1, self.height // block))
+        if img.size == (self.width, self.height) and block > 1:
+            img = img.reduce(block).crop((0, 0) + target)
+        elif img.size != target:
+            img = img.resize(target, Image.Resampling.BOX)
+        return TiledScan(np.asarray(img), 1.0 / block, histogram, row_min, col_min,
+                         (self.width, self.height), self.strategy)
+
+    def read_region(self, box: Tuple[int, int, int, int]) -> Image.Image:
+        """Full-resolution crop ``(left, top, right, bottom)`` in stored coordinates"""
+        left, top, right, bottom = box
+        if self.strategy != 'memmap':
+            estimate = self.width * self.height * len(self.mode)
+            if estimate > self.memory_limit_bytes:
+                raise MemoryBudgetExceeded(
+                    f"Cropping a {self.format} image of {self.width}x{self.height} px needs ~{estimate // (1024 * 1024)} MB "
+                    f"(limit {self.memory_limit_bytes // (1024 * 1024)} MB)"
+                )
+            with _open_header(self.path) as img:
+                return img.crop(box).copy()
+
+        layout = self.layout
+        bpp, order = layout['bytes_per_pixel'], layout['channel_order']
+        with open(self.path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            rows = np.frombuffer(mapped, dtype=np.uint8, count=self.height * layout['stride'],
+                                 offset=layout['offset']).reshape(self.height, layout['stride'])
+            if layout['bottom_up']:
+                region = rows[self.height - bottom:self.height - top][::-1]
+            else:
+                region = rows[top:bottom]
+            region = np.array(region[:, left * bpp:right * bpp]).reshape(bottom - top, right - left, bpp)
+        finally:
+            rows = None
+            self._close_mapping(mapped)
+
+        if order is None:
+            return Image.fromarray(region[..., 0], 'L')
+        return Image.fromarray(np.stack([region[..., c] for c in order], axis=-1), 'RGB')
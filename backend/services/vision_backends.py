@@ -0,0 +1,479 @@
+# services/vision_backends.py - Pluggable vision model backends (live, recording, replay)
+import os
+import json
+import time
+import queue
+import random
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Any, Iterator, List, Optional
+
+from services.analysis_metrics import usage_to_dict
+from services.resilience import (
+    CircuitBreaker, CircuitOpenError, Deadline, DeadlineExceeded, LatencyTracker,
+    backoff_delay, is_retryable, retry_after_seconds
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class VisionResponse:
+    text: str
+    usage: Optional[Dict[str, int]] = None
+
+
+@dataclass
+class VisionChunk:
+    """One streamed piece of the response; ``usage`` is set on the final chunk only"""
+    text: Optional[str] = None
+    usage: Optional[Dict[str, int]] = None
+
+
+class ReplayMissError(LookupError):
+    """No recording matches the request fingerprint"""
+
+
+def request_fingerprint(request_kwargs: Dict[str, Any]) -> str:
+    """Stable hash of everything that determines the model's answer (model, prompt, image, sampling)"""
+    canonical = json.dumps(request_kwargs, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class VisionBackend:
+    """Interface used by ``FloorPlanAnalyzer`` for the chat completion with the floor plan image"""
+
+    name = 'base'
+
+    def complete(self, request_kwargs: Dict[str, Any], timeout: Optional[float] = None) -> VisionResponse:
+        raise NotImplementedError
+
+    def stream(self, request_kwargs: Dict[str, Any], timeout: Optional[float] = None) -> Iterator[VisionChunk]:
+        """Default: a single chunk with the full response"""
+        response = self.complete(request_kwargs, timeout=timeout)
+        yield VisionChunk(text=response.text)
+        yield VisionChunk(usage=response.usage)
+
+
+class OpenAIVisionBackend(VisionBackend):
+    """Live OpenAI chat completions"""
+
+    name = 'openai'
+
+    def __init__(self, client):
+        self.client = client
+
+    def _client(self, timeout: Optional[float]):
+        """The pooled client, with the per-request timeout capped at the caller's remaining budget"""
+        return self.client.with_options(timeout=timeout) if timeout else self.client
+
+    def complete(self, request_kwargs: Dict[str, Any], timeout: Optional[float] = None) -> VisionResponse:
+        response = self._client(timeout).chat.completions.create(**request_kwargs)
+        return VisionResponse(text=response.choices[0].message.content, usage=usage_to_dict(response.usage))
+
+    def stream(self, request_kwargs: Dict[str, Any], timeout: Optional[float] = None) -> Iterator[VisionChunk]:
+        stream = self._client(timeout).chat.completions.create(
+            stream=True, stream_options={"include_usage": True}, **request_kwargs
+        )
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield VisionChunk(text=chunk.choices[0].delta.content)
+                if getattr(chunk, 'usage', None):
+                    yield VisionChunk(usage=usage_to_dict(chunk.usage))
+        finally:
+            # Release the connection when the consumer stops early (e.g. a hedged request lost)
+            stream.close()
+
+
+class RecordingVisionBackend(VisionBackend):
+    """Pass requests to another backend and store each response under the request fingerprint.
+
+    Recordings are one JSON file per fingerprint holding the text, the streamed chunks,
+    token usage and the observed latency, so a replay can reproduce the timing profile.
+    """
+
+    name = 'record'
+
+    def __init__(self, inner: VisionBackend, recordings_dir: str):
+        self.inner = inner
+        self.recordings_dir = recordings_dir
+        os.makedirs(recordings_dir, exist_ok=True)
+
+    def complete(self, request_kwargs: Dict[str, Any], timeout: Optional[float] = None) -> VisionResponse:
+        started = time.perf_counter()
+        response = self.inner.complete(request_kwargs, timeout=timeout)
+        latency_ms = (time.perf_counter() - started) * 1000
+        self._save(request_kwargs, [response.text], response.usage, latency_ms, None)
+        return response
+
+    def stream(self, request_kwargs: Dict[str, Any], timeout: Optional[float] = None) -> Iterator[VisionChunk]:
+        started = time.perf_counter()
+        chunks, usage, first_token_ms = [], None, None
+        for chunk in self.inner.stream(request_kwargs, timeout=timeout):
+            if chunk.text:
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - started) * 1000
+                chunks.append(chunk.text)
+            if chunk.usage:
+                usage = chunk.usage
+            yield chunk
+        self._save(request_kwargs, chunks, usage, (time.perf_counter() - started) * 1000, first_token_ms)
+
+    def _save(self, request_kwargs, chunks: List[str], usage, latency_ms: float, first_token_ms: Optional[float]):
+        fingerprint = request_fingerprint(request_kwargs)
+        record = {
+            'fingerprint': fingerprint,
+            'model': request_kwargs.get('model'),
+            'recorded_at': time.time(),
+            'text': ''.join(chunks),
+            'chunks': chunks,
+            'usage': usage,
+            'latency_ms': round(latency_ms, 2),
+            'first_token_ms': round(first_token_ms, 2) if first_token_ms is not None else None
+        }
+        path = os.path.join(self.recordings_dir, f'{fingerprint}.json')
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        logger.info(f"📼 Recorded vision response {fingerprint[:12]} ({record['latency_ms']:.0f}ms)")
+
+
+class ReplayVisionBackend(VisionBackend):
+    """Serve recorded responses with artificial latency; never touches the network.
+
+    ``latency_ms=None`` replays each recording's own latency; a number overrides it
+    (``jitter_ms`` adds uniform noise). ``on_miss='any'`` serves recordings round-robin
+    for unknown requests so new images can be load-tested; ``'error'`` raises.
+    """
+
+    name = 'replay'
+
+    def __init__(self, recordings_dir: str, latency_ms: Optional[float] = None, jitter_ms: float = 0.0,
+                 on_miss: str = 'error'):
+        if on_miss not in ('error', 'any'):
+            raise ValueError(f"Unsupported replay miss policy: {on_miss}")
+        self.recordings_dir = recordings_dir
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.on_miss = on_miss
+        self._lock = threading.Lock()
+        self._next = 0
+        self.recordings = self._load()
+        self._ordered = [self.recordings[key] for key in sorted(self.recordings)]
+        logger.info(f"📼 Replay backend loaded {len(self.recordings)} recordings from {recordings_dir}")
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        recordings = {}
+        if not os.path.isdir(self.recordings_dir):
+            return recordings
+        for filename in os.listdir(self.recordings_dir):
+            if not filename.endswith('.json'):
+                continue
+            with open(os.path.join(self.recordings_dir, filename), 'r', encoding='utf-8') as f:
+                record = json.load(f)
+            recordings[record['fingerprint']] = record
+        return recordings
+
+    def _lookup(self, request_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        fingerprint = request_fingerprint(request_kwargs)
+        record = self.recordings.get(fingerprint)
+        if record:
+            return record
+        if self.on_miss == 'any' and self._ordered:
+            with self._lock:
+                record = self._ordered[self._next % len(self._ordered)]
+                self._next += 1
+            return record
+        raise ReplayMissError(f"No recorded vision response for request {fingerprint[:12]}")
+
+    def _latency_seconds(self, record: Dict[str, Any]) -> float:
+        latency = self.latency_ms if self.latency_ms is not None else record.get('latency_ms') or 0.0
+        if self.jitter_ms:
+            latency += random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(latency, 0.0) / 1000
+
+    def complete(self, request_kwargs: Dict[str, Any], timeout: Optional[float] = None) -> VisionResponse:
+        record = self._lookup(request_kwargs)
+        time.sleep(self._latency_seconds(record))
+        return VisionResponse(text=record['text'], usage=record.get('usage'))
+
+    def stream(self, request_kwargs: Dict[str, Any], timeout: Optional[float] = None) -> Iterator[VisionChunk]:
+        record = self._lookup(request_kwargs)
+        total = self._latency_seconds(record)
+        chunks = record.get('chunks') or [record['text']]
+
+        # Time to first token keeps the recorded share of the total latency
+        recorded_total = record.get('latency_ms') or 0.0
+        first_share = (record.get('first_token_ms') or 0.0) / recorded_total if recorded_total else 0.0
+        time.sleep(total * first_share)
+        per_chunk = total * (1 - first_share) / len(chunks)
+        for text in chunks:
+            yield VisionChunk(text=text)
+            time.sleep(per_chunk)
+        yield VisionChunk(usage=record.get('usage'))
+
+
+class ResilientVisionBackend(VisionBackend):
+    """Wrap a backend with a latency budget, retries, hedging and a circuit breaker.
+
+    Each call gets ``deadline_seconds`` in total and every attempt's HTTP timeout is capped
+    at what is left. Timeouts, connection errors, 429s and 5xx are retried with
+    full-jitter exponential backoff (or the server's Retry-After) while the budget allows.
+    If nothing has arrived after the hedge delay (the ``hedge_percentile`` of recent
+    response times, or of time to first token when streaming) an identical second
+    request is sent and whichever answers first wins. Streams are only retried or hedged
+    before their first token, so rooms already handed to the caller are never repeated.
+
+    Hedging is off by default: each hedge is a second paid request, and a losing
+    non-streamed request runs to completion (and is billed) even though its answer is
+    dropped. With ``hedge_slots`` (the caller's concurrency semaphore) a hedge only goes
+    out if a slot is free, and holds it until its request really ends.
+    """
+
+    def __init__(self, inner: VisionBackend, deadline_seconds: float = 90.0, max_attempts: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0, hedge: bool = False,
+                 hedge_percentile: float = 95.0, hedge_min_samples: int = 20, hedge_min_delay: float = 2.0,
+                 breaker: Optional[CircuitBreaker] = None, hedge_slots: Optional[threading.Semaphore] = None):
+        self.inner = inner
+        self.name = f'{inner.name}+resilient'
+        self.deadline_seconds = deadline_seconds
+        self.max_attempts = max(max_attempts, 1)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_slots = hedge_slots
+        self.breaker = breaker or CircuitBreaker(name='vision')
+        self.latency = {'complete': LatencyTracker(), 'stream': LatencyTracker()}
+        self._lock = threading.Lock()
+        self.counters = {'calls': 0, 'attempts': 0, 'retries': 0, 'hedges': 0, 'hedge_wins': 0,
+                         'hedges_skipped_no_slot': 0, 'deadline_exceeded': 0, 'circuit_rejections': 0,
+                         'failures': 0}
+
+    def _incr(self, counter: str):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def complete(self, request_kwargs: Dict[str, Any], timeout: Optional[float] = None) -> VisionResponse:
+        for response in self._call('complete', request_kwargs, timeout):
+            return response
+
+    def stream(self, request_kwargs: Dict[str, Any], timeout: Optional[float] = None) -> Iterator[VisionChunk]:
+        yield from self._call('stream', request_kwargs, timeout)
+
+    def _call(self, mode: str, request_kwargs: Dict[str, Any], timeout: Optional[float]):
+        deadline = Deadline(min(timeout, self.deadline_seconds) if timeout else self.deadline_seconds)
+        self._incr('calls')
+        attempt = 0
+        while True:
+            produced = False
+            try:
+                for item in self._race(mode, request_kwargs, deadline):
+                    produced = True
+                    yield item
+                return
+            except Exception as e:
+                if isinstance(e, DeadlineExceeded):
+                    self._incr('deadline_exceeded')
+                elif isinstance(e, CircuitOpenError):
+                    self._incr('circuit_rejections')
+                if produced or not is_retryable(e) or attempt + 1 >= self.max_attempts:
+                    self._incr('failures')
+                    raise
+
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+                if delay >= deadline.remaining():
+                    self._incr('deadline_exceeded')
+                    self._incr('failures')
+                    raise DeadlineExceeded(f"Vision call out of time budget after {attempt + 1} attempts: {e}") from e
+
+                attempt += 1
+                self._incr('retries')
+                logger.warning(f"🔁 Vision call failed ({type(e).__name__}: {e}); retrying in {delay:.2f}s "
+                               f"(attempt {attempt + 1}/{self.max_attempts})")
+                time.sleep(delay)
+
+    def _hedge_delay(self, mode: str) -> Optional[float]:
+        if not self.hedge:
+            return None
+        observed = self.latency[mode].percentile(self.hedge_percentile, self.hedge_min_samples)
+        return None if observed is None else max(observed, self.hedge_min_delay)
+
+    def _race(self, mode: str, request_kwargs: Dict[str, Any], deadline: Deadline):
+        """Yield the winning attempt's output (one response, or stream chunks)"""
+        messages = queue.Queue()
+        launched = []  # (cancel event, monotonic start)
+
+        def launch(slot=None):
+            self.breaker.allow()
+            cancel = threading.Event()
+            launched.append((cancel, time.monotonic()))
+            self._incr('attempts')
+            threading.Thread(
+                target=self._run_attempt,
+                args=(mode, request_kwargs, deadline.remaining(), len(launched) - 1, cancel, messages, slot),
+                name=f'vision-attempt-{len(launched)}',
+                daemon=True
+            ).start()
+
+        launch()
+        hedge_delay = self._hedge_delay(mode)
+        winner = None
+        failed = set()
+        try:
+            while True:
+                can_hedge = winner is None and hedge_delay is not None and len(launched) == 1
+                wait = deadline.remaining()
+                if can_hedge:
+                    wait = min(wait, max(launched[0][1] + hedge_delay - time.monotonic(), 0.0))
+                try:
+                    index, kind, payload = messages.get(timeout=wait)
+                except queue.Empty:
+                    if deadline.expired():
+                        if winner is None:
+                            for index in range(len(launched)):
+                                if index not in failed:
+                                    self.breaker.record(False)
+                        raise DeadlineExceeded(f"Vision call exceeded its {deadline.seconds:.0f}s deadline")
+                    if can_hedge:
+                        hedge_delay = self._launch_hedge(launch, hedge_delay)
+                    continue
+
+                if winner is None:
+                    if kind == 'error':
+                        failed.add(index)
+                        # Request errors (4xx) mean the upstream is answering; only outages count
+                        self.breaker.record(not is_retryable(payload))
+                        # Every attempt in flight failed: the retry loop decides whether to back off and retry
+                        if len(failed) == len(launched):
+                            raise payload
+                        continue
+                    winner = index
+                    self.breaker.record(True)
+                    self.latency[mode].observe(time.monotonic() - launched[index][1])
+                    if index > 0:
+                        self._incr('hedge_wins')
+                    for other, (cancel, _) in enumerate(launched):
+                        if other != winner:
+                            cancel.set()
+
+                if index != winner:
+                    continue
+                if kind == 'error':
+                    self.breaker.record(False)
+                    raise payload
+                if kind == 'done':
+                    return
+                yield payload
+                if kind == 'result':
+                    return
+        finally:
+            for cancel, _ in launched:
+                cancel.set()
+
+    def _launch_hedge(self, launch, hedge_delay: float) -> Optional[float]:
+        """Send the hedged request if a concurrency slot is free; None stops further hedging"""
+        slot = self.hedge_slots
+        if slot is not None and not slot.acquire(blocking=False):
+            # Every slot is taken by other calls: hedging now would exceed the concurrency cap
+            self._incr('hedges_skipped_no_slot')
+            return None
+        try:
+            launch(slot)
+        except CircuitOpenError:
+            if slot is not None:
+                slot.release()
+            return None
+        self._incr('hedges')
+        logger.info(f"🪃 No vision response after {hedge_delay:.1f}s - sending a hedged request")
+        return hedge_delay
+
+    def _run_attempt(self, mode: str, request_kwargs: Dict[str, Any], timeout: float, index: int,
+                     cancel: threading.Event, messages: queue.Queue, slot=None):
+        try:
+            if mode == 'complete':
+                response = self.inner.complete(request_kwargs, timeout=timeout)
+                messages.put((index, 'result', response))
+                return
+
+            stream = self.inner.stream(request_kwargs, timeout=timeout)
+            try:
+                for chunk in stream:
+                    if cancel.is_set():
+                        return
+                    messages.put((index, 'chunk', chunk))
+            finally:
+                stream.close()
+            messages.put((index, 'done', None))
+        except Exception as e:
+            if not cancel.is_set():
+                messages.put((index, 'error', e))
+        finally:
+            if slot is not None:
+                slot.release()  # only once the request has really ended, won or lost
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            **counters,
+            'deadline_seconds': self.deadline_seconds,
+            'hedge_delay_seconds': {mode: self._hedge_delay(mode) for mode in self.latency},
+            'breaker': self.breaker.snapshot()
+        }
+
+
+def create_vision_backend(config, client=None, hedge_slots=None) -> VisionBackend:
+    """Build the backend selected by ``VISION_BACKEND`` ('openai', 'record' or 'replay')
+
+    Live backends are wrapped in ``ResilientVisionBackend`` unless ``VISION_RESILIENCE_ENABLED``
+    is off; replay is offline and deterministic so it is used as is. Hedged requests take
+    one of ``hedge_slots`` (the vision call semaphore) or are skipped.
+    """
+    kind = config.get('VISION_BACKEND', 'openai')
+    recordings_dir = config.get('VISION_RECORDINGS_DIR')
+
+    if kind == 'replay':
+        return ReplayVisionBackend(
+            recordings_dir,
+            latency_ms=config.get('VISION_REPLAY_LATENCY_MS'),
+            jitter_ms=config.get('VISION_REPLAY_JITTER_MS', 0.0),
+            on_miss=config.get('VISION_REPLAY_ON_MISS', 'error')
+        )
+    if kind == 'record':
+        backend = RecordingVisionBackend(OpenAIVisionBackend(client), recordings_dir)
+    elif kind == 'openai':
+        backend = OpenAIVisionBackend(client)
+    else:
+        raise ValueError(f"Unknown VISION_BACKEND: {kind}")
+
+    if not config.get('VISION_RESILIENCE_ENABLED', True):
+        return backend
+    return ResilientVisionBackend(
+        backend,
+        deadline_seconds=config.get('VISION_DEADLINE_SECONDS', 90.0),
+        max_attempts=config.get('VISION_MAX_ATTEMPTS', 3),
+        backoff_base=config.get('VISION_BACKOFF_BASE_SECONDS', 0.5),
+        backoff_max=config.get('VISION_BACKOFF_MAX_SECONDS', 8.0),
+        hedge=config.get('VISION_HEDGE_ENABLED', False),
+        hedge_slots=hedge_slots,
+        hedge_percentile=config.get('VISION_HEDGE_PERCENTILE', 95.0),
+        hedge_min_samples=config.get('VISION_HEDGE_MIN_SAMPLES', 20),
+        hedge_min_delay=config.get('VISION_HEDGE_MIN_DELAY_SECONDS', 2.0),
+        breaker=CircuitBreaker(
+            failure_rate=config.get('VISION_BREAKER_FAILURE_RATE', 0.5),
+            min_calls=config.get('VISION_BREAKER_MIN_CALLS', 10),
+            window_size=config.get('VISION_BREAKER_WINDOW_SIZE', 20),
+            window_seconds=config.get('VISION_BREAKER_WINDOW_SECONDS', 60.0),
+            open_seconds=config.get('VISION_BREAKER_OPEN_SECONDS', 30.0),
+            name='vision'
+        )
+    )
@@ -0,0 +1,140 @@
+# tests/conftest.py - App, database and vision backend fixtures
+import os
+import sys
+import time
+
+import pytest
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config as config_module
+from config import TestingConfig
+from services.vision_backends import VisionBackend, VisionResponse
+
+ROOM_TEXT = "Room: Hal (hallway)\n- walls_surface_m2: 22.5\n- area_m2: 9.1\n"
+
+
+class FakeVisionBackend(VisionBackend):
+    """Answers every vision call with one room and records the requests it was sent"""
+
+    name = 'fake'
+
+    def __init__(self, text: str = ROOM_TEXT):
+        self.text = text
+        self.calls = []
+
+    def complete(self, request_kwargs, timeout=None):
+        self.calls.append(request_kwargs)
+        return VisionResponse(text=self.text, usage={'prompt_tokens': 300, 'completion_tokens': 30, 'total_tokens': 330})
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    from services.analyzer_registry import analyzer_registry
+
+    class PytestConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+        UPLOAD_FOLDER = str(tmp_path / 'uploads')
+        RESULTS_FOLDER = str(tmp_path / 'results')
+        ANALYSIS_CACHE_ENABLED = False
+        ANALYSIS_PDF_CACHE_DIR = str(tmp_path / 'pdf_pages')
+        OPENAI_API_KEY = 'test-key'
+        ANALYSIS_JOB_HEARTBEAT_SECONDS = 1
+
+    monkeypatch.setitem(config_module.config, 'pytest', PytestConfig)
+    # The registry is process-wide; drop an analyzer built for a previous test's app
+    monkeypatch.setattr(analyzer_registry, '_analyzer', None)
+
+    from app import create_app
+    from models import db
+
+    app = create_app('pytest')
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def floor_plan(tmp_path):
+    """A plan with two walled rooms the geometry engine can measure"""
+    path = tmp_path / 'plan.png'
+    image = Image.new('L', (600, 400), 255)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([50, 50, 550, 350], outline=0, width=8)
+    draw.line([300, 50, 300, 350], fill=0, width=8)
+    image.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def project(app, floor_plan):
+    """A project of a company with an active subscription, with one uploaded floor plan and two rooms"""
+    from models import db
+    from models.company import Company
+    from models.project import Project
+    from models.subscription import Subscription
+    from models.user import User
+
+    rooms = [
+        {'id': 1, 'name': 'Hal', 'type': 'hallway', 'walls_surface_m2': 1, 'area_m2': 1,
+         'region': [50, 50, 250, 300], 'wall_treatments': {'sanding_filling': True}},
+        {'id': 2, 'name': 'Keuken', 'type': 'kitchen', 'walls_surface_m2': 5, 'area_m2': 5,
+         'region': [300, 50, 250, 300]}
+    ]
+    with app.app_context():
+        company = Company(name='Schilders BV')
+        db.session.add(company)
+        db.session.flush()
+        db.session.add(Subscription(company_id=company.id))
+        user = User(email='painter@example.com', password_hash='x', first_name='Piet', last_name='Verf',
+                    company_id=company.id)
+        db.session.add(user)
+        db.session.flush()
+        project = Project(name='Woning', property_type='residential', property_address='Dorpsstraat 1',
+                          company_id=company.id, created_by=user.id, uploaded_images=[floor_plan],
+                          manual_measurements={'rooms': rooms},
+                          floor_plan_analysis={'structured_measurements': {'rooms': rooms}}, status='ready')
+        db.session.add(project)
+        db.session.commit()
+        return project.id
+
+
+@pytest.fixture
+def auth_headers(app, project):
+    from flask_jwt_extended import create_access_token
+    from models.project import Project
+    from models import db
+
+    with app.app_context():
+        user_id = db.session.get(Project, project).created_by
+        return {'Authorization': 'Bearer ' + create_access_token(identity=str(user_id))}
+
+
+@pytest.fixture
+def vision(app):
+    """Replace the worker's vision backend with a FakeVisionBackend"""
+    from services.analyzer_registry import analyzer_registry
+
+    backend = FakeVisionBackend()
+    with app.app_context():
+        analyzer_registry.get_analyzer().vision_backend = backend
+    return backend
+
+
+def wait_for_job(client, headers, project_id, job_id, timeout=15):
+    """Poll a job until it finishes and return its dict"""
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f'/api/projects/{project_id}/analysis-jobs/{job_id}', headers=headers).get_json()['job']
+        if job['status'] in ('completed', 'failed') or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
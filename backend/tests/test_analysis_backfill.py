@@ -0,0 +1,40 @@
+# tests/test_analysis_backfill.py - Resumable re-parse of stored analyses
+import os
+
+from models import db
+from models.project import Project
+from services.analysis_backfill import dry_run_state_path, run_backfill
+
+ANALYSIS_TEXT = "Room: Hal (hallway)\n- walls_surface_m2: 22.5\n- area_m2: 9.1\n"
+
+
+def _add_projects(app, project, count):
+    with app.app_context():
+        template = db.session.get(Project, project)
+        for index in range(count):
+            db.session.add(Project(name=f'Woning {index}', property_type='residential', property_address='Dorpsstraat 1',
+                                   company_id=template.company_id, created_by=template.created_by,
+                                   floor_plan_analysis={'gpt_analysis': {'full_analysis': ANALYSIS_TEXT},
+                                                        'structured_measurements': {'rooms': []}}))
+        db.session.commit()
+
+
+def test_limited_dry_runs_walk_the_table_without_moving_the_real_cursor(app, project, tmp_path):
+    _add_projects(app, project, 4)
+    state_file = str(tmp_path / 'reparse_state.json')
+
+    with app.app_context():
+        first = run_backfill(limit=2, batch_size=2, workers=2, dry_run=True, state_path=state_file)
+        second = run_backfill(limit=2, batch_size=2, workers=2, dry_run=True, state_path=state_file)
+
+        assert second['cursor'] > first['cursor']
+        assert second['processed'] == 4
+        # The fixture project has no stored analysis text to re-parse
+        assert (second['changed'], second['skipped']) == (3, 1)
+        assert second['state_file'] == dry_run_state_path(state_file)
+        assert not os.path.exists(state_file)
+        assert all(not p.floor_plan_analysis['structured_measurements']['rooms']
+                   for p in Project.query.filter(Project.id != project))
+
+        real = run_backfill(limit=2, batch_size=2, workers=1, state_path=state_file)
+        assert real['processed'] == 2
@@ -0,0 +1,132 @@
+# tests/test_analysis_jobs.py - Background analysis job lifecycle
+import time
+from datetime import datetime, timedelta
+
+from models import db
+from models.analysis_job import AnalysisJob
+from models.project import Project
+from services.analysis_jobs import STALE_JOB_ERROR, analysis_queue, reclaim_stale_jobs
+
+
+def _orphan_job(app, project_id, status='running', age_seconds=3600):
+    """An active job as left behind by a process that died, last heartbeat ``age_seconds`` ago"""
+    with app.app_context():
+        project = db.session.get(Project, project_id)
+        job = AnalysisJob(kind='floor_plan', status=status, project_id=project_id, company_id=project.company_id,
+                          updated_at=datetime.utcnow() - timedelta(seconds=age_seconds))
+        project.status = 'analyzing'
+        db.session.add(job)
+        db.session.commit()
+        return job.id
+
+
+def test_orphaned_job_does_not_block_the_project(app, client, project, auth_headers, vision):
+    orphan_id = _orphan_job(app, project)
+
+    response = client.post(f'/api/projects/{project}/analyze', json={}, headers=auth_headers)
+    assert response.status_code == 202
+
+    with app.app_context():
+        orphan = db.session.get(AnalysisJob, orphan_id)
+        assert orphan.status == 'failed'
+        assert orphan.error == STALE_JOB_ERROR
+
+
+def test_job_with_a_recent_heartbeat_still_blocks(app, client, project, auth_headers):
+    _orphan_job(app, project, age_seconds=5)
+
+    response = client.post(f'/api/projects/{project}/analyze', json={}, headers=auth_headers)
+    assert response.status_code == 409
+
+
+def test_startup_fails_jobs_of_dead_processes(app, project):
+    orphan_id = _orphan_job(app, project, status='queued')
+
+    analysis_queue.init_app(app)
+
+    with app.app_context():
+        assert db.session.get(AnalysisJob, orphan_id).status == 'failed'
+        assert db.session.get(Project, project).status == 'draft'
+
+
+def test_held_jobs_keep_their_heartbeat(app, project):
+    app.config['ANALYSIS_JOB_STALE_SECONDS'] = 2
+    job_id = _orphan_job(app, project, age_seconds=0)
+    analysis_queue._hold(job_id)
+    try:
+        time.sleep(3.5)
+        with app.app_context():
+            assert reclaim_stale_jobs(project_id=project) == 0
+            assert db.session.get(AnalysisJob, job_id).status == 'running'
+    finally:
+        analysis_queue._release(job_id)
+
+
+def _reanalyze_while_editing(app, client, project, auth_headers, vision, edit):
+    """Re-analyze room 1 while ``edit(rooms)`` is applied to the stored rooms mid vision call"""
+    from tests.conftest import wait_for_job
+
+    complete = vision.complete
+
+    def complete_and_edit(request_kwargs, timeout=None):
+        with db.engine.begin() as connection:
+            rooms = connection.execute(
+                db.select(Project.manual_measurements).where(Project.id == project)
+            ).scalar_one()['rooms']
+            connection.execute(
+                db.update(Project).where(Project.id == project).values(manual_measurements={'rooms': edit(rooms)})
+            )
+        return complete(request_kwargs, timeout)
+
+    vision.complete = complete_and_edit
+    response = client.post(f'/api/projects/{project}/rooms/1/reanalyze', json={}, headers=auth_headers)
+    assert response.status_code == 202
+    return wait_for_job(client, auth_headers, project, response.get_json()['job_id'])
+
+
+def test_room_deleted_during_reanalysis(app, client, project, auth_headers, vision):
+    job = _reanalyze_while_editing(app, client, project, auth_headers, vision,
+                                   lambda rooms: [room for room in rooms if room['id'] != 1])
+
+    assert job['status'] == 'failed'
+    assert job['error'] == 'Room was changed or removed while it was being re-analyzed'
+    with app.app_context():
+        rooms = db.session.get(Project, project).manual_measurements['rooms']
+        assert [room['id'] for room in rooms] == [2]
+
+
+def test_room_renamed_during_reanalysis(app, client, project, auth_headers, vision):
+    job = _reanalyze_while_editing(app, client, project, auth_headers, vision,
+                                   lambda rooms: [dict(room, name='Gang') if room['id'] == 1 else room for room in rooms])
+
+    assert job['status'] == 'failed'
+    with app.app_context():
+        room = db.session.get(Project, project).manual_measurements['rooms'][0]
+        assert room['name'] == 'Gang'
+        assert room['walls_surface_m2'] == 1
+
+
+def test_room_reanalysis_updates_the_room(app, client, project, auth_headers, vision):
+    job = _reanalyze_while_editing(app, client, project, auth_headers, vision, lambda rooms: rooms)
+
+    assert job['status'] == 'completed', job['error']
+    with app.app_context():
+        room = db.session.get(Project, project).manual_measurements['rooms'][0]
+        assert room['walls_surface_m2'] == 22.5
+        assert room['wall_treatments'] == {'sanding_filling': True}
+
+
+def test_room_reanalysis_image_index_is_checked_by_the_job(app, client, project, auth_headers, vision):
+    from tests.conftest import wait_for_job
+
+    response = client.post(f'/api/projects/{project}/rooms/1/reanalyze', json={'image_index': -1}, headers=auth_headers)
+    assert response.status_code == 400
+
+    # Counting pages may rasterize PDFs, so the upper bound is left to the job
+    response = client.post(f'/api/projects/{project}/rooms/1/reanalyze', json={'image_index': 3}, headers=auth_headers)
+    assert response.status_code == 202
+
+    job = wait_for_job(client, auth_headers, project, response.get_json()['job_id'])
+    assert job['status'] == 'failed'
+    assert job['error'].startswith('Floor plan image 3 not found')
+    assert vision.calls == []
@@ -0,0 +1,32 @@
+# tests/test_measurement_engine.py - Engine selection for floor plan analysis
+from tests.conftest import wait_for_job
+
+
+def test_geometry_engine_requested_with_default_config(app, client, project, auth_headers, vision):
+    """engine=geometry must measure offline even when only the vision engine is configured"""
+    from services.analyzer_registry import analyzer_registry
+
+    assert app.config['ANALYSIS_MEASUREMENT_ENGINE'] == 'vision'
+    assert not app.config['ANALYSIS_GEOMETRY_FALLBACK']
+    with app.app_context():
+        assert analyzer_registry.get_analyzer().geometry_engine is None
+
+    response = client.post(f'/api/projects/{project}/analyze', json={'engine': 'geometry', 'pixels_per_metre': 50},
+                           headers=auth_headers)
+    assert response.status_code == 202
+
+    job = wait_for_job(client, auth_headers, project, response.get_json()['job_id'])
+    assert job['status'] == 'completed', job['error']
+    assert job['result_summary']['measurement_engine'] == 'geometry'
+    assert job['result_summary']['rooms_detected'] >= 2
+    assert vision.calls == []
+
+
+def test_vision_engine_is_still_the_default(app, client, project, auth_headers, vision):
+    response = client.post(f'/api/projects/{project}/analyze', json={}, headers=auth_headers)
+    assert response.status_code == 202
+
+    job = wait_for_job(client, auth_headers, project, response.get_json()['job_id'])
+    assert job['status'] == 'completed', job['error']
+    assert job['result_summary']['measurement_engine'] == 'vision'
+    assert len(vision.calls) == 1
@@ -0,0 +1,23 @@
+# tests/test_quote_schema.py - Upgrading existing databases to the current quotes schema
+from models import db
+from services.quote_summaries import MATERIALIZED_COLUMNS, add_missing_quote_columns
+
+
+def _quote_columns():
+    return {column['name'] for column in db.inspect(db.engine).get_columns('quotes')}
+
+
+def test_missing_quote_columns_are_added_once(app, client, auth_headers):
+    with app.app_context():
+        # A quotes table created before the materialized columns existed
+        with db.engine.begin() as connection:
+            for name in MATERIALIZED_COLUMNS:
+                connection.execute(db.text(f'ALTER TABLE quotes DROP COLUMN {name}'))
+        assert not _quote_columns() & set(MATERIALIZED_COLUMNS)
+
+        assert add_missing_quote_columns() == list(MATERIALIZED_COLUMNS)
+        assert set(MATERIALIZED_COLUMNS) <= _quote_columns()
+        assert add_missing_quote_columns() == []
+
+    response = client.get('/api/quotes', headers=auth_headers)
+    assert response.status_code == 200
@@ -0,0 +1,23 @@
+# tests/test_tiled_image.py - Header reads of images over Pillow's decompression bomb limit
+import pytest
+from PIL import Image
+
+from services.tiled_image import TiledImageReader, image_pixels
+
+
+def test_header_read_leaves_the_bomb_limit_alone(tmp_path, monkeypatch):
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 10_000)
+    path = tmp_path / 'scan.tif'
+    Image.new('L', (300, 200), 255).save(path)
+
+    with pytest.raises(Image.DecompressionBombError):
+        Image.open(path)
+
+    assert image_pixels(str(path)) == 60_000
+    reader = TiledImageReader(str(path))
+    assert (reader.width, reader.height) == (300, 200)
+    assert reader.scan(100).image.shape == (66, 100)
+
+    assert Image.MAX_IMAGE_PIXELS == 10_000
+    with pytest.raises(Image.DecompressionBombError):
+        Image.open(path)
@@ -0,0 +1,63 @@
+# tests/test_vision_backends.py - Hedged vision requests and the concurrency cap
+import threading
+import time
+
+from services.vision_backends import ResilientVisionBackend, VisionBackend, VisionResponse
+
+
+class SlowBackend(VisionBackend):
+    """The first request stalls; later ones answer at once"""
+
+    name = 'slow'
+
+    def __init__(self, stall: float):
+        self.stall = stall
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def complete(self, request_kwargs, timeout=None):
+        with self._lock:
+            self.requests += 1
+            first = self.requests == 1
+        if first:
+            time.sleep(self.stall)
+        return VisionResponse(text='Room: Hal (hallway)', usage={})
+
+
+def _hedging_backend(inner, slots):
+    backend = ResilientVisionBackend(inner, deadline_seconds=5, hedge=True, hedge_min_samples=5,
+                                     hedge_min_delay=0.05, hedge_slots=slots)
+    for _ in range(5):
+        backend.latency['complete'].observe(0.01)
+    return backend
+
+
+def test_hedging_is_off_by_default():
+    assert not ResilientVisionBackend(SlowBackend(0)).hedge
+
+
+def test_no_hedge_when_every_slot_is_taken():
+    slots = threading.BoundedSemaphore(1)
+    inner = SlowBackend(stall=0.3)
+    backend = _hedging_backend(inner, slots)
+
+    with slots:  # the caller's own slot
+        backend.complete({})
+
+    assert inner.requests == 1
+    assert backend.counters['hedges'] == 0
+    assert backend.counters['hedges_skipped_no_slot'] == 1
+
+
+def test_hedge_takes_a_free_slot_and_gives_it_back():
+    slots = threading.BoundedSemaphore(2)
+    inner = SlowBackend(stall=0.5)
+    backend = _hedging_backend(inner, slots)
+
+    with slots:
+        backend.complete({})
+        # The hedge won; the stalled first request is still in flight on the caller's slot
+        assert inner.requests == 2
+        assert backend.counters['hedge_wins'] == 1
+    time.sleep(0.1)
+    assert slots.acquire(blocking=False) and slots.acquire(blocking=False)
@@ -4,7 +4,7 @@ import {
   ArrowLeft, Edit, FileText, CheckCircle, AlertCircle, RefreshCw, Brain, Users,
   Home, Building, DollarSign, Settings, X, Upload, Play, Mail, Calculator, Save
 } from 'lucide-react';
-import api from '../../services/api';
+import api, { runAnalysisJob } from '../../services/api';
 import Loading from '../common/Loading';
 import ErrorBoundary from '../common/ErrorBoundary';
 import RoomMeasurements from './RoomMeasurements';
@@ -32,6 +32,7 @@ const ProjectDetails = () => {
   const [uploading, setUploading] = useState(false);
   const [uploadProgress, setUploadProgress] = useState(0);
   const [analyzing, setAnalyzing] = useState(false);
+  const [streamedRooms, setStreamedRooms] = useState([]);
   const [customPricing, setCustomPricing] = useState(null);
   const [pricingError, setPricingError] = useState(null);
   const [currentStep, setCurrentStep] = useState('project');
@@ -462,7 +463,7 @@ const ProjectDetails = () => {
         formData.append('files', file);
       });
 
-      await api.post(`/projects/${id}/upload`, formData, {
+      const response = await api.post(`/projects/${id}/upload`, formData, {
         headers: { 'Content-Type': 'multipart/form-data' },
         onUploadProgress: (progressEvent) => {
           const progress = Math.round((progressEvent.loaded * 100) / progressEvent.total);
@@ -470,6 +471,20 @@ const ProjectDetails = () => {
         }
       });
 
+      // The same plan was already analysed in another project: offer its measurements
+      const duplicate = response.data?.duplicate_analyses?.[0];
+      if (duplicate && window.confirm(
+        t('This floor plan matches one already analysed in project "{{name}}" ({{rooms}} rooms). Reuse those measurements instead of running a new AI analysis?', {
+          name: duplicate.project_name,
+          rooms: duplicate.rooms_detected
+        })
+      )) {
+        await api.post(`/projects/${id}/reuse-analysis`, { source_project_id: duplicate.project_id });
+        await loadProject();
+        showSuccessMessage(t('Measurements reused from a previous analysis!'));
+        return;
+      }
+
       await loadProject();
       showSuccessMessage(t('Floor plans uploaded successfully!'));
     } catch (err) {
@@ -499,11 +514,16 @@ const ProjectDetails = () => {
     }
 
     setAnalyzing(true);
+    setStreamedRooms([]);
     setError('');
 
     try {
       console.log('🚀 Starting AI analysis for project:', id);
-      const response = await api.post(`/projects/${id}/analyze`);
+      const response = {
+        data: await runAnalysisJob(id, {
+          onRoom: room => setStreamedRooms(prev => [...prev, room])
+        })
+      };
 
       console.log('📊 AI Analysis Response:', response.data);
 
@@ -1267,6 +1287,20 @@ const ProjectDetails = () => {
                     <p className="text-sm text-gray-500">
                       {t('Run AI analysis to automatically detect rooms, walls, and ceilings from your floor plans. Results will be saved automatically.')}
                     </p>
+                    {analyzing && streamedRooms.length > 0 && (
+                      <div className="mt-4">
+                        <div className="text-sm font-medium text-gray-900 mb-2">
+                          {t('Rooms detected so far')}: {streamedRooms.length}
+                        </div>
+                        <ul className="text-sm text-gray-600 space-y-1">
+                          {streamedRooms.map(room => (
+                            <li key={`${room.floor || ''}-${room.id}`}>
+                              {room.floor ? `${room.floor} • ` : ''}{room.name} ({room.type}) — {t('walls')} {room.walls_surface_m2}m², {t('ceiling')} {room.area_m2}m²
+                            </li>
+                          ))}
+                        </ul>
+                      </div>
+                    )}
                   </div>
                 )}
               </ErrorBoundary>
@@ -276,6 +276,11 @@ const RoomMeasurements = ({ rooms, setRooms, customPricing }) => {
                 className="text-xl font-semibold bg-transparent border-none focus:outline-none focus:ring-2 focus:ring-purple-500 rounded px-2 py-1"
                 placeholder={t('Room Name')}
               />
+              {room.floor && (
+                <span className="text-xs font-medium text-purple-700 bg-purple-100 rounded-full px-2 py-1">
+                  {room.floor}
+                </span>
+              )}
             </div>
             <div className="flex items-center space-x-4">
               <div className="text-right">
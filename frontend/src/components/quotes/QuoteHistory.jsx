@@ -276,7 +276,7 @@ const QuoteHistory = () => {
                         €{quote.total_amount?.toFixed(2) || '0.00'}
                       </div>
                       <div className="text-sm text-gray-500">
-                        {quote.line_items?.length || 0} items
+                        {quote.organization_info?.total_line_items ?? quote.line_items?.length ?? 0} items
                       </div>
                     </td>
                     
@@ -1,5 +1,5 @@
 import { useState, useEffect } from 'react';
-import api from '../services/api';
+import api, { runAnalysisJob } from '../services/api';
 
 export const useProjects = () => {
   const [projects, setProjects] = useState([]);
@@ -72,11 +72,11 @@ export const useProjects = () => {
   const analyzeProject = async (projectId) => {
     try {
       setError(null);
-      const response = await api.post(`/projects/${projectId}/analyze`);
+      const result = await runAnalysisJob(projectId);
       setProjects(prev => 
-        prev.map(p => p.id === projectId ? response.data.project : p)
+        prev.map(p => p.id === projectId ? result.project : p)
       );
-      return response.data.project;
+      return result.project;
     } catch (err) {
       setError(err.response?.data?.error || 'Failed to analyze project');
       throw err;
@@ -60,4 +60,91 @@ api.interceptors.response.use(
   }
 );
 
+// Read the server-sent events of an analysis job. fetch() is used instead of
+// EventSource so the Authorization header can be sent. Resolves with the final
+// event ({ event: 'completed' | 'failed' | 'timeout', data }).
+export const streamAnalysisJob = async (projectId, jobId, { onRoom, onProgress } = {}) => {
+  const response = await fetch(`${API_BASE_URL}/projects/${projectId}/analysis-jobs/${jobId}/events`, {
+    headers: {
+      Accept: 'text/event-stream',
+      Authorization: `Bearer ${localStorage.getItem('accessToken')}`,
+    },
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Analysis event stream failed (${response.status})`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) return { event: 'closed' };
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = 'message';
+      let data = '';
+      raw.split('\n').forEach(line => {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      });
+      if (!data) continue;
+
+      const payload = JSON.parse(data);
+      if (event === 'room' && onRoom) onRoom(payload);
+      else if (event === 'progress' && onProgress) onProgress(payload);
+      else if (['completed', 'failed', 'timeout'].includes(event)) {
+        reader.cancel();
+        return { event, data: payload };
+      }
+    }
+  }
+};
+
+// Start a floor plan analysis and follow its background job until it finishes.
+// With onRoom, rooms are streamed over SSE as they are detected; otherwise (or if
+// streaming fails) the job is polled. Resolves with the final job status payload
+// ({ job, analysis, project, message }); gives up after maxDurationMs.
+export const runAnalysisJob = async (projectId, {
+  intervalMs = 2000, maxDurationMs = 20 * 60 * 1000, onProgress, onRoom, forceRefresh = false,
+} = {}) => {
+  const startedAt = Date.now();
+  const { data } = await api.post(`/projects/${projectId}/analyze`, { force_refresh: forceRefresh });
+  const jobId = data.job_id || data.job?.id;
+
+  if (onRoom && typeof window !== 'undefined' && window.ReadableStream) {
+    try {
+      await streamAnalysisJob(projectId, jobId, { onRoom, onProgress });
+    } catch (streamError) {
+      console.warn('Analysis event stream unavailable, falling back to polling:', streamError);
+    }
+  }
+
+  while (true) {
+    const { data: status } = await api.get(`/projects/${projectId}/analysis-jobs/${jobId}`);
+    if (onProgress) onProgress(status.job);
+
+    if (status.job.status === 'completed') return status;
+    if (status.job.status === 'failed') {
+      const error = new Error(status.job.error || 'Floor plan analysis failed');
+      error.job = status.job;
+      throw error;
+    }
+
+    if (Date.now() - startedAt > maxDurationMs) {
+      const error = new Error('Floor plan analysis is taking too long; check the project again later');
+      error.job = status.job;
+      throw error;
+    }
+
+    await new Promise(resolve => setTimeout(resolve, intervalMs));
+  }
+};
+
 export default api;
\ No newline at end of file